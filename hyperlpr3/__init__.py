@@ -1,5 +1,9 @@
 from .hyperlpr3 import LicensePlateCatcher
+from .common.image_io import EncodedImage
 from .common.typedef import *
+from .inference.multitask_detect import set_nms_backend
+from .common import trace, memory
+from .common.scheduler import MultiSourceScheduler, FrameSource, VideoSource, DirectorySource
 
 __version__ = "0.1.3"
 
@@ -0,0 +1,66 @@
+import json
+import click
+import numpy as np
+from os.path import join
+from hyperlpr3.config.settings import onnx_runtime_config as ort_cfg, _DEFAULT_FOLDER_
+from hyperlpr3.benchmark.utils import measure
+
+
+def build_models(folder: str, io_binding: bool) -> dict:
+    from hyperlpr3.inference.multitask_detect import MultiTaskDetectorORT
+    from hyperlpr3.inference.recognition import PPRCNNRecognitionORT
+    from hyperlpr3.inference.classification import ClassificationORT
+
+    return dict(
+        detect=MultiTaskDetectorORT(join(folder, ort_cfg['det_model_path_320x']), input_size=(320, 320),
+                                    io_binding=io_binding),
+        recognize=PPRCNNRecognitionORT(join(folder, ort_cfg['rec_model_path']), input_size=(48, 160),
+                                       io_binding=io_binding),
+        classify=ClassificationORT(join(folder, ort_cfg['cls_model_path']), input_size=(96, 96),
+                                   io_binding=io_binding),
+    )
+
+
+def run(folder: str = _DEFAULT_FOLDER_, repeat: int = 100, frame_size: tuple = (1080, 1920)) -> dict:
+    """Compares latency and per-call allocations with and without IO binding.
+
+    Every model wrapper is fed a fixed-size input, which is the steady state of
+    a video stream. With IO binding the adapter counters must stop growing
+    after the first call for each input shape.
+
+    Args:
+        folder (str, optional): Model folder. Defaults to the package folder.
+        repeat (int, optional): Number of timed calls per model. Defaults to 100.
+        frame_size (tuple, optional): Synthetic frame (height, width). Defaults to 1080p.
+
+    Returns:
+        dict: Results keyed by `io_binding`/`plain`, then by model.
+    """
+    rng = np.random.default_rng(0)
+    inputs = dict(
+        detect=rng.integers(0, 255, (*frame_size, 3), dtype=np.uint8),
+        recognize=rng.integers(0, 255, (40, 140, 3), dtype=np.uint8),
+        classify=rng.integers(0, 255, (40, 140, 3), dtype=np.uint8),
+    )
+    report = dict()
+    for io_binding in (False, True):
+        models = build_models(folder, io_binding)
+        section = dict()
+        for name, model in models.items():
+            stats = measure(model, inputs[name], repeat=repeat)
+            stats['adapter'] = dict(model.session.stats)
+            section[name] = stats
+        report['io_binding' if io_binding else 'plain'] = section
+
+    return report
+
+
+@click.command(help="Benchmark buffer reuse and IO binding of the ORT model wrappers.")
+@click.option("-folder", "--folder", default=_DEFAULT_FOLDER_, type=str, )
+@click.option("-repeat", "--repeat", default=100, type=int, )
+def main(folder, repeat):
+    print(json.dumps(run(folder, repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import json
+import click
+import numpy as np
+from os.path import join
+from hyperlpr3.config.settings import onnx_runtime_config as ort_cfg, _DEFAULT_FOLDER_
+from hyperlpr3.inference.recognition import PPRCNNRecognitionORT, DEFAULT_WIDTH_BUCKETS
+from hyperlpr3.benchmark.utils import measure
+
+
+def synthetic_crops(count: int = 64, seed: int = 0) -> list:
+    """Builds plate crops with the aspect ratios seen in practice.
+
+    Mixes single-layer plates (~3.1:1), the top (~5:1) and bottom (~3.3:1)
+    halves of double-layer plates and narrow, square-ish plates.
+    """
+    rng = np.random.default_rng(seed)
+    ratios = rng.choice([3.1, 5.0, 3.3, 1.2, 1.8, 2.4], count)
+    heights = rng.integers(24, 72, count)
+    return [rng.integers(0, 255, (int(h), int(h * r), 3), dtype=np.uint8) for h, r in zip(heights, ratios)]
+
+
+def run(model: str = None, repeat: int = 20, count: int = 64) -> dict:
+    """Compares per-crop recognition with width-bucketed batched recognition.
+
+    Args:
+        model (str, optional): Recognition model, defaults to the bundled one.
+        repeat (int, optional): Number of timed passes over the crops. Defaults to 20.
+        count (int, optional): Number of crops per pass. Defaults to 64.
+
+    Returns:
+        dict: Latency per pass and the per-bucket throughput/padding report.
+    """
+    if model is None:
+        model = join(_DEFAULT_FOLDER_, ort_cfg['rec_model_path'])
+    crops = synthetic_crops(count)
+    report = dict()
+    single = PPRCNNRecognitionORT(model)
+    report['per_crop'] = measure(lambda: [single(crop) for crop in crops], repeat=repeat, track_alloc=False)
+    for name, buckets in (('batch_max_width', (DEFAULT_WIDTH_BUCKETS[-1],)), ('batch_bucketed', DEFAULT_WIDTH_BUCKETS)):
+        recognizer = PPRCNNRecognitionORT(model, width_buckets=buckets)
+        stats = measure(recognizer.recognize_batch, crops, repeat=repeat, track_alloc=False)
+        stats['buckets'] = recognizer.bucket_report()
+        stats['max_batch'] = recognizer.max_batch
+        report[name] = stats
+
+    return report
+
+
+@click.command(help="Benchmark width-bucketed batched recognition.")
+@click.option("-model", "--model", default=None, type=str, )
+@click.option("-repeat", "--repeat", default=20, type=int, )
+@click.option("-count", "--count", default=64, type=int, )
+def main(model, repeat, count):
+    print(json.dumps(run(model, repeat, count), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import json
+import tempfile
+import click
+import numpy as np
+from hyperlpr3.common.tokenize import plate_charset
+from hyperlpr3.inference.recognition import ctc_greedy_decode, charset_indices
+from hyperlpr3.benchmark.utils import measure
+
+
+def synthetic_dictionary(num_classes: int = 6625, seed: int = 0) -> list:
+    """Builds a full-size recognition dictionary with the plate symbols scattered in it."""
+    rng = np.random.default_rng(seed)
+    characters = [f"<{i}>" for i in range(num_classes)]
+    positions = rng.choice(np.arange(1, num_classes), len(plate_charset), replace=False)
+    for position, char in zip(positions, plate_charset):
+        characters[position] = char
+    characters[0] = "blank"
+
+    return characters
+
+
+def run(repeat: int = 200, model: str = None, shapes: tuple = ((1, 40, 6625), (8, 40, 6625), (1, 20, 77))) -> dict:
+    """Benchmarks plate-charset restricted decoding and output pruning.
+
+    Args:
+        repeat (int, optional): Number of timed calls per case. Defaults to 200.
+        model (str, optional): Recognition model to prune with the plate charset;
+            its size and latency before/after are reported. Defaults to None.
+        shapes (tuple, optional): (N, T, C) output shapes to decode.
+
+    Returns:
+        dict: Postprocess latency per shape and, with a model, pruning results.
+    """
+    rng = np.random.default_rng(0)
+    report = dict()
+    for n, t, c in shapes:
+        characters = np.asarray(synthetic_dictionary(c), dtype=object)
+        subset = charset_indices(characters, plate_charset)
+        logits = rng.normal(0, 1, (n, t, c)).astype(np.float32)
+        np.put_along_axis(logits, rng.choice(subset, (n, t, 1)), 10.0, axis=2)
+        prob = np.exp(logits) / np.exp(logits).sum(axis=2, keepdims=True)
+        report[f"postprocess/N={n}/T={t}/C={c}"] = dict(
+            full=measure(ctc_greedy_decode, prob, characters, repeat=repeat, track_alloc=False),
+            plate_charset=measure(ctc_greedy_decode, prob, characters, class_subset=subset, repeat=repeat,
+                                  track_alloc=False),
+            classes=int(len(subset)),
+        )
+    if model:
+        from hyperlpr3.common.graph_surgery import prune_output_classes
+        from hyperlpr3.common.tokenize import token
+        from hyperlpr3.inference.recognition import PPRCNNRecognitionORT
+        with tempfile.TemporaryDirectory() as folder:
+            pruned = os.path.join(folder, "pruned.onnx")
+            info = prune_output_classes(model, pruned, charset_indices(token, plate_charset))
+            image = rng.integers(0, 255, (40, 140, 3), dtype=np.uint8)
+            info['full'] = measure(PPRCNNRecognitionORT(model), image, repeat=repeat, track_alloc=False)
+            info['pruned'] = measure(PPRCNNRecognitionORT(pruned), image, repeat=repeat, track_alloc=False)
+        report['model'] = info
+
+    return report
+
+
+@click.command(help="Benchmark plate-charset restricted recognition post-processing.")
+@click.option("-repeat", "--repeat", default=200, type=int, )
+@click.option("-model", "--model", default=None, type=str, help="Recognition model to prune and compare.")
+def main(repeat, model):
+    print(json.dumps(run(repeat, model), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import json
+import time
+import threading
+import cv2
+import click
+import numpy as np
+from glob import glob
+from os.path import join, dirname
+import hyperlpr3 as lpr3
+
+_ASSETS_ = join(dirname(dirname(dirname(__file__))), 'assets')
+
+ENGINES = dict(ort=lpr3.INFER_ONNX_RUNTIME, mnn=lpr3.INFER_MNN, dnn=lpr3.INFER_OPENCV_DNN)
+
+
+def load_images(folder: str = None) -> list:
+    """Loads the sample images plus flipped and resized variants of them."""
+    folder = folder or _ASSETS_
+    images = list()
+    for path in sorted(glob(join(folder, '*.jpg'))):
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        images += [image, cv2.flip(image, 1), cv2.resize(image, None, fx=0.5, fy=0.5)]
+
+    return images
+
+
+def compare_concurrent(catcher, images: list, threads: int = 8, iterations: int = 50) -> dict:
+    """Runs a catcher from several threads and compares every result with the sequential one.
+
+    Every thread runs the catcher on the images in its own order and compares
+    each result with the one computed sequentially beforehand. Any per-call
+    state shared between threads shows up as mismatches.
+
+    Args:
+        catcher (LicensePlateCatcher): The shared catcher.
+        images (list): BGR images.
+        threads (int, optional): Number of concurrent threads. Defaults to 8.
+        iterations (int, optional): Calls per thread. Defaults to 50.
+
+    Returns:
+        dict: Calls, mismatches, errors and throughput of the sequential
+            reference pass and of the concurrent pass.
+    """
+    t0 = time.perf_counter()
+    expected = [str(catcher(image)) for image in images]
+    sequential = time.perf_counter() - t0
+    mismatches, errors = list(), list()
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(seed):
+        order = np.random.default_rng(seed).integers(0, len(images), iterations)
+        barrier.wait()
+        for idx in order:
+            try:
+                result = str(catcher(images[idx]))
+            except Exception as err:
+                with lock:
+                    errors.append(repr(err))
+                continue
+            if result != expected[idx]:
+                with lock:
+                    mismatches.append(int(idx))
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    t0 = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    concurrent = time.perf_counter() - t0
+    calls = threads * iterations
+
+    return dict(threads=threads, calls=calls, mismatches=len(mismatches), errors=len(errors),
+                first_errors=errors[:3], sequential_fps=len(images) / sequential, concurrent_fps=calls / concurrent)
+
+
+def run(threads: int = 8, iterations: int = 50, folder: str = None, detect_level: int = lpr3.DETECT_LEVEL_LOW,
+        inference: int = lpr3.INFER_ONNX_RUNTIME) -> dict:
+    """Stress tests one shared LicensePlateCatcher from several threads, see `compare_concurrent`.
+
+    Args:
+        threads (int, optional): Number of concurrent threads. Defaults to 8.
+        iterations (int, optional): Calls per thread. Defaults to 50.
+        folder (str, optional): Image folder, defaults to the repo assets.
+        detect_level (int, optional): Detector level. Defaults to DETECT_LEVEL_LOW.
+        inference (int, optional): Inference engine. Defaults to INFER_ONNX_RUNTIME.
+
+    Returns:
+        dict: The `compare_concurrent` report plus the catcher stats.
+    """
+    images = load_images(folder)
+    assert images, "No images found."
+    catcher = lpr3.LicensePlateCatcher(inference=inference, detect_level=detect_level, full_result=True)
+
+    return dict(compare_concurrent(catcher, images, threads, iterations), stats=catcher.stats())
+
+
+@click.command(help="Stress test a LicensePlateCatcher shared by several threads.")
+@click.option("-threads", "--threads", default=8, type=int, )
+@click.option("-iterations", "--iterations", default=50, type=int, )
+@click.option("-folder", "--folder", default=None, type=str, )
+@click.option("-engine", "--engine", default='ort', type=click.Choice(list(ENGINES)), )
+def main(threads, iterations, folder, engine):
+    report = run(threads, iterations, folder, inference=ENGINES[engine])
+    print(json.dumps(report, indent=2, default=str))
+    if report['mismatches'] or report['errors']:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import json
+import click
+import numpy as np
+from os.path import join
+from hyperlpr3.config.settings import onnx_runtime_config as ort_cfg, _DEFAULT_FOLDER_
+from hyperlpr3.common.tools_process import get_rotate_crop_image, get_rectify_transform
+from hyperlpr3.inference.recognition import PPRCNNRecognitionORT
+from hyperlpr3.benchmark.utils import measure
+
+
+def synthetic_plates(count: int = 16, size: tuple = (1080, 1920), seed: int = 0) -> tuple:
+    """Builds a noise image and slightly skewed plate quadrilaterals on it."""
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 255, (size[0], size[1], 3), dtype=np.uint8)
+    plates = list()
+    for _ in range(count):
+        w = int(rng.integers(80, 400))
+        h = int(w / rng.uniform(2.8, 3.4))
+        x = int(rng.integers(0, size[1] - w))
+        y = int(rng.integers(h // 4, size[0] - h - h // 4))
+        skew = int(rng.integers(-h // 4, h // 4 + 1))
+        plates.append(np.array([[x, y], [x + w, y + skew], [x + w, y + h + skew], [x, y + h]]))
+
+    return image, plates
+
+
+def run(model: str = None, repeat: int = 50, count: int = 16) -> dict:
+    """Compares crop-then-resize with the fused rectify-resize warp.
+
+    Args:
+        model (str, optional): Recognition model, defaults to the bundled one.
+        repeat (int, optional): Number of timed passes over the plates. Defaults to 50.
+        count (int, optional): Number of plates per pass. Defaults to 16.
+
+    Returns:
+        dict: Latency per pass of both paths, crop only and crop + recognition.
+    """
+    if model is None:
+        model = join(_DEFAULT_FOLDER_, ort_cfg['rec_model_path'])
+    image, plates = synthetic_plates(count)
+    recognizer = PPRCNNRecognitionORT(model)
+
+    def legacy_crop():
+        return [get_rotate_crop_image(image, pts) for pts in plates]
+
+    def fused_regions():
+        regions = list()
+        for pts in plates:
+            matrix, w, h = get_rectify_transform(pts)
+            regions.append((matrix, (0, 0, w, h)))
+        return regions
+
+    report = dict()
+    report['crop_resize'] = measure(lambda: recognizer.recognize_batch(legacy_crop()), repeat=repeat)
+    report['fused_warp'] = measure(lambda: recognizer.recognize_regions(image, fused_regions()), repeat=repeat)
+    report['crop_only'] = measure(legacy_crop, repeat=repeat)
+
+    return report
+
+
+@click.command(help="Benchmark the fused crop-rectify-resize path.")
+@click.option("-model", "--model", default=None, type=str, )
+@click.option("-repeat", "--repeat", default=50, type=int, )
+@click.option("-count", "--count", default=16, type=int, )
+def main(model, repeat, count):
+    print(json.dumps(run(model, repeat, count), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import json
+import click
+import numpy as np
+from hyperlpr3.common.tokenize import token
+from hyperlpr3.inference.recognition import ctc_greedy_decode, get_ignored_tokens
+from hyperlpr3.benchmark.utils import measure
+
+
+def legacy_decode(prob, character_list):
+    # Reference copy of the per-timestep decode loop the recognizers used before ctc_greedy_decode
+    text_index = np.argmax(prob, axis=2)
+    text_prob = np.max(prob, axis=2)
+    result_list = []
+    ignored_tokens = get_ignored_tokens()
+    batch_size = len(text_index)
+    for batch_idx in range(batch_size):
+        char_list = []
+        conf_list = []
+        for idx in range(len(text_index[batch_idx])):
+            if text_index[batch_idx][idx] in ignored_tokens:
+                continue
+            if idx > 0 and text_index[batch_idx][idx - 1] == text_index[batch_idx][idx]:
+                continue
+            char_list.append(character_list[int(text_index[batch_idx][idx])])
+            conf_list.append(text_prob[batch_idx][idx])
+        text = ''.join(char_list)
+        result_list.append((text, np.mean(conf_list)))
+    return result_list
+
+
+def synthetic_output(batch_size: int, time_steps: int = 20, num_classes: int = len(token), seed: int = 0):
+    """Builds plate-like recognizer probabilities: blanks between runs of repeated characters."""
+    rng = np.random.default_rng(seed)
+    logits = rng.normal(0, 1, (batch_size, time_steps, num_classes)).astype(np.float32)
+    labels = rng.integers(1, num_classes, (batch_size, time_steps))
+    labels[:, ::3] = 0
+    labels[:, 2::3] = labels[:, 1::3][:, :labels[:, 2::3].shape[1]]
+    np.put_along_axis(logits, labels[:, :, None], 8.0, axis=2)
+    prob = np.exp(logits - logits.max(axis=2, keepdims=True))
+    prob /= prob.sum(axis=2, keepdims=True)
+
+    return prob
+
+
+def run(repeat: int = 200, batch_sizes: tuple = (1, 8, 32), time_steps: tuple = (20, 40)) -> dict:
+    """Benchmarks the vectorized CTC decoder against the legacy loop.
+
+    Args:
+        repeat (int, optional): Number of timed calls per case. Defaults to 200.
+        batch_sizes (tuple, optional): Batch sizes to decode.
+        time_steps (tuple, optional): Sequence lengths to decode.
+
+    Returns:
+        dict: Latency statistics keyed by case name.
+    """
+    characters = np.asarray(token, dtype=object)
+    report = dict()
+    for t in time_steps:
+        for n in batch_sizes:
+            prob = synthetic_output(n, t)
+            assert [text for text, _ in legacy_decode(prob, token)] == \
+                   [text for text, _ in ctc_greedy_decode(prob, characters)]
+            report[f"N={n}/T={t}"] = dict(
+                legacy=measure(legacy_decode, prob, token, repeat=repeat, track_alloc=False),
+                vectorized=measure(ctc_greedy_decode, prob, characters, repeat=repeat, track_alloc=False),
+            )
+
+    return report
+
+
+@click.command(help="Benchmark the vectorized CTC decoder against the legacy loop.")
+@click.option("-repeat", "--repeat", default=200, type=int, )
+def main(repeat):
+    print(json.dumps(run(repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
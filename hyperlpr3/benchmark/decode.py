@@ -0,0 +1,52 @@
+import json
+import cv2
+import click
+import numpy as np
+from hyperlpr3.common.image_io import EncodedImage
+from hyperlpr3.benchmark.utils import measure
+
+RESOLUTIONS = ((1080, 1920), (2160, 3840), (3000, 4000), (4000, 6000))
+
+
+def synthetic_jpeg(size: tuple, seed: int = 0) -> bytes:
+    """Encodes a smooth random image, compressing like a natural photo."""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (size[0] // 16, size[1] // 16, 3), dtype=np.uint8)
+    image = cv2.resize(small, (size[1], size[0]), interpolation=cv2.INTER_CUBIC)
+    _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+
+    return buffer.tobytes()
+
+
+def run(repeat: int = 10, target: int = 640) -> dict:
+    """Compares full resolution decoding with the reduced scale decode for detection.
+
+    Args:
+        repeat (int, optional): Number of timed decodes. Defaults to 10.
+        target (int, optional): Detector input size. Defaults to 640.
+
+    Returns:
+        dict: Per resolution, latency and allocations of a full decode and of
+            the reduced decode, and the factor picked.
+    """
+    report = dict()
+    for size in RESOLUTIONS:
+        data = np.frombuffer(synthetic_jpeg(size), dtype=np.uint8)
+        entry = dict()
+        entry['full'] = measure(cv2.imdecode, data, cv2.IMREAD_COLOR, repeat=repeat, warmup=1)
+        entry['reduced'] = measure(lambda: EncodedImage(data).reduced(target), repeat=repeat, warmup=1)
+        entry['factor'] = EncodedImage(data).reduced(target)[1]
+        report[f'{size[1]}x{size[0]}'] = entry
+
+    return report
+
+
+@click.command(help="Benchmark reduced scale JPEG decoding for detection.")
+@click.option("-repeat", "--repeat", default=10, type=int, )
+@click.option("-target", "--target", default=640, type=int, )
+def main(repeat, target):
+    print(json.dumps(run(repeat, target), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import os
+import time
+import platform
+import threading
+import cv2
+import numpy as np
+from glob import glob
+from os.path import join
+import hyperlpr3 as lpr3
+import hyperlpr3.inference.pipeline as pipeline_module
+import hyperlpr3.inference.recognition as recognition_module
+from hyperlpr3.common import memory as memory_accounting
+from hyperlpr3.common.image_io import IMAGE_EXTENSIONS
+from hyperlpr3.benchmark.concurrency import ENGINES
+from hyperlpr3.benchmark.utils import summarize
+
+STAGES = ('decode', 'detect_pre', 'detect_run', 'detect_post', 'crop', 'recognize', 'classify')
+
+DETECT_LEVELS = dict(low=lpr3.DETECT_LEVEL_LOW, high=lpr3.DETECT_LEVEL_HIGH)
+
+
+def synthetic_frames(count: int = 16, size: tuple = (1080, 1920), seed: int = 0) -> list:
+    """Encodes street-like random frames with a few plate-shaped patches as JPEG.
+
+    Args:
+        count (int, optional): Number of frames. Defaults to 16.
+        size (tuple, optional): (height, width) of the frames. Defaults to 1080p.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        list: JPEG encoded frames (bytes).
+    """
+    rng = np.random.default_rng(seed)
+    height, width = size
+    frames = list()
+    for _ in range(count):
+        small = rng.integers(0, 255, (max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+        image = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+        for _ in range(rng.integers(1, 4)):
+            w = int(rng.integers(width // 16, width // 6))
+            h = w * 140 // 440
+            x, y = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+            color = ((160, 60, 10), (20, 190, 230), (90, 200, 60))[rng.integers(0, 3)]
+            cv2.rectangle(image, (x, y), (x + w, y + h), color, -1)
+            text = ''.join(chr(c) for c in rng.integers(65, 91, 7))
+            cv2.putText(image, text, (x + w // 20, y + h * 3 // 4), cv2.FONT_HERSHEY_SIMPLEX, h / 48,
+                        (255, 255, 255), max(1, h // 16))
+        _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        frames.append(buffer.tobytes())
+
+    return frames
+
+
+def load_frames(folder: str) -> list:
+    """Reads the encoded bytes of the images of a folder (non recursive), sorted by name."""
+    paths = sorted(path for path in glob(join(folder, '*')) if path.lower().endswith(IMAGE_EXTENSIONS))
+
+    return [np.fromfile(path, dtype=np.uint8).tobytes() for path in paths]
+
+
+class _Timed(object):
+    # Callable proxy for components invoked through __call__, which cannot be patched on the instance
+
+    def __init__(self, timer, stage, target):
+        self._call = timer.wrap(stage, target.__call__)
+        self._target = target
+
+    def __call__(self, *args, **kwargs):
+        return self._call(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+class StageTimer(object):
+    """Records the exclusive time of every pipeline stage while active.
+
+    Stages nest (the fused crop runs inside the recognizer call), so each
+    sample is the stage's own time, without the time of the stages it called.
+    The timer patches the catcher's components and the crop helpers for the
+    duration of the `with` block only; samples from concurrent threads are
+    kept apart by a per-thread stack.
+    """
+
+    def __init__(self, catcher):
+        self.catcher = catcher
+        self.samples = {stage: list() for stage in STAGES}
+        self._local = threading.local()
+        self._restore = list()
+
+    def wrap(self, stage, fn):
+        samples = self.samples[stage]
+        local = self._local
+
+        def timed(*args, **kwargs):
+            stack = local.__dict__.setdefault('stack', [])
+            stack.append(0.0)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - t0
+                children = stack.pop()
+                samples.append(elapsed - children)
+                if stack:
+                    stack[-1] += elapsed
+
+        return timed
+
+    def _patch(self, owner, name, stage):
+        if not hasattr(owner, name):
+            return
+        original = getattr(owner, name)
+        # Methods live on the class: the instance attribute shadowing them is deleted again on exit
+        self._restore.append((owner, name, original, name in vars(owner)))
+        setattr(owner, name, self.wrap(stage, original))
+
+    def __enter__(self):
+        pipeline = self.catcher.pipeline
+        detector = pipeline.detector
+        self._patch(detector, '_preprocess', 'detect_pre')
+        self._patch(detector, '_run_session', 'detect_run')
+        self._patch(detector, '_postprocess', 'detect_post')
+        self._patch(pipeline.recognizer, 'recognize_regions', 'recognize')
+        self._patch(pipeline, 'recognize', 'recognize')
+        self._patch(recognition_module, 'encode_region', 'crop')
+        self._patch(pipeline_module, 'get_rotate_crop_image', 'crop')
+        self._patch(pipeline_module, 'warp_region', 'crop')
+        self._restore.append((pipeline, 'classifier', pipeline.classifier, True))
+        pipeline.classifier = _Timed(self, 'classify', pipeline.classifier)
+
+        return self
+
+    def __exit__(self, *exc):
+        for owner, name, original, own_attribute in reversed(self._restore):
+            if own_attribute:
+                setattr(owner, name, original)
+            else:
+                delattr(owner, name)
+        self._restore = list()
+
+    def decode(self, data: bytes) -> np.ndarray:
+        return self.wrap('decode', cv2.imdecode)(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def _bench_config(catcher, frames: list, threads: int, repeat: int) -> dict:
+    # Warm up (sessions, bindings, buffers) outside the measurement
+    for data in frames[:2]:
+        catcher(cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR))
+    memory_accounting.reset_accounting()
+    totals = list()
+    lock = threading.Lock()
+    with StageTimer(catcher) as timer:
+        def worker(offset):
+            for idx in range(offset, len(frames) * repeat, threads):
+                t0 = time.perf_counter()
+                catcher(timer.decode(frames[idx % len(frames)]))
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    totals.append(elapsed)
+
+        workers = [threading.Thread(target=worker, args=(offset,)) for offset in range(threads)]
+        t0 = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        wall = time.perf_counter() - t0
+    stages = dict()
+    for stage, samples in timer.samples.items():
+        stages[stage] = dict(summarize(samples), per_frame_ms=float(np.sum(samples)) * 1000 / len(totals))
+
+    report = dict(frames=len(totals), throughput_fps=len(totals) / wall, total=summarize(totals), stages=stages)
+    memory_report = memory_accounting.accounting_report()
+    if memory_report is not None:
+        report['memory'] = memory_report
+
+    return report
+
+
+def environment() -> dict:
+    """Describes the host and library versions, so reports from different machines can be told apart."""
+    import onnxruntime as ort
+    return dict(platform=platform.platform(), machine=platform.machine(), processor=platform.processor(),
+                cpu_count=os.cpu_count(), python=platform.python_version(), numpy=np.__version__,
+                opencv=cv2.__version__, onnxruntime=ort.__version__)
+
+
+def run(images: str = None, synthetic: int = 16, size: tuple = (1080, 1920), levels: tuple = ('low', 'high'),
+        engines: tuple = ('ort',), threads: tuple = (1,), batches: tuple = (16,), repeat: int = 3,
+        memory: bool = False, memory_budget_mb: float = None) -> dict:
+    """Benchmarks the end to end pipeline per stage over a sweep of configurations.
+
+    Every configuration decodes the JPEG frames and runs a LicensePlateCatcher
+    on them, from `threads` workers sharing the catcher. Stage latencies are
+    per call and exclusive of nested stages: `crop` is the plate
+    rectification (warped straight into the recognizer input on the fused
+    path), `recognize` the rest of the recognizer call.
+
+    Args:
+        images (str, optional): Image folder. Defaults to None, which uses
+            synthetic frames.
+        synthetic (int, optional): Number of synthetic frames. Defaults to 16.
+        size (tuple, optional): (height, width) of the synthetic frames.
+            Defaults to 1080p.
+        levels (tuple, optional): Detect levels, 'low' and/or 'high'.
+        engines (tuple, optional): Engines, keys of concurrency.ENGINES.
+            Defaults to ('ort',).
+        threads (tuple, optional): Worker thread counts. Defaults to (1,).
+        batches (tuple, optional): Recognizer batch sizes (max plates per
+            session call). Only swept for an ONNX Runtime recognizer with a
+            dynamic batch axis, otherwise the model's fixed batch size is
+            used. Defaults to (16,).
+        repeat (int, optional): Passes over the frames per configuration.
+            Defaults to 3.
+        memory (bool, optional): Also account the memory of every traced
+            stage, see common.memory. tracemalloc slows down Python code, so
+            latencies of such runs are not comparable with the others.
+            Defaults to False.
+        memory_budget_mb (float, optional): Peak memory budget of a frame
+            passed to the catchers. Defaults to None (no limit).
+
+    Returns:
+        dict: The environment, the input description and one entry per
+            configuration with the throughput, the per-frame latency summary
+            and the per-stage summaries, plus the per-stage memory report
+            when memory is set.
+    """
+    frames = load_frames(images) if images else synthetic_frames(synthetic, size)
+    assert frames, f"No images found in {images}."
+    report = dict(environment=environment(), input=dict(images=images, frames=len(frames),
+                                                        size=None if images else list(size)), runs=list())
+    if memory:
+        memory_accounting.enable_accounting()
+    try:
+        for engine in engines:
+            for level in levels:
+                catcher = lpr3.LicensePlateCatcher(inference=ENGINES[engine], detect_level=DETECT_LEVELS[level],
+                                                   memory_budget_mb=memory_budget_mb)
+                recognizer = catcher.pipeline.recognizer
+                dynamic = not getattr(recognizer, 'static_batch', True)
+                sweep = batches if dynamic else (getattr(recognizer, 'max_batch', 1),)
+                for batch in sweep:
+                    if dynamic:
+                        # Also for a single value, so the reported batch is the one that ran
+                        recognizer.max_batch = batch
+                    for num in threads:
+                        entry = dict(engine=engine, detect_level=level, threads=num, batch=batch)
+                        entry.update(_bench_config(catcher, frames, num, repeat))
+                        report['runs'].append(entry)
+    finally:
+        if memory:
+            memory_accounting.disable_accounting()
+
+    return report
+
+
+if __name__ == "__main__":
+    from hyperlpr3.command.bench import bench
+    bench()
@@ -0,0 +1,106 @@
+import json
+import cv2
+import click
+import numpy as np
+from os.path import join
+import onnxruntime as ort
+import hyperlpr3 as lpr3
+from hyperlpr3.config.settings import onnx_runtime_config as ort_cfg, _DEFAULT_FOLDER_
+from hyperlpr3.benchmark.concurrency import load_images, ENGINES
+from hyperlpr3.benchmark.utils import measure
+
+# Model key and input shape of every benchmarked network
+MODELS = dict(
+    det_320=('det_model_path_320x', (1, 3, 320, 320)),
+    det_640=('det_model_path_640x', (1, 3, 640, 640)),
+    rec=('rec_model_path', (1, 3, 48, 160)),
+    cls=('cls_model_path', (1, 3, 96, 96)),
+)
+
+
+def ort_runner(path: str, shape: tuple, threads: int):
+    from hyperlpr3.common.ort_adapt import ORTAdapter
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    session = ORTAdapter(path, sess_options=options)
+    tensor = session.input_buffer(shape)
+    tensor[...] = np.random.default_rng(0).random(shape, dtype=np.float32)
+
+    return lambda: session.inference(tensor)
+
+
+def mnn_runner(path: str, shape: tuple, threads: int, precision: str):
+    from hyperlpr3.common.mnn_adapt import MNNAdapter
+    session = MNNAdapter(path, shape, num_thread=threads, precision=precision)
+    tensor = session.input_buffer()
+    tensor[...] = np.random.default_rng(0).random(shape, dtype=np.float32)
+
+    return lambda: session.inference(tensor)
+
+
+def dnn_runner(path: str, shape: tuple, threads: int):
+    from hyperlpr3.common.dnn_adapt import DNNAdapter
+    # cv2.dnn has no per-net thread setting, the pool size is process wide
+    cv2.setNumThreads(threads)
+    session = DNNAdapter(path)
+    tensor = session.input_buffer(shape)
+    tensor[...] = np.random.default_rng(0).random(shape, dtype=np.float32)
+
+    return lambda: session.inference(tensor)
+
+
+def run(repeat: int = 50, threads: tuple = (1, 2, 4), precision: str = 'normal', folder: str = _DEFAULT_FOLDER_,
+        images: str = None) -> dict:
+    """Compares ONNX Runtime, MNN and OpenCV DNN on CPU, per network and end to end.
+
+    Args:
+        repeat (int, optional): Number of timed calls. Defaults to 50.
+        threads (tuple, optional): Intra-op thread counts to compare. Defaults
+            to (1, 2, 4).
+        precision (str, optional): MNN precision mode. Defaults to 'normal'.
+        folder (str, optional): Model folder. Defaults to the package folder.
+        images (str, optional): Image folder for the end to end pass, defaults
+            to the repo assets.
+
+    Returns:
+        dict: Latency of each network per engine and thread count, and the
+            end to end latency of a LicensePlateCatcher per engine.
+    """
+    from hyperlpr3.hyperlpr3 import _mnn_model_path
+    cv_threads = cv2.getNumThreads()
+    report = dict(models=dict())
+    for name, (key, shape) in MODELS.items():
+        entry = dict()
+        for num in threads:
+            entry[f'ort_{num}t'] = measure(ort_runner(join(folder, ort_cfg[key]), shape, num), repeat=repeat,
+                                           track_alloc=False)
+            entry[f'mnn_{num}t'] = measure(mnn_runner(_mnn_model_path(folder, key), shape, num, precision),
+                                           repeat=repeat, track_alloc=False)
+            entry[f'dnn_{num}t'] = measure(dnn_runner(join(folder, ort_cfg[key]), shape, num), repeat=repeat,
+                                           track_alloc=False)
+        report['models'][name] = entry
+    cv2.setNumThreads(cv_threads)
+    samples = load_images(images)
+    report['catcher'] = dict()
+    for name, inference in ENGINES.items():
+        catcher = lpr3.LicensePlateCatcher(inference=inference, folder=folder, mnn_precision=precision)
+        report['catcher'][name] = measure(lambda: [catcher(image) for image in samples],
+                                          repeat=max(1, repeat // 10), warmup=1, track_alloc=False)
+    report['catcher']['images'] = len(samples)
+
+    return report
+
+
+@click.command(help="Benchmark the ONNX Runtime, MNN and OpenCV DNN engines on CPU.")
+@click.option("-repeat", "--repeat", default=50, type=int, )
+@click.option("-threads", "--threads", default="1,2,4", type=str, help="Comma separated thread counts.")
+@click.option("-precision", "--precision", default='normal', type=click.Choice(['normal', 'high', 'low']), )
+@click.option("-images", "--images", default=None, type=str, )
+def main(repeat, threads, precision, images):
+    threads = tuple(int(num) for num in threads.split(','))
+    print(json.dumps(run(repeat, threads, precision, images=images), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import json
+import cv2
+import click
+import numpy as np
+from os.path import join, dirname
+from hyperlpr3.common import tools_process
+from hyperlpr3.common.tokenize import token
+from hyperlpr3.inference import multitask_detect
+from hyperlpr3.inference.detect import ANCHORS_MAP
+from hyperlpr3.inference.recognition import ctc_greedy_decode
+from hyperlpr3.benchmark.postprocess import synthetic_detections
+from hyperlpr3.benchmark.ctc import synthetic_output
+from hyperlpr3.benchmark.utils import measure
+
+# Reference results of this suite, refresh with `--save` after an intended performance change
+BASELINE = join(dirname(__file__), 'micro_baseline.json')
+
+
+def _frame(size=(1080, 1920), seed=0):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (size[0] // 16, size[1] // 16, 3), dtype=np.uint8)
+
+    return cv2.resize(small, (size[1], size[0]), interpolation=cv2.INTER_CUBIC)
+
+
+def _candidates(count, input_size=640, seed=0):
+    # Fused [x1, y1, x2, y2, score, landmarks, class] rows as handed to the NMS implementations
+    dets = synthetic_detections(num_anchors=count, num_candidates=count, input_size=input_size, seed=seed)[0]
+    boxes = multitask_detect.xywh2xyxy(dets[:, :4])
+
+    return np.concatenate((boxes, dets[:, 4:5], dets[:, 5:13], np.zeros((count, 1), np.float32)), axis=1)
+
+
+def _yolo_layers(input_size=640, num_classes=2, seed=0):
+    # Raw (grid, grid, 3, 5 + classes) outputs of the three strides, as fed to `process`
+    rng = np.random.default_rng(seed)
+
+    return [rng.normal(-4, 2, (input_size // stride, input_size // stride, 3, 5 + num_classes)).astype(np.float32)
+            for stride in (8, 16, 32)]
+
+
+def _plate_quad(center=(960, 540), width=220, angle=8.0):
+    height = width * 140 / 440
+    box = cv2.boxPoints(((float(center[0]), float(center[1])), (width, height), angle))
+    # boxPoints starts at the bottom left, the crop expects top left first
+    return np.roll(box, -1, axis=0).astype(np.float32)
+
+
+def cases() -> dict:
+    """Builds the benchmarked calls: name -> (function, args), on synthetic per-frame sized inputs."""
+    frame = _frame()
+    candidates = {count: _candidates(count) for count in (100, 1000)}
+    layers = _yolo_layers()
+    anchors = ANCHORS_MAP[640]
+    masks = [[0, 1, 2], [3, 4, 5], [6, 7, 8]]
+    decoded = [tools_process.process(layer, mask, anchors, (640, 640)) for layer, mask in zip(layers, masks)]
+    xywh = candidates[1000][:, :4].copy()
+    prob = synthetic_output(8, 20)
+    characters = np.asarray(token, dtype=object)
+    report = dict()
+    for count, rows in candidates.items():
+        for name, fn in multitask_detect.NMS_BACKENDS.items():
+            report[f'nms/{name}/n={count}'] = (fn, (rows, 0.5))
+        report[f'nms_boxes/n={count}'] = (tools_process.nms_boxes, (rows[:, :4], rows[:, 4], 0.5))
+    report['xywh2xyxy/tools_process/n=1000'] = (tools_process.xywh2xyxy, (xywh,))
+    report['xywh2xyxy/multitask_detect/n=1000'] = (multitask_detect.xywh2xyxy, (xywh,))
+    report['letterbox/1080p->640'] = (tools_process.letterbox, (frame, (640, 640)))
+    report['letter_box/1080p->640'] = (multitask_detect.letter_box, (frame, (640, 640)))
+    report['letterbox_blob/1080p->640'] = (tools_process.letterbox_blob, (frame, (640, 640)))
+    report['get_rotate_crop_image/1080p'] = (lambda image, quad: tools_process.get_rotate_crop_image(image, quad.copy()),
+                                             (frame, _plate_quad()))
+    report['process/640/stride8'] = (tools_process.process, (layers[0], masks[0], anchors, (640, 640)))
+    report['filter_boxes/640/stride8'] = (tools_process.filter_boxes, decoded[0] + (0.5, 0.6))
+    report['post_precessing/640/n=500'] = (lambda dets: multitask_detect.post_precessing(dets.copy(), 1.0, 0, 0),
+                                           (synthetic_detections(num_candidates=500),))
+    report['ctc_decode/N=8/T=20'] = (ctc_greedy_decode, (prob, characters))
+
+    return report
+
+
+def run(repeat: int = 100, only: str = None) -> dict:
+    """Times every hot-path case and records its allocations.
+
+    Args:
+        repeat (int, optional): Timed calls per case. Defaults to 100.
+        only (str, optional): Only run the cases whose name contains this.
+
+    Returns:
+        dict: measure() results (latency summary and allocation peak /
+            retained bytes per call) keyed by case name.
+    """
+    report = dict()
+    for name, (fn, args) in cases().items():
+        if only and only not in name:
+            continue
+        report[name] = measure(fn, *args, repeat=repeat, warmup=3)
+
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.5, alloc_tolerance: float = 0.1) -> list:
+    """Lists the cases that got slower or allocate more than in the baseline.
+
+    Latency is compared on the median, which is the most stable statistic on
+    a shared machine; allocations are deterministic so their tolerance can be
+    tight. Cases missing from either side are ignored.
+
+    Args:
+        report (dict): Result of `run`.
+        baseline (dict): A previous result of `run`, e.g. the baseline file.
+        tolerance (float, optional): Allowed relative p50 increase. Defaults to 0.5.
+        alloc_tolerance (float, optional): Allowed relative allocation peak
+            increase (plus 4 KiB of slack). Defaults to 0.1.
+
+    Returns:
+        list: One dict per regression with the case, metric, baseline and
+            current values.
+    """
+    regressions = list()
+    for name, current in report.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if current['p50_ms'] > reference['p50_ms'] * (1 + tolerance):
+            regressions.append(dict(case=name, metric='p50_ms', baseline=reference['p50_ms'], current=current['p50_ms']))
+        peak, reference_peak = current.get('alloc_peak_bytes'), reference.get('alloc_peak_bytes')
+        if peak is not None and reference_peak is not None and peak > reference_peak * (1 + alloc_tolerance) + 4096:
+            regressions.append(dict(case=name, metric='alloc_peak_bytes', baseline=reference_peak, current=peak))
+
+    return regressions
+
+
+@click.command(help="Microbenchmark the per-frame hot functions (NMS, letterbox, crop, decode, ...) without models.")
+@click.option("-repeat", "--repeat", default=100, type=int, )
+@click.option("-only", "--only", default=None, type=str, help="Only run the cases whose name contains this.")
+@click.option("-baseline", "--baseline", default=BASELINE, type=str, help="Baseline file to compare with.")
+@click.option("-save", "--save", is_flag=True, help="Write the results to the baseline file instead of comparing.")
+@click.option("-tolerance", "--tolerance", default=0.5, type=float, help="Allowed relative p50 increase.")
+def main(repeat, only, baseline, save, tolerance):
+    report = run(repeat, only)
+    if save:
+        with open(baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(json.dumps(report, indent=2))
+        return
+    with open(baseline) as f:
+        regressions = compare(report, json.load(f), tolerance)
+    print(json.dumps(dict(results=report, regressions=regressions), indent=2))
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
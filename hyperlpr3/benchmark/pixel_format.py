@@ -0,0 +1,79 @@
+import json
+import cv2
+import click
+import numpy as np
+from hyperlpr3.common.typedef import PIXEL_FORMAT_BGR, PIXEL_FORMAT_RGB, PIXEL_FORMAT_NV12, PIXEL_FORMAT_I420
+from hyperlpr3.common.tools_process import letterbox_blob
+from hyperlpr3.benchmark.decode import synthetic_jpeg
+from hyperlpr3.benchmark.utils import measure
+
+FORMATS = dict(rgb=PIXEL_FORMAT_RGB, nv12=PIXEL_FORMAT_NV12, i420=PIXEL_FORMAT_I420)
+
+TO_BGR = {
+    PIXEL_FORMAT_RGB: cv2.COLOR_RGB2BGR,
+    PIXEL_FORMAT_NV12: cv2.COLOR_YUV2BGR_NV12,
+    PIXEL_FORMAT_I420: cv2.COLOR_YUV2BGR_I420,
+}
+
+
+def synthetic_frames(size: tuple = (1080, 1920)) -> dict:
+    """Builds the same frame in each benchmarked camera pixel format."""
+    bgr = cv2.imdecode(np.frombuffer(synthetic_jpeg(size), dtype=np.uint8), cv2.IMREAD_COLOR)
+    i420 = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420)
+    h, w = size
+    quarter = (h // 2) * (w // 2)
+    chroma = i420.reshape(-1)[h * w:]
+    uv = np.stack([chroma[:quarter], chroma[quarter:]], axis=-1).reshape(-1)
+    nv12 = np.concatenate([i420.reshape(-1)[:h * w], uv]).reshape(h * 3 // 2, w)
+
+    return {PIXEL_FORMAT_BGR: bgr, PIXEL_FORMAT_RGB: bgr[:, :, ::-1].copy(),
+            PIXEL_FORMAT_NV12: nv12, PIXEL_FORMAT_I420: i420}
+
+
+def run(repeat: int = 50, input_size: int = 640, height: int = 1080, width: int = 1920) -> dict:
+    """Compares converting frames to BGR first with the native pixel format path.
+
+    Only the detector preprocessing is timed, which is where the full frame
+    conversion used to happen; plate crops are converted at crop resolution.
+
+    Args:
+        repeat (int, optional): Number of timed frames. Defaults to 50.
+        input_size (int, optional): Detector input size. Defaults to 640.
+        height (int, optional): Frame height. Defaults to 1080.
+        width (int, optional): Frame width. Defaults to 1920.
+
+    Returns:
+        dict: Latency per format of the convert-then-preprocess path and of
+            the native path.
+    """
+    frames = synthetic_frames((height, width))
+    size = (input_size, input_size)
+    out = np.empty((1, 3, input_size, input_size), dtype=np.float32)
+    canvas = np.empty((input_size, input_size, 3), dtype=np.uint8)
+    report = dict()
+    for name, pixel_format in FORMATS.items():
+        frame = frames[pixel_format]
+
+        def convert_first():
+            return letterbox_blob(cv2.cvtColor(frame, TO_BGR[pixel_format]), size, out=out, canvas=canvas)
+
+        def native():
+            return letterbox_blob(frame, size, out=out, canvas=canvas, pixel_format=pixel_format)
+
+        report[name] = dict(convert_first=measure(convert_first, repeat=repeat),
+                            native=measure(native, repeat=repeat))
+
+    return report
+
+
+@click.command(help="Benchmark native camera pixel formats in detector preprocessing.")
+@click.option("-repeat", "--repeat", default=50, type=int, )
+@click.option("-input_size", "--input_size", default=640, type=int, )
+@click.option("-height", "--height", default=1080, type=int, )
+@click.option("-width", "--width", default=1920, type=int, )
+def main(repeat, input_size, height, width):
+    print(json.dumps(run(repeat, input_size, height, width), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import json
+import click
+import numpy as np
+from hyperlpr3.inference.multitask_detect import post_precessing, NMS_BACKENDS
+from hyperlpr3.benchmark.utils import measure
+
+
+def synthetic_detections(num_anchors: int = 25200, num_candidates: int = 3000, input_size: int = 640,
+                         seed: int = 0) -> np.ndarray:
+    """Builds a raw multitask detector output with many low-score candidates.
+
+    Args:
+        num_anchors (int, optional): Rows of the output (6300 for 320, 25200 for 640).
+        num_candidates (int, optional): Rows whose objectness passes a 0.25 threshold.
+        input_size (int, optional): Detector input size the boxes live in.
+        seed (int, optional): Random seed.
+
+    Returns:
+        np.ndarray: Array of shape (1, num_anchors, 15).
+    """
+    rng = np.random.default_rng(seed)
+    dets = np.zeros((1, num_anchors, 15), dtype=np.float32)
+    dets[0, :, 0:2] = rng.uniform(0, input_size, (num_anchors, 2))
+    dets[0, :, 2] = rng.uniform(20, 120, num_anchors)
+    dets[0, :, 3] = dets[0, :, 2] / rng.uniform(2.5, 4.0, num_anchors)
+    dets[0, :, 4] = rng.uniform(0, 0.2, num_anchors)
+    dets[0, :num_candidates, 4] = rng.uniform(0.26, 1.0, num_candidates)
+    dets[0, :, 5:13] = rng.uniform(0, input_size, (num_anchors, 8))
+    dets[0, :, 13:15] = rng.uniform(0, 1, (num_anchors, 2))
+
+    return dets
+
+
+def run(repeat: int = 50, candidates: tuple = (50, 500, 3000), max_candidates: tuple = (None, 1000, 300)) -> dict:
+    """Benchmarks detector post-processing across NMS backends and top-k bounds.
+
+    Args:
+        repeat (int, optional): Number of timed calls per case. Defaults to 50.
+        candidates (tuple, optional): Numbers of candidates above the threshold.
+        max_candidates (tuple, optional): Top-k bounds to compare (None disables it).
+
+    Returns:
+        dict: Latency statistics keyed by case name.
+    """
+    report = dict()
+    for num_candidates in candidates:
+        dets = synthetic_detections(num_candidates=num_candidates)
+        for backend in NMS_BACKENDS:
+            for k in max_candidates:
+                if backend == 'python' and k is None and num_candidates > 1000:
+                    repeat_ = max(1, repeat // 10)
+                else:
+                    repeat_ = repeat
+                tag = f"candidates={num_candidates}/backend={backend}/max_candidates={k}"
+                report[tag] = measure(post_precessing, dets, 1.0, 0, 0, conf_thresh=0.25, iou_thresh=0.5,
+                                      max_candidates=k, nms_backend=backend, repeat=repeat_, warmup=1,
+                                      track_alloc=False)
+
+    return report
+
+
+@click.command(help="Benchmark detector post-processing and NMS backends.")
+@click.option("-repeat", "--repeat", default=50, type=int, )
+def main(repeat):
+    print(json.dumps(run(repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import json
+import click
+import numpy as np
+from hyperlpr3.common.tools_process import letterbox, letterbox_blob
+from hyperlpr3.inference.multitask_detect import letter_box
+from hyperlpr3.benchmark.utils import measure
+
+
+def legacy_detect_preprocess(image, size):
+    # Reference copy of the multitask detector preprocessing before the fused routine
+    img, r, left, top = letter_box(image, size)
+    img = img[:, :, ::-1].transpose(2, 0, 1).copy().astype(np.float32)
+    img = img / 255
+    img = img.reshape(1, *img.shape)
+    return img, r, left, top
+
+
+def legacy_y5rk_preprocess(image, size):
+    # Reference copy of the Y5rk detector preprocessing (letterbox + image_to_input_tensor)
+    import cv2
+    resize_img, ratio, (dw, dh) = letterbox(image, new_shape=size)
+    data = cv2.cvtColor(resize_img, cv2.COLOR_BGR2RGB)
+    data = data.transpose(2, 0, 1) / 255.0
+    data = np.expand_dims(data, 0)
+    data = data.astype(np.float32)
+    return data, ratio, (dw, dh)
+
+
+def run(repeat: int = 100,
+        frame_sizes: tuple = ((480, 640), (1080, 1920), (2160, 3840)),
+        input_sizes: tuple = (320, 640)) -> dict:
+    """Benchmarks the fused letterbox preprocessing against the legacy paths.
+
+    Args:
+        repeat (int, optional): Number of timed calls per case. Defaults to 100.
+        frame_sizes (tuple, optional): Synthetic frame (height, width) sizes.
+        input_sizes (tuple, optional): Square detector input sizes.
+
+    Returns:
+        dict: Latency and allocation statistics keyed by case name.
+    """
+    rng = np.random.default_rng(0)
+    report = dict()
+    for frame_h, frame_w in frame_sizes:
+        image = rng.integers(0, 255, (frame_h, frame_w, 3), dtype=np.uint8)
+        for input_size in input_sizes:
+            size = (input_size, input_size)
+            out = np.empty((1, 3, input_size, input_size), dtype=np.float32)
+            canvas = np.empty((input_size, input_size, 3), dtype=np.uint8)
+            tag = f"{frame_w}x{frame_h}->{input_size}"
+            report[tag] = dict(
+                legacy_multitask=measure(legacy_detect_preprocess, image, size, repeat=repeat),
+                legacy_y5rk=measure(legacy_y5rk_preprocess, image, size, repeat=repeat),
+                fused=measure(letterbox_blob, image, size, repeat=repeat),
+                fused_buffers=measure(letterbox_blob, image, size, out=out, canvas=canvas, repeat=repeat),
+            )
+
+    return report
+
+
+@click.command(help="Benchmark the fused detector preprocessing.")
+@click.option("-repeat", "--repeat", default=100, type=int, )
+def main(repeat):
+    print(json.dumps(run(repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
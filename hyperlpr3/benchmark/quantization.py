@@ -0,0 +1,107 @@
+import json
+import click
+import numpy as np
+from os.path import join
+import hyperlpr3 as lpr3
+from hyperlpr3.config.settings import onnx_runtime_config as ort_cfg, _DEFAULT_FOLDER_
+from hyperlpr3.common.quantization import int8_model_path, load_calibration_images
+from hyperlpr3.benchmark.engines import MODELS, ort_runner
+from hyperlpr3.benchmark.utils import measure
+
+
+def box_iou(a, b) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+
+    return inter / union if union > 0 else 0.0
+
+
+def compare_results(reference: list, candidate: list, iou_thresh: float = 0.5) -> dict:
+    """Matches the plates of two catchers on the same images and counts the agreement.
+
+    Args:
+        reference (list): Per image results of the FP32 catcher.
+        candidate (list): Per image results of the INT8 catcher.
+        iou_thresh (float, optional): Box IoU for two plates to be the same
+            detection. Defaults to 0.5.
+
+    Returns:
+        dict: Plate counts, detections matched, matched plates with the same
+            text, and the mean absolute confidence difference of those.
+    """
+    matched, same_text, conf_diff = 0, 0, list()
+    for ref_plates, cand_plates in zip(reference, candidate):
+        free = list(cand_plates)
+        for ref in ref_plates:
+            ious = [box_iou(ref[3], cand[3]) for cand in free]
+            if not ious or max(ious) < iou_thresh:
+                continue
+            cand = free.pop(int(np.argmax(ious)))
+            matched += 1
+            if cand[0] == ref[0]:
+                same_text += 1
+                conf_diff.append(abs(float(cand[1]) - float(ref[1])))
+    reference_plates = sum(len(plates) for plates in reference)
+    candidate_plates = sum(len(plates) for plates in candidate)
+
+    return dict(reference_plates=reference_plates, candidate_plates=candidate_plates, matched=matched,
+                same_text=same_text, text_agreement=same_text / reference_plates if reference_plates else 1.0,
+                mean_conf_diff=float(np.mean(conf_diff)) if conf_diff else 0.0)
+
+
+def run(images: str, folder: str = _DEFAULT_FOLDER_, repeat: int = 50, threads: int = 1,
+        max_images: int = 200) -> dict:
+    """Compares the FP32 models with their INT8 variants on accuracy and latency.
+
+    Accuracy is measured as agreement with the FP32 pipeline, so any folder of
+    representative frames works and no labels are needed. Use images other
+    than the calibration set for an unbiased estimate.
+
+    Args:
+        images (str): Evaluation image folder.
+        folder (str, optional): Model folder. Defaults to the package folder.
+        repeat (int, optional): Timed calls per model. Defaults to 50.
+        threads (int, optional): ORT intra-op threads. Defaults to 1.
+        max_images (int, optional): Maximum number of evaluation images.
+            Defaults to 200.
+
+    Returns:
+        dict: Per network the FP32/INT8 latency and size, and per detect level
+            the end to end agreement and latency.
+    """
+    samples = load_calibration_images(images, max_images)
+    assert samples, f"No images found in {images}."
+    report = dict(models=dict(), pipeline=dict())
+    for name, (key, shape) in MODELS.items():
+        src = join(folder, ort_cfg[key])
+        report['models'][name] = dict(fp32=measure(ort_runner(src, shape, threads), repeat=repeat, track_alloc=False),
+                                      int8=measure(ort_runner(int8_model_path(src), shape, threads), repeat=repeat,
+                                                   track_alloc=False))
+    for level_name, level in (('low', lpr3.DETECT_LEVEL_LOW), ('high', lpr3.DETECT_LEVEL_HIGH)):
+        entry = dict()
+        outputs = dict()
+        for precision in ('fp32', 'int8'):
+            catcher = lpr3.LicensePlateCatcher(folder=folder, detect_level=level, precision=precision)
+            outputs[precision] = [catcher(image) for image in samples]
+            entry[precision] = measure(lambda: [catcher(image) for image in samples], repeat=max(1, repeat // 10),
+                                       warmup=1, track_alloc=False)
+        entry['agreement'] = compare_results(outputs['fp32'], outputs['int8'])
+        report['pipeline'][level_name] = entry
+    report['images'] = len(samples)
+
+    return report
+
+
+@click.command(help="Compare the FP32 and INT8 models on accuracy and latency.")
+@click.option("-images", "--images", required=True, type=str, help="Evaluation image folder.")
+@click.option("-folder", "--folder", default=_DEFAULT_FOLDER_, type=str, )
+@click.option("-repeat", "--repeat", default=50, type=int, )
+@click.option("-threads", "--threads", default=1, type=int, )
+def main(images, folder, repeat, threads):
+    print(json.dumps(run(images, folder, repeat, threads), indent=2))
+
+
+if __name__ == "__main__":
+    main()
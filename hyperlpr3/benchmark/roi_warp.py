@@ -0,0 +1,59 @@
+import json
+import cv2
+import click
+import numpy as np
+from hyperlpr3.common.tools_process import get_rotate_crop_image
+from hyperlpr3.benchmark.crop import synthetic_plates
+from hyperlpr3.benchmark.utils import measure
+
+RESOLUTIONS = ((720, 1280), (1080, 1920), (2160, 3840), (3000, 4000))
+
+INTERPOLATIONS = dict(linear=cv2.INTER_LINEAR, cubic=cv2.INTER_CUBIC)
+
+
+def full_frame_crop(img, points, interpolation=cv2.INTER_CUBIC):
+    # get_rotate_crop_image before the bounded ROI: the whole frame is handed to warpPerspective
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    pts_std = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    M = cv2.getPerspectiveTransform(points.astype(np.float32), pts_std)
+    dst_img = cv2.warpPerspective(img, M, (width, height), borderMode=cv2.BORDER_REPLICATE, flags=interpolation)
+    if height * 1.0 / width >= 1.5:
+        dst_img = np.rot90(dst_img)
+
+    return dst_img
+
+
+def run(repeat: int = 50, count: int = 16) -> dict:
+    """Measures plate crop time as a function of the frame resolution.
+
+    Args:
+        repeat (int, optional): Number of timed passes over the plates. Defaults to 50.
+        count (int, optional): Number of plates per frame. Defaults to 16.
+
+    Returns:
+        dict: Latency per pass, keyed by resolution, interpolation and method.
+    """
+    report = dict()
+    for size in RESOLUTIONS:
+        image, plates = synthetic_plates(count, size)
+        entry = dict()
+        for name, flag in INTERPOLATIONS.items():
+            entry[f'full_frame_{name}'] = measure(lambda: [full_frame_crop(image, pts, flag) for pts in plates],
+                                                  repeat=repeat, track_alloc=False)
+            entry[f'bounded_roi_{name}'] = measure(lambda: [get_rotate_crop_image(image, pts, flag) for pts in plates],
+                                                   repeat=repeat, track_alloc=False)
+        report[f'{size[1]}x{size[0]}'] = entry
+
+    return report
+
+
+@click.command(help="Benchmark plate cropping against the frame resolution.")
+@click.option("-repeat", "--repeat", default=50, type=int, )
+@click.option("-count", "--count", default=16, type=int, )
+def main(repeat, count):
+    print(json.dumps(run(repeat, count), indent=2))
+
+
+if __name__ == "__main__":
+    main()
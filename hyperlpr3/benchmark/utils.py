@@ -0,0 +1,71 @@
+import time
+import tracemalloc
+import numpy as np
+from hyperlpr3.common.latency import summarize
+
+
+def measure(fn, *args, repeat: int = 100, warmup: int = 5, track_alloc: bool = True, **kwargs) -> dict:
+    """Times repeated calls of a function and optionally tracks numpy/python allocations.
+
+    Allocations are measured with tracemalloc (numpy reports its data buffers
+    to it), in a separate pass so the tracing overhead does not pollute the
+    latency numbers.
+
+    Args:
+        fn: Callable to benchmark.
+        *args: Positional arguments passed to fn.
+        repeat (int, optional): Number of timed calls. Defaults to 100.
+        warmup (int, optional): Number of untimed calls run first. Defaults to 5.
+        track_alloc (bool, optional): If True, also report the allocations per
+            call. Defaults to True.
+        **kwargs: Keyword arguments passed to fn.
+
+    Returns:
+        dict: Latency summary, plus `alloc_peak_bytes` (transient peak above
+            the pre-call level) and `alloc_retained_bytes` per call when
+            track_alloc is set.
+    """
+    for _ in range(warmup):
+        fn(*args, **kwargs)
+    samples = list()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args, **kwargs)
+        samples.append(time.perf_counter() - t0)
+    result = summarize(samples)
+    if track_alloc:
+        result.update(measure_alloc(fn, *args, repeat=max(1, min(repeat, 20)), **kwargs))
+
+    return result
+
+
+def measure_alloc(fn, *args, repeat: int = 20, **kwargs) -> dict:
+    """Measures the per-call allocation footprint of a function with tracemalloc.
+
+    Args:
+        fn: Callable to measure.
+        *args: Positional arguments passed to fn.
+        repeat (int, optional): Number of measured calls. Defaults to 20.
+        **kwargs: Keyword arguments passed to fn.
+
+    Returns:
+        dict: Mean `alloc_peak_bytes` and `alloc_retained_bytes` per call.
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    peaks, retained = list(), list()
+    try:
+        for _ in range(repeat):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            result = fn(*args, **kwargs)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+            del result
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    return dict(alloc_peak_bytes=float(np.mean(peaks)), alloc_retained_bytes=float(np.mean(retained)))
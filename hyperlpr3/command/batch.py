@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import click
+from loguru import logger
+from hyperlpr3.config.settings import _DEFAULT_FOLDER_
+
+
+@click.command(help="Recognize the images of directories, glob patterns or a file list and write JSONL, CSV or "
+                    "Parquet. Interrupted runs resume from their checkpoint.")
+@click.option("-src", "--src", multiple=True, type=str,
+              help="Directory (recursive), glob pattern or image path, can be repeated.")
+@click.option("-list", "--list", "list_file", default=None, type=str, help="File with one image path per line.")
+@click.option("-output", "--output", required=True, type=str,
+              help="Output file (.jsonl, .csv) or directory (.parquet).")
+@click.option("-format", "--format", "fmt", default=None, type=click.Choice(['jsonl', 'csv', 'parquet']),
+              help="Output format, defaults to the output extension.")
+@click.option("-processes", "--processes", default=1, type=int, help="Recognition processes.")
+@click.option("-prefetch", "--prefetch", default=4, type=int, help="Image reading/decoding threads per process.")
+@click.option("-chunk", "--chunk", default=64, type=int, help="Images per chunk (unit of work and of checkpointing).")
+@click.option("-restart", "--restart", is_flag=True, help="Ignore the checkpoint and overwrite the output.")
+@click.option("-det", "--det", default='low', type=click.Choice(['low', 'high']), )
+@click.option("-folder", "--folder", default=_DEFAULT_FOLDER_, type=str, help="Model folder.")
+@click.option("-memory_budget", "--memory_budget", default=None, type=float, help="Peak memory budget of a frame, MiB.")
+def batch(src, list_file, output, fmt, processes, prefetch, chunk, restart, det, folder, memory_budget):
+    import hyperlpr3 as lpr3
+    from tqdm import tqdm
+    from hyperlpr3.common.batch import iter_paths, run_batch
+    if not src and not list_file:
+        raise click.UsageError("Pass at least one --src or a --list.")
+    options = dict(detect_level=lpr3.DETECT_LEVEL_LOW if det == 'low' else lpr3.DETECT_LEVEL_HIGH, folder=folder,
+                   memory_budget_mb=memory_budget)
+    with tqdm(unit='img') as bar:
+        try:
+            summary = run_batch(iter_paths(src, list_file), output, fmt=fmt, processes=processes, prefetch=prefetch,
+                                chunk_size=chunk, restart=restart, catcher_options=options, progress=bar.update)
+        except ValueError as err:
+            raise click.ClickException(str(err))
+    logger.success(f"{summary['processed']} images processed ({summary['done']} in total), "
+                   f"{summary['plates']} plates in {summary['with_plates']} images, {summary['errors']} errors.")
+
+
+if __name__ == "__main__":
+    batch()
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import json
+import click
+
+
+def _parse_list(value: str, cast=str) -> tuple:
+    return tuple(cast(item) for item in value.split(',') if item)
+
+
+@click.command(help="Benchmark the pipeline end to end, per stage, over a sweep of configurations.")
+@click.option("-images", "--images", default=None, type=str, help="Image folder, synthetic frames when omitted.")
+@click.option("-synthetic", "--synthetic", default=16, type=int, help="Number of synthetic frames.")
+@click.option("-size", "--size", default="1920x1080", type=str, help="Synthetic frame size, WIDTHxHEIGHT.")
+@click.option("-levels", "--levels", default="low,high", type=str, help="Comma separated detect levels (low, high).")
+@click.option("-engines", "--engines", default="ort", type=str, help="Comma separated engines (ort, mnn, dnn).")
+@click.option("-threads", "--threads", default="1", type=str, help="Comma separated worker thread counts.")
+@click.option("-batches", "--batches", default="16", type=str, help="Comma separated recognizer batch sizes.")
+@click.option("-repeat", "--repeat", default=3, type=int, help="Passes over the frames per configuration.")
+@click.option("-memory", "--memory", is_flag=True,
+              help="Also report the per-stage memory (slows down Python code, latencies are not comparable).")
+@click.option("-memory_budget", "--memory_budget", default=None, type=float, help="Peak memory budget of a frame, MiB.")
+@click.option("-output", "--output", default=None, type=str, help="Also write the JSON report to this file.")
+def bench(images, synthetic, size, levels, engines, threads, batches, repeat, memory, memory_budget, output):
+    from hyperlpr3.benchmark.end_to_end import run
+    width, height = _parse_list(size.lower().replace('x', ','), int)
+    report = run(images, synthetic, (height, width), _parse_list(levels), _parse_list(engines),
+                 _parse_list(threads, int), _parse_list(batches, int), repeat, memory, memory_budget)
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text)
+    print(text)
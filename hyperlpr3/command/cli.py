@@ -2,6 +2,11 @@ import click
 from hyperlpr3.command.aliased_group import AliasedGroup
 from hyperlpr3.command.sample import sample
 from hyperlpr3.command.serve import rest
+from hyperlpr3.command.surgery import prune, bake, nms
+from hyperlpr3.command.quantize import quantize
+from hyperlpr3.command.bench import bench
+from hyperlpr3.command.batch import batch
+from hyperlpr3.command.video import video
 
 __all__ = ['cli']
 
@@ -15,6 +20,13 @@ def cli():
 
 cli.add_command(sample)
 cli.add_command(rest)
+cli.add_command(prune)
+cli.add_command(quantize)
+cli.add_command(bake)
+cli.add_command(nms)
+cli.add_command(bench)
+cli.add_command(batch)
+cli.add_command(video)
 
 if __name__ == '__main__':
     cli()
\ No newline at end of file
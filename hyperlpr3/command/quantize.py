@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+import json
+import click
+from loguru import logger
+from hyperlpr3.config.settings import _DEFAULT_FOLDER_
+
+
+@click.command(help="Statically quantize the models to INT8 from a folder of calibration images.")
+@click.option("-images", "--images", required=True, type=str, help="Calibration image folder.")
+@click.option("-folder", "--folder", default=_DEFAULT_FOLDER_, type=str, help="Model folder.")
+@click.option("-max_images", "--max_images", default=200, type=int, help="Maximum number of calibration images.")
+@click.option("-per_channel/-per_tensor", "--per_channel/--per_tensor", default=True,
+              help="Per channel or per tensor weight scales.")
+@click.option("-report", "--report", default=None, type=str,
+              help="Image folder to compare FP32 and INT8 on after quantizing (preferably not the calibration set).")
+def quantize(images, folder, max_images, per_channel, report):
+    from hyperlpr3.common.quantization import quantize_models
+    info = quantize_models(images, folder, max_images=max_images, per_channel=per_channel)
+    for key, entry in info.items():
+        logger.success(f"{key}: {entry['path']}, {entry['src_bytes']} -> {entry['dst_bytes']} bytes, "
+                       f"{entry['samples']} calibration samples")
+    if report:
+        from hyperlpr3.benchmark.quantization import run
+        print(json.dumps(run(report, folder), indent=2))
@@ -28,8 +28,7 @@ def is_http_url(s):
 def url_to_image(url):
     try:
         resp = urllib.request.urlopen(url)
-        image = np.asarray(bytearray(resp.read()), dtype="uint8")
-        image = cv2.imdecode(image, cv2.IMREAD_COLOR)
+        image = lpr3.EncodedImage(resp.read())
     except Exception as err:
         return None
 
@@ -37,6 +36,7 @@ def url_to_image(url):
 
 
 def get_image(path: str):
+    # Kept encoded: large JPEGs are decoded at reduced scale for detection, see LicensePlateCatcher.recognize_encoded
     image = None
     if is_http_url(path):
         # url
@@ -44,10 +44,8 @@ def get_image(path: str):
     else:
         # local path
         if path.split('.')[-1].lower() in ('jpg', 'png', 'jpeg', 'bmp',):
-            image = cv2.imread(path)
-    try:
-        h, w, c = image.shape
-    except Exception as err:
+            image = lpr3.EncodedImage.from_file(path)
+    if image is None or (image.size is None and image.full() is None):
         logger.error("Failed to read image from path or url.")
         return False, None
 
@@ -66,7 +64,7 @@ def sample(src, det):
             level = lpr3.DETECT_LEVEL_HIGH
         catcher = lpr3.LicensePlateCatcher(detect_level=level)
         print("--" * 20)
-        result = catcher(image)
+        result = catcher.recognize_encoded(image)
         logger.info(f"共检测到车牌: {len(result)}")
         for res in result:
             code, conf, plate_type, box, layer_num = res
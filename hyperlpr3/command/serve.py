@@ -104,9 +104,10 @@ async def vehicle_license_plate_recognition(file: List[UploadFile] = File(...)):
         if file[0].filename.rsplit('.', 1)[1].lower() not in ['png', 'jpeg', 'jpg', 'wabp']:
             return BaseResponse().http_request_parameter_error(error_msg='上传必须为图片类型png/jpg/jpge')
         content = await file[0].read()
-        nparr = np.fromstring(content, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR).astype(np.uint8)
-        plates = catcher(img)
+        image = lpr3.EncodedImage(content)
+        if image.size is None and image.full() is None:
+            return BaseResponse().http_request_parameter_error(error_msg='图片解码失败')
+        plates = catcher.recognize_encoded(image)
         results = list()
         for code, conf, plate_type, box, layer_num in plates:
             if "nan" != f"{conf}":  # conf=nan会导致Json序列化错误
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import os
+import click
+from loguru import logger
+from hyperlpr3.config.settings import _DEFAULT_FOLDER_, onnx_runtime_config
+
+
+@click.command(help="Prune the recognition model output to the plate character set.")
+@click.option("-src", "--src", default=None, type=str, help="Source recognition model, defaults to the bundled one.")
+@click.option("-dst", "--dst", default=None, type=str, help="Output path, defaults to <src>_plate.onnx.")
+@click.option("-charset", "--charset", default=None, type=str, help="Characters to keep, defaults to plate symbols.")
+def prune(src, dst, charset):
+    from hyperlpr3.common.graph_surgery import prune_output_classes
+    from hyperlpr3.common.tokenize import token, plate_charset
+    from hyperlpr3.inference.recognition import charset_indices
+    if src is None:
+        src = os.path.join(_DEFAULT_FOLDER_, onnx_runtime_config['rec_model_path'])
+    if dst is None:
+        dst = os.path.splitext(src)[0] + "_plate.onnx"
+    keep = charset_indices(token, charset if charset else plate_charset)
+    info = prune_output_classes(src, dst, keep)
+    logger.success(f"{src} -> {dst}: classes {info['src_classes']} -> {info['dst_classes']}, "
+                   f"size {info['src_bytes']} -> {info['dst_bytes']} bytes")
+
+
+# Input normalization of each model, as done in Python by the runtime for the float32 models
+BAKE_PRESETS = dict(
+    det_model_path_320x=dict(mean=0.0, scale=1 / 255.0, swap_rb=True),
+    det_model_path_640x=dict(mean=0.0, scale=1 / 255.0, swap_rb=True),
+    rec_model_path=dict(mean=127.5, scale=1 / 127.5, swap_rb=False),
+    cls_model_path=dict(mean=0.0, scale=1 / 255.0, swap_rb=False),
+)
+
+
+@click.command(help="Bake the input normalization into the models so they take uint8 NHWC BGR images.")
+@click.option("-folder", "--folder", default=_DEFAULT_FOLDER_, type=str, help="Model folder.")
+@click.option("-precision", "--precision", default='fp32', type=click.Choice(['fp32', 'int8']),
+              help="Bake the FP32 models or the INT8 variants created by 'lpr3 quantize'.")
+def bake(folder, precision):
+    from hyperlpr3.common.graph_surgery import bake_preprocess
+    from hyperlpr3.config.settings import INT8_SUFFIX, BAKED_SUFFIX
+    for key, preset in BAKE_PRESETS.items():
+        stem, ext = os.path.splitext(os.path.join(folder, onnx_runtime_config[key]))
+        if precision == 'int8':
+            stem += INT8_SUFFIX
+        src, dst = stem + ext, stem + BAKED_SUFFIX + ext
+        info = bake_preprocess(src, dst, **preset)
+        logger.success(f"{src} -> {dst}: input {info['input_shape']} uint8")
+
+
+@click.command(help="Append thresholding, score fusion and NMS to the detectors so they only output the kept plates.")
+@click.option("-folder", "--folder", default=_DEFAULT_FOLDER_, type=str, help="Model folder.")
+@click.option("-precision", "--precision", default='fp32', type=click.Choice(['fp32', 'int8']),
+              help="Use the FP32 detectors or the INT8 variants created by 'lpr3 quantize'.")
+@click.option("-baked", "--baked", is_flag=True, help="Use the uint8 input variants created by 'lpr3 bake'.")
+@click.option("-conf_thresh", "--conf_thresh", default=0.25, type=float, )
+@click.option("-iou_thresh", "--iou_thresh", default=0.5, type=float, )
+@click.option("-max_candidates", "--max_candidates", default=1000, type=int, )
+def nms(folder, precision, baked, conf_thresh, iou_thresh, max_candidates):
+    from hyperlpr3.common.graph_surgery import append_nms
+    from hyperlpr3.config.settings import INT8_SUFFIX, BAKED_SUFFIX, NMS_SUFFIX
+    for key in ('det_model_path_320x', 'det_model_path_640x'):
+        stem, ext = os.path.splitext(os.path.join(folder, onnx_runtime_config[key]))
+        stem += (INT8_SUFFIX if precision == 'int8' else '') + (BAKED_SUFFIX if baked else '')
+        src, dst = stem + ext, stem + NMS_SUFFIX + ext
+        info = append_nms(src, dst, conf_thresh=conf_thresh, iou_thresh=iou_thresh, max_candidates=max_candidates)
+        logger.success(f"{src} -> {dst}: {info['candidates']} candidates -> kept plates only")
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import json
+import click
+from loguru import logger
+from hyperlpr3.config.settings import _DEFAULT_FOLDER_
+
+
+@click.command(help="Recognize the plates of a video, writing per-frame results and a throughput summary.")
+@click.option("-src", "--src", required=True, type=str, help="Video file, stream URL or camera index.")
+@click.option("-output", "--output", default=None, type=str,
+              help="JSONL file for the per-frame results, printed when omitted.")
+@click.option("-stride", "--stride", default=1, type=int, help="Recognize every stride-th frame.")
+@click.option("-start", "--start", default=None, type=float, help="Start time in seconds.")
+@click.option("-end", "--end", default=None, type=float, help="End time in seconds.")
+@click.option("-buffer", "--buffer", default=8, type=int, help="Decoded frames buffered ahead of recognition.")
+@click.option("-annotate", "--annotate", default=None, type=str, help="Write an annotated video of the recognized "
+                                                                      "frames to this path.")
+@click.option("-font", "--font", default=None, type=str,
+              help="TrueType font for the annotations (requires Pillow), ASCII only without it.")
+@click.option("-det", "--det", default='low', type=click.Choice(['low', 'high']), )
+@click.option("-folder", "--folder", default=_DEFAULT_FOLDER_, type=str, help="Model folder.")
+def video(src, output, stride, start, end, buffer, annotate, font, det, folder):
+    import hyperlpr3 as lpr3
+    from hyperlpr3.common.video import run_video
+    level = lpr3.DETECT_LEVEL_LOW if det == 'low' else lpr3.DETECT_LEVEL_HIGH
+    catcher = lpr3.LicensePlateCatcher(detect_level=level, folder=folder)
+    file = open(output, 'w', encoding='utf-8') if output else None
+
+    def on_frame(record):
+        line = json.dumps(record, ensure_ascii=False)
+        if file is not None:
+            file.write(line + '\n')
+        else:
+            print(line)
+
+    try:
+        summary = run_video(src, catcher, stride=stride, start=start, end=end, capacity=buffer, annotate=annotate,
+                            font=font, on_frame=on_frame)
+    except IOError as err:
+        raise click.ClickException(str(err))
+    finally:
+        if file is not None:
+            file.close()
+    logger.success(f"{summary['frames']} frames, {summary['plates']} plates, {summary['fps']:.1f} fps")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    video()
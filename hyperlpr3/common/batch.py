@@ -0,0 +1,347 @@
+"""Batch recognition of image archives, see `lpr3 batch`.
+
+Images are listed in a deterministic order, read and decoded (at the
+detector scale, see `EncodedImage`) on a prefetching thread pool and
+recognized in chunks, in the calling process or spread over worker
+processes. Results are written in input order, and after every chunk the
+output is flushed and a checkpoint with the number of finished images and
+the output position is written next to it, so an interrupted run resumes
+from the last finished chunk.
+"""
+import os
+import io
+import csv
+import json
+import multiprocessing
+from glob import iglob
+from itertools import islice
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from hyperlpr3.common.image_io import EncodedImage, IMAGE_EXTENSIONS
+
+FORMATS = ('jsonl', 'csv', 'parquet')
+
+# Flat columns of the CSV and Parquet outputs, one row per plate and one without plate fields per image without plates
+COLUMNS = ('path', 'code', 'confidence', 'plate_type', 'x1', 'y1', 'x2', 'y2', 'layer', 'error')
+
+
+def iter_paths(sources: tuple = (), list_file: str = None):
+    """Lists the images to process, in a stable order.
+
+    Args:
+        sources (tuple, optional): Directories (walked recursively, sorted by
+            name), glob patterns ('**' matches subdirectories) or image paths.
+        list_file (str, optional): Text file with one image path per line,
+            empty lines and lines starting with '#' are skipped.
+
+    Yields:
+        str: Image paths.
+    """
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+        elif any(char in source for char in '*?['):
+            for path in sorted(iglob(source, recursive=True)):
+                if os.path.isfile(path):
+                    yield path
+        else:
+            yield source
+    if list_file:
+        with open(list_file, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield line
+
+
+def plate_record(result) -> dict:
+    """Converts a compact catcher result to a JSON friendly dict (code, confidence, plate_type, box, layer)."""
+    code, confidence, plate_type, box, layer = result
+
+    return dict(code=code, confidence=float(confidence), plate_type=int(plate_type),
+                box=[int(value) for value in box], layer=int(layer))
+
+
+def _rows(record: dict) -> list:
+    empty = dict(code=None, confidence=None, plate_type=None, box=[None] * 4, layer=None)
+    rows = list()
+    for plate in record['plates'] or [empty]:
+        x1, y1, x2, y2 = plate['box']
+        rows.append(dict(path=record['path'], code=plate['code'], confidence=plate['confidence'],
+                         plate_type=plate['plate_type'], x1=x1, y1=y1, x2=x2, y2=y2, layer=plate['layer'],
+                         error=record['error']))
+
+    return rows
+
+
+class JsonLinesWriter(object):
+    """Writes one JSON object per image: path, plates (code, confidence, plate_type, box, layer) and error."""
+
+    def __init__(self, path: str, position: int = 0):
+        size = os.path.getsize(path) if os.path.isfile(path) else 0
+        if position > size:
+            raise ValueError(f"{path} holds {size} bytes, less than the {position} of the checkpoint. "
+                             f"Restart the run.")
+        self._file = open(path, 'r+b' if position else 'wb')
+        # Drops whatever was written after the checkpoint
+        self._file.truncate(position)
+        self._file.seek(position)
+
+    def _encode(self, records: list) -> bytes:
+        return ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records).encode('utf-8')
+
+    def write(self, records: list):
+        self._file.write(self._encode(records))
+
+    def commit(self) -> int:
+        """Flushes the output to disk and returns the position to resume from."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+class CsvWriter(JsonLinesWriter):
+    """Writes one row per plate, see COLUMNS, with a header line."""
+
+    def __init__(self, path: str, position: int = 0):
+        super().__init__(path, position)
+        if position == 0:
+            self._file.write((','.join(COLUMNS) + '\r\n').encode('utf-8'))
+
+    def _encode(self, records: list) -> bytes:
+        text = io.StringIO()
+        writer = csv.DictWriter(text, COLUMNS)
+        for record in records:
+            writer.writerows(_rows(record))
+
+        return text.getvalue().encode('utf-8')
+
+
+class ParquetWriter(object):
+    """Writes one Parquet file per chunk into a directory, one row per plate (see COLUMNS).
+
+    Requires pyarrow.
+    """
+
+    def __init__(self, path: str, position: int = 0):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow, install it with `pip install pyarrow`.")
+        self._pa, self._pq = pa, pq
+        self._schema = pa.schema([('path', pa.string()), ('code', pa.string()), ('confidence', pa.float64()),
+                                  ('plate_type', pa.int32()), ('x1', pa.int32()), ('y1', pa.int32()),
+                                  ('x2', pa.int32()), ('y2', pa.int32()), ('layer', pa.int32()),
+                                  ('error', pa.string())])
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        missing = [index for index in range(position)
+                   if not os.path.isfile(os.path.join(path, f'part-{index:06d}.parquet'))]
+        if missing:
+            raise ValueError(f"{path} misses {len(missing)} of the {position} parts of the checkpoint. "
+                             f"Restart the run.")
+        # Drops the parts written after the checkpoint
+        for name in os.listdir(path):
+            if name.startswith('part-') and name.endswith('.parquet') and int(name[5:-8]) >= position:
+                os.remove(os.path.join(path, name))
+        self._parts = position
+        self._rows = list()
+
+    def write(self, records: list):
+        for record in records:
+            self._rows.extend(_rows(record))
+
+    def commit(self) -> int:
+        """Writes the buffered rows as the next part and returns the position to resume from."""
+        if self._rows:
+            table = self._pa.Table.from_pylist(self._rows, schema=self._schema)
+            target = os.path.join(self.path, f'part-{self._parts:06d}.parquet')
+            self._pq.write_table(table, target + '.tmp')
+            os.replace(target + '.tmp', target)
+            self._parts += 1
+            self._rows = list()
+
+        return self._parts
+
+    def close(self):
+        pass
+
+
+WRITERS = dict(jsonl=JsonLinesWriter, csv=CsvWriter, parquet=ParquetWriter)
+
+
+def checkpoint_path(output: str) -> str:
+    """Returns where the checkpoint of an output lives."""
+    return output.rstrip('/\\') + '.checkpoint.json'
+
+
+def _save_checkpoint(path: str, state: dict):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+# Per worker process state, see _init_worker
+_catcher = None
+_prefetcher = None
+
+
+def _init_worker(catcher_options: dict, prefetch: int):
+    global _catcher, _prefetcher
+    import hyperlpr3 as lpr3
+    _catcher = lpr3.LicensePlateCatcher(**catcher_options)
+    _prefetcher = ThreadPoolExecutor(max(1, prefetch), thread_name_prefix='lpr3-prefetch')
+
+
+def _load(path: str, target: int) -> EncodedImage:
+    image = EncodedImage.from_file(path)
+    # Decodes the detection frame on the prefetch thread, recognize_encoded finds it cached
+    if image.reduced(target)[0] is None:
+        raise ValueError("Cannot decode image.")
+
+    return image
+
+
+def _prefetch(paths: list) -> list:
+    target = max(_catcher.pipeline.detector.input_size)
+
+    return [_prefetcher.submit(_load, path, target) for path in paths]
+
+
+def _recognize(paths: list, futures: list) -> list:
+    records = list()
+    for path, future in zip(paths, futures):
+        try:
+            results = _catcher.recognize_encoded(future.result())
+            records.append(dict(path=path, plates=[plate_record(result) for result in results], error=None))
+        except Exception as err:
+            records.append(dict(path=path, plates=list(), error=repr(err)))
+
+    return records
+
+
+def recognize_chunk(paths: list) -> list:
+    """Recognizes a chunk of images with the catcher of the current worker.
+
+    Args:
+        paths (list): Image paths.
+
+    Returns:
+        list: One record per image, in order: path, plates (code, confidence,
+            plate_type, box, layer) and error (None on success).
+    """
+    return _recognize(paths, _prefetch(paths))
+
+
+def _chunks(paths, size: int):
+    while True:
+        chunk = list(islice(paths, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_batch(paths, output: str, fmt: str = None, processes: int = 1, prefetch: int = 4, chunk_size: int = 64,
+              restart: bool = False, catcher_options: dict = None, progress=None) -> dict:
+    """Recognizes a list of images and writes the results, resuming an interrupted run.
+
+    Args:
+        paths: Iterable of image paths, e.g. from `iter_paths`. It must list
+            the same images in the same order when resuming.
+        output (str): Output file, a directory for Parquet.
+        fmt (str, optional): One of FORMATS. Defaults to the output extension.
+        processes (int, optional): Recognition processes, 1 runs in the
+            calling process. Defaults to 1.
+        prefetch (int, optional): Image reading/decoding threads per process.
+            Defaults to 4.
+        chunk_size (int, optional): Images per chunk, the unit of work and of
+            checkpointing. Defaults to 64.
+        restart (bool, optional): Ignore an existing checkpoint and overwrite
+            the output. Defaults to False.
+        catcher_options (dict, optional): LicensePlateCatcher keyword
+            arguments. full_result is not supported.
+        progress (optional): Called with the number of images of every
+            finished chunk.
+
+    Returns:
+        dict: Images processed by this run, images finished in total,
+            images with plates, plates and errors of this run.
+
+    Raises:
+        ValueError: If the format is unknown or the inputs or output do not
+            match the checkpoint.
+    """
+    fmt = fmt or os.path.splitext(output.rstrip('/\\'))[1].lstrip('.').lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format '{fmt}', use one of {', '.join(FORMATS)}.")
+    catcher_options = dict(catcher_options or dict(), full_result=False)
+    state = dict(format=fmt, done=0, last=None, position=0)
+    checkpoint = checkpoint_path(output)
+    if restart and os.path.exists(checkpoint):
+        # Removed before the output is truncated, so an interrupted restart never resumes from the old state
+        os.remove(checkpoint)
+    if not restart and os.path.exists(checkpoint):
+        with open(checkpoint, encoding='utf-8') as f:
+            state = json.load(f)
+        if state['format'] != fmt:
+            raise ValueError(f"{checkpoint} was written for {state['format']} output.")
+    paths = iter(paths)
+    if state['done']:
+        skipped = list(islice(paths, state['done'] - 1))
+        last = next(paths, None)
+        if last != state['last'] or len(skipped) != state['done'] - 1:
+            raise ValueError(f"The inputs do not match {checkpoint}: image {state['done']} was {state['last']}, "
+                             f"now {last}. Pass the same inputs or restart.")
+    writer = WRITERS[fmt](output, state['position'])
+    summary = dict(processed=0, done=state['done'], with_plates=0, plates=0, errors=0)
+    pool = None
+    try:
+        if processes > 1:
+            pool = multiprocessing.get_context('spawn').Pool(processes, _init_worker, (catcher_options, prefetch))
+
+            def submit(chunk):
+                return pool.apply_async(recognize_chunk, (chunk,)).get
+        else:
+            _init_worker(catcher_options, prefetch)
+
+            def submit(chunk):
+                # Starts reading the chunk while the previous one is recognized
+                futures = _prefetch(chunk)
+                return lambda: _recognize(chunk, futures)
+        # A few chunks in flight per process, bounded so huge listings are not read ahead
+        pending = deque()
+        chunks = _chunks(paths, chunk_size)
+        for chunk in islice(chunks, processes * 2):
+            pending.append(submit(chunk))
+        while pending:
+            records = pending.popleft()()
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending.append(submit(chunk))
+            writer.write(records)
+            state['position'] = writer.commit()
+            state['done'] += len(records)
+            state['last'] = records[-1]['path']
+            _save_checkpoint(checkpoint, state)
+            summary['processed'] += len(records)
+            summary['done'] = state['done']
+            summary['with_plates'] += sum(1 for record in records if record['plates'])
+            summary['plates'] += sum(len(record['plates']) for record in records)
+            summary['errors'] += sum(1 for record in records if record['error'])
+            if progress is not None:
+                progress(len(records))
+    finally:
+        writer.close()
+        if pool is not None:
+            pool.terminate()
+
+    return summary
@@ -0,0 +1,100 @@
+import os
+import threading
+import cv2
+import numpy as np
+from hyperlpr3.common import trace
+
+# cv2.dnn preferable backends and targets, by the names accepted in the configuration
+DNN_BACKENDS = dict(
+    default=cv2.dnn.DNN_BACKEND_DEFAULT,
+    opencv=cv2.dnn.DNN_BACKEND_OPENCV,
+    openvino=cv2.dnn.DNN_BACKEND_INFERENCE_ENGINE,
+    cuda=cv2.dnn.DNN_BACKEND_CUDA,
+    vulkan=cv2.dnn.DNN_BACKEND_VKCOM,
+)
+
+DNN_TARGETS = dict(
+    cpu=cv2.dnn.DNN_TARGET_CPU,
+    opencl=cv2.dnn.DNN_TARGET_OPENCL,
+    opencl_fp16=cv2.dnn.DNN_TARGET_OPENCL_FP16,
+    cuda=cv2.dnn.DNN_TARGET_CUDA,
+    cuda_fp16=cv2.dnn.DNN_TARGET_CUDA_FP16,
+    vulkan=cv2.dnn.DNN_TARGET_VULKAN,
+)
+
+
+class DNNAdapter(object):
+    """Runs an ONNX model with OpenCV's dnn module, mirroring the `ORTAdapter` interface.
+
+    A `cv2.dnn.Net` holds its input and intermediate blobs, so it cannot be
+    shared between threads. The model file is read once and every thread
+    builds its own net from the bytes on first use.
+
+    Attributes:
+        backend (str): Preferable backend, a key of DNN_BACKENDS.
+        target (str): Preferable target, a key of DNN_TARGETS.
+        outputs_name (list): Names of the returned outputs.
+        stats (dict): Counters of calls and created nets.
+        model_name (str): File name of the model, reported in trace spans.
+    """
+
+    def __init__(self, onnx_path: str, backend: str = 'default', target: str = 'cpu'):
+        assert backend in DNN_BACKENDS, f"backend must be one of {tuple(DNN_BACKENDS)}"
+        assert target in DNN_TARGETS, f"target must be one of {tuple(DNN_TARGETS)}"
+        self.model = np.fromfile(onnx_path, dtype=np.uint8)
+        self.model_name = os.path.basename(onnx_path)
+        self.backend = backend
+        self.target = target
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = dict(calls=0, nets=0)
+        self.outputs_name = list(self._thread_state().net.getUnconnectedOutLayersNames())
+
+    def _thread_state(self):
+        local = self._local
+        if not hasattr(local, 'net'):
+            net = cv2.dnn.readNetFromONNX(self.model)
+            net.setPreferableBackend(DNN_BACKENDS[self.backend])
+            net.setPreferableTarget(DNN_TARGETS[self.target])
+            local.net = net
+            local.scratch = dict()
+            with self._lock:
+                self.stats['nets'] += 1
+
+        return local
+
+    def input_buffer(self, shape: tuple, dtype=np.float32) -> np.ndarray:
+        """Returns a cached array of the calling thread to write an input into.
+
+        Args:
+            shape (tuple): Requested shape.
+            dtype: Element type. Defaults to np.float32.
+
+        Returns:
+            np.ndarray: A C-contiguous array owned by the adapter.
+        """
+        local = self._thread_state()
+        key = (tuple(shape), np.dtype(dtype))
+        buffer = local.scratch.get(key)
+        if buffer is None:
+            buffer = np.zeros(shape, dtype=dtype)
+            local.scratch[key] = buffer
+
+        return buffer
+
+    def inference(self, tensor: np.ndarray) -> list:
+        """Runs the calling thread's net on a single input tensor.
+
+        Args:
+            tensor (np.ndarray): NCHW float32 input.
+
+        Returns:
+            list: Output arrays in the order of outputs_name.
+        """
+        local = self._thread_state()
+        with self._lock:
+            self.stats['calls'] += 1
+        with trace.span('dnn.inference', model=self.model_name):
+            local.net.setInput(tensor)
+
+            return list(local.net.forward(self.outputs_name))
@@ -0,0 +1,298 @@
+import os
+import json
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper, TensorProto
+
+# Ops between the classification projection and the model output that act on each class column independently
+_ELEMENTWISE_OPS = ('Softmax', 'LogSoftmax', 'Identity', 'Sigmoid', 'Relu', 'Cast')
+
+
+def _slice_initializer(initializer, indices, axis):
+    array = numpy_helper.to_array(initializer)
+    axis = axis % array.ndim
+    initializer.CopyFrom(numpy_helper.from_array(np.take(array, indices, axis=axis), initializer.name))
+
+
+def prune_output_classes(src: str, dst: str, keep_indices) -> dict:
+    """Prunes the class axis of a recognition model down to a subset of columns.
+
+    Walks back from the graph output through element-wise ops (Softmax, ...)
+    and bias Adds to the final MatMul/Gemm projection, and slices the class
+    axis of every constant on that path. The kept indices are written to the
+    model metadata (`class_indices`) so the runtime can map the pruned columns
+    back onto the original token list.
+
+    Note:
+        A Softmax over the pruned output renormalizes over the kept classes
+        only, so the argmax is unchanged but probabilities are slightly higher.
+
+    Args:
+        src (str): Path of the source ONNX model.
+        dst (str): Path the pruned model is written to.
+        keep_indices: Output columns to keep. Must include the CTC blank.
+
+    Returns:
+        dict: Source/destination sizes in bytes and class counts.
+
+    Raises:
+        ValueError: If the output is not produced by a supported projection.
+    """
+    keep_indices = np.asarray(sorted(set(int(i) for i in keep_indices)), dtype=np.int64)
+    model = onnx.load(src)
+    graph = model.graph
+    output = graph.output[0]
+    num_classes = output.type.tensor_type.shape.dim[-1].dim_value
+    producers = {name: node for node in graph.node for name in node.output}
+    initializers = {initializer.name: initializer for initializer in graph.initializer}
+    path = list()
+    name = output.name
+    while True:
+        node = producers.get(name)
+        if node is None:
+            raise ValueError(f"Could not find the classification projection feeding '{output.name}'.")
+        path.extend(node.output)
+        if node.op_type in _ELEMENTWISE_OPS:
+            name = node.input[0]
+        elif node.op_type == 'Add':
+            const = [i for i in node.input if i in initializers]
+            if len(const) != 1:
+                raise ValueError(f"Unsupported Add node '{node.name}' on the output path.")
+            _slice_initializer(initializers[const[0]], keep_indices, -1)
+            name = [i for i in node.input if i not in initializers][0]
+        elif node.op_type == 'MatMul' and node.input[1] in initializers:
+            _slice_initializer(initializers[node.input[1]], keep_indices, -1)
+            break
+        elif node.op_type == 'Gemm' and node.input[1] in initializers:
+            trans_b = {a.name: a.i for a in node.attribute}.get('transB', 0)
+            _slice_initializer(initializers[node.input[1]], keep_indices, 0 if trans_b else -1)
+            if len(node.input) > 2 and node.input[2] in initializers:
+                _slice_initializer(initializers[node.input[2]], keep_indices, -1)
+            break
+        else:
+            raise ValueError(f"Unsupported op '{node.op_type}' on the output path.")
+    output.type.tensor_type.shape.dim[-1].dim_value = len(keep_indices)
+    # Drop stale shape annotations of the pruned tensors
+    stale = [value_info for value_info in graph.value_info if value_info.name in path]
+    for value_info in stale:
+        graph.value_info.remove(value_info)
+    set_metadata(model, class_indices=json.dumps(keep_indices.tolist()))
+    onnx.checker.check_model(model)
+    onnx.save(model, dst)
+
+    return dict(src_bytes=os.path.getsize(src), dst_bytes=os.path.getsize(dst), src_classes=int(num_classes),
+                dst_classes=int(len(keep_indices)))
+
+
+def _fold_into_convs(graph, consumers, scale, swap_rb) -> bool:
+    # Scaling and reversing the input channels commute with a convolution: both can be applied to the
+    # weights instead (zero padding is unaffected by either). Only done when every consumer is a plain Conv.
+    initializers = {initializer.name: initializer for initializer in graph.initializer}
+    for node in consumers:
+        group = {a.name: a.i for a in node.attribute}.get('group', 1)
+        if node.op_type != 'Conv' or node.input[1] not in initializers or group != 1:
+            return False
+    for node in consumers:
+        weight = numpy_helper.to_array(initializers[node.input[1]])
+        if swap_rb:
+            weight = weight[:, ::-1]
+        # A fresh initializer, the original may be shared with nodes that keep the unscaled input
+        folded = numpy_helper.from_array(np.ascontiguousarray(weight * scale, dtype=weight.dtype),
+                                         node.input[1] + '/preprocess_folded')
+        graph.initializer.append(folded)
+        node.input[1] = folded.name
+    used = {value for node in graph.node for value in node.input}
+    for name, initializer in initializers.items():
+        if name not in used:
+            graph.initializer.remove(initializer)
+
+    return True
+
+
+def bake_preprocess(src: str, dst: str, mean: float = 0.0, scale: float = 1 / 255.0, swap_rb: bool = False) -> dict:
+    """Moves the input normalization into the graph so the model takes uint8 NHWC BGR images.
+
+    The float32 NCHW input is replaced by a uint8 (N, H, W, 3) input of the
+    same name, computing `(x - mean) * scale` (optionally on the channel
+    reversed image) as the runtime used to do in numpy. The layout change is
+    done on the uint8 tensor, before the Cast. When the input only feeds
+    convolutions, the scale and channel swap are folded into their weights,
+    leaving Transpose, Cast and (for a non-zero mean) Sub in front of the
+    original graph. The parameters are recorded in the `preprocess` metadata
+    entry.
+
+    Args:
+        src (str): Path of the source ONNX model (float32 NCHW input).
+        dst (str): Path the baked model is written to.
+        mean (float, optional): Value subtracted from the pixels. Defaults to 0.
+        scale (float, optional): Multiplier applied after the subtraction.
+            Defaults to 1/255.
+        swap_rb (bool, optional): Reverse the channel order, for models
+            trained on RGB. Defaults to False.
+
+    Returns:
+        dict: Source/destination sizes in bytes, the new input shape and
+            whether the normalization was folded into convolutions.
+
+    Raises:
+        ValueError: If the model input is not a 3-channel NCHW tensor.
+    """
+    model = onnx.load(src)
+    graph = model.graph
+    graph_input = graph.input[0]
+    dims = list(graph_input.type.tensor_type.shape.dim)
+    if len(dims) != 4 or dims[1].dim_value != 3:
+        raise ValueError(f"Expected a (N, 3, H, W) input, got {graph_input.type.tensor_type.shape}.")
+    name = graph_input.name
+    # Namespaced so the new tensors cannot clash with existing ones (e.g. QDQ scales)
+    prefix = name + '/preprocess/'
+    normalized = prefix + 'nchw'
+    consumers = [node for node in graph.node if name in node.input]
+    for node in consumers:
+        for idx, value in enumerate(node.input):
+            if value == name:
+                node.input[idx] = normalized
+    folded = _fold_into_convs(graph, consumers, scale, swap_rb)
+    shape = [dim.dim_value if dim.HasField('dim_value') else dim.dim_param for dim in (dims[0], dims[2], dims[3])]
+    graph.input.remove(graph_input)
+    graph.input.insert(0, helper.make_tensor_value_info(name, TensorProto.UINT8, shape + [3]))
+    nodes = list()
+
+    def append(op_type, inputs, **attrs):
+        output = prefix + str(len(nodes))
+        nodes.append(helper.make_node(op_type, inputs, [output], name=output, **attrs))
+
+        return output
+
+    last = append('Transpose', [name], perm=[0, 3, 1, 2])
+    if swap_rb and not folded:
+        graph.initializer.append(numpy_helper.from_array(np.asarray([2, 1, 0], dtype=np.int64), prefix + 'rgb'))
+        last = append('Gather', [last, prefix + 'rgb'], axis=1)
+    last = append('Cast', [last], to=TensorProto.FLOAT)
+    if mean:
+        graph.initializer.append(numpy_helper.from_array(np.asarray(mean, dtype=np.float32), prefix + 'mean'))
+        last = append('Sub', [last, prefix + 'mean'])
+    if scale != 1 and not folded:
+        graph.initializer.append(numpy_helper.from_array(np.asarray(scale, dtype=np.float32), prefix + 'scale'))
+        last = append('Mul', [last, prefix + 'scale'])
+    nodes[-1].output[0] = normalized
+    for node in reversed(nodes):
+        graph.node.insert(0, node)
+    set_metadata(model, preprocess=json.dumps(dict(layout='NHWC', dtype='uint8', mean=float(mean),
+                                                   scale=float(scale), swap_rb=bool(swap_rb))))
+    onnx.checker.check_model(model)
+    onnx.save(model, dst)
+
+    return dict(src_bytes=os.path.getsize(src), dst_bytes=os.path.getsize(dst), input_shape=shape + [3],
+                folded=folded)
+
+
+def _opset(model) -> int:
+    return next(opset.version for opset in model.opset_import if opset.domain in ('', 'ai.onnx'))
+
+
+def append_nms(src: str, dst: str, conf_thresh: float = 0.25, iou_thresh: float = 0.5,
+               max_candidates: int = 1000) -> dict:
+    """Appends the detection postprocess to a multitask detector so it only outputs the kept plates.
+
+    Mirrors `post_precessing` in the graph: rows with an objectness above
+    `conf_thresh` are kept, the class scores are multiplied by the
+    objectness, the `max_candidates` best fused scores go through
+    NonMaxSuppression, and the boxes are converted to corners. The single
+    (K, 14) `detections` output holds, per kept plate in descending score
+    order, [x1, y1, x2, y2, score, 8 landmark coordinates, class index] in
+    letterboxed input coordinates; undoing the letterbox is left to the
+    runtime. The thresholds are recorded in the `postprocess` metadata entry.
+
+    Args:
+        src (str): Path of the source detector, (1, N, 15) output.
+        dst (str): Path the detector with NMS is written to.
+        conf_thresh (float, optional): Objectness threshold. Defaults to 0.25.
+        iou_thresh (float, optional): NMS IoU threshold. Defaults to 0.5.
+        max_candidates (int, optional): Rows kept, by fused score, before the
+            NMS. Defaults to 1000.
+
+    Returns:
+        dict: Source/destination sizes in bytes and the candidate row count.
+
+    Raises:
+        ValueError: If the model does not have a single (1, N, 15) output.
+    """
+    model = onnx.load(src)
+    graph = model.graph
+    opset = _opset(model)
+    if opset < 11:
+        raise ValueError(f"NonMaxSuppression with the current semantics needs opset 11, {src} uses {opset}.")
+    dims = [dim.dim_value for dim in graph.output[0].type.tensor_type.shape.dim] if len(graph.output) == 1 else []
+    if len(dims) != 3 or dims[2] != 15:
+        raise ValueError(f"Expected a single (1, N, 15) detector output, got {[o.name for o in graph.output]}.")
+    raw = graph.output[0].name
+    prefix = raw + '/postprocess/'
+    nodes, constants = list(), set()
+
+    def const(name, value, dtype):
+        if name not in constants:
+            graph.initializer.append(numpy_helper.from_array(np.asarray(value, dtype=dtype), prefix + name))
+            constants.add(name)
+
+        return prefix + name
+
+    def append(op_type, inputs, output=None, **attrs):
+        output = output or prefix + str(len(nodes))
+        nodes.append(helper.make_node(op_type, inputs, [output], name=prefix + str(len(nodes)), **attrs))
+
+        return output
+
+    def columns(tensor, indices):
+        return append('Gather', [tensor, const(f'columns_{indices[0]}_{len(indices)}', indices, np.int64)], axis=1)
+
+    dets = append('Reshape', [raw, const('rows', [-1, dims[2]], np.int64)])
+    # Scalar index: a flat (N,) objectness, ORT's broadcasting compare is much slower on (N, 1)
+    objectness = append('Gather', [dets, const('objectness', 4, np.int64)], axis=1)
+    keep = append('Greater', [objectness, const('conf_thresh', conf_thresh, np.float32)])
+    dets = append('Compress', [dets, keep], axis=0)
+    fused = append('Mul', [columns(dets, [13, 14]), columns(dets, [4])])
+    if opset >= 18:
+        score = append('ReduceMax', [fused, const('class_axis', [1], np.int64)], keepdims=1)
+    else:
+        score = append('ReduceMax', [fused], axes=[1], keepdims=1)
+    index = append('Cast', [append('ArgMax', [fused], axis=1, keepdims=1)], to=TensorProto.FLOAT)
+    # Top-k by fused score bounds the NMS cost on busy frames, as max_candidates does in Python
+    flat_score = append('Reshape', [score, const('flat', [-1], np.int64)])
+    k = append('Min', [append('Shape', [flat_score]), const('max_candidates', [max_candidates], np.int64)])
+    top = prefix + 'top_indices'
+    nodes.append(helper.make_node('TopK', [flat_score, k], [prefix + 'top_scores', top], name=prefix + str(len(nodes)),
+                                  axis=0, largest=1, sorted=1))
+    dets = append('Gather', [dets, top], axis=0)
+    score = append('Gather', [score, top], axis=0)
+    index = append('Gather', [index, top], axis=0)
+    center, size = columns(dets, [0, 1]), columns(dets, [2, 3])
+    half = append('Mul', [size, const('half', 0.5, np.float32)])
+    boxes = append('Concat', [append('Sub', [center, half]), append('Add', [center, half])], axis=1)
+    selected = append('NonMaxSuppression', [append('Reshape', [boxes, const('boxes', [1, -1, 4], np.int64)]),
+                                            append('Reshape', [score, const('scores', [1, 1, -1], np.int64)]),
+                                            const('max_output', [max_candidates], np.int64),
+                                            const('iou_thresh', [iou_thresh], np.float32)])
+    kept = append('Gather', [selected, const('box_index', 2, np.int64)], axis=1)
+    rows = append('Concat', [boxes, score, columns(dets, list(range(5, 13))), index], axis=1)
+    append('Gather', [rows, kept], output='detections', axis=0)
+    graph.node.extend(nodes)
+    graph.output.remove(graph.output[0])
+    graph.output.append(helper.make_tensor_value_info('detections', TensorProto.FLOAT, ['plates', 14]))
+    set_metadata(model, postprocess=json.dumps(dict(conf_thresh=float(conf_thresh), iou_thresh=float(iou_thresh),
+                                                    max_candidates=int(max_candidates))))
+    onnx.checker.check_model(model)
+    onnx.save(model, dst)
+
+    return dict(src_bytes=os.path.getsize(src), dst_bytes=os.path.getsize(dst), candidates=dims[1])
+
+
+def set_metadata(model, **props):
+    """Sets (or overwrites) string entries of an ONNX model's metadata_props."""
+    for key, value in props.items():
+        for prop in model.metadata_props:
+            if prop.key == key:
+                prop.value = value
+                break
+        else:
+            model.metadata_props.add(key=key, value=value)
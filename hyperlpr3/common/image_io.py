@@ -0,0 +1,172 @@
+import cv2
+import numpy as np
+
+# File extensions of the images read from folders
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Scale factors libjpeg can decode at directly, with their imread flags
+REDUCED_COLOR_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Start-of-frame markers, i.e. every 0xC0-0xCF marker but DHT, JPG and DAC
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def probe_jpeg_size(data) -> tuple:
+    """Reads the frame size from a JPEG header without decoding it.
+
+    Args:
+        data: Encoded bytes (bytes, bytearray or uint8 np.ndarray).
+
+    Returns:
+        tuple: (width, height), or None if data is not a parsable JPEG.
+    """
+    data = memoryview(data).cast('B')
+    n = len(data)
+    if n < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # standalone markers without a length
+            i += 2
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        if marker == 0xDA:
+            # start of scan reached without a frame header
+            return None
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+
+    return None
+
+
+def reduced_decode_factor(size: tuple, target: int) -> int:
+    """Picks the largest decode scale factor that keeps the image above target.
+
+    Args:
+        size (tuple): Full (width, height) of the image.
+        target (int): Minimum length of the longer side after decoding,
+            usually the detector input size.
+
+    Returns:
+        int: One of 1, 2, 4 or 8.
+    """
+    longer = max(size)
+    for factor in (8, 4, 2):
+        # libjpeg rounds the scaled size up
+        if -(-longer // factor) >= target:
+            return factor
+
+    return 1
+
+
+def budget_decode_factor(size: tuple, budget: int) -> int:
+    """Picks the smallest decode scale factor whose BGR image fits a memory budget.
+
+    Args:
+        size (tuple): Full (width, height) of the image.
+        budget (int): Maximum size of the decoded image in bytes.
+
+    Returns:
+        int: One of 1, 2, 4 or 8, 8 if even that does not fit.
+    """
+    width, height = size
+    for factor in (1, 2, 4):
+        if -(-width // factor) * -(-height // factor) * 3 <= budget:
+            return factor
+
+    return 8
+
+
+class EncodedImage(object):
+    """An encoded image decoded lazily at the resolution each stage needs.
+
+    Detection only needs a frame slightly larger than the detector input, so
+    JPEGs are decoded straight at a reduced scale for it. The full resolution
+    frame is decoded on demand, typically only when plates were found. Both
+    decodes are cached.
+
+    Attributes:
+        data (np.ndarray): The encoded bytes.
+        size (tuple): (width, height) from the JPEG header, None for other formats.
+    """
+
+    def __init__(self, data):
+        if isinstance(data, np.ndarray):
+            self.data = data.reshape(-1).view(np.uint8)
+        else:
+            self.data = np.frombuffer(data, dtype=np.uint8)
+        self.size = probe_jpeg_size(self.data)
+        self._full = None
+        self._reduced = None
+
+    @classmethod
+    def from_file(cls, path: str):
+        """Reads the encoded bytes of an image file.
+
+        Args:
+            path (str): Image file path.
+
+        Returns:
+            EncodedImage: The lazily decoded image.
+        """
+        return cls(np.fromfile(path, dtype=np.uint8))
+
+    def reduced(self, target: int) -> tuple:
+        """Decodes the image at the smallest scale whose longer side is >= target.
+
+        Args:
+            target (int): Minimum length of the longer side, e.g. the detector
+                input size.
+
+        Returns:
+            tuple: (image, factor) where image is BGR (H, W, 3) or None if
+                decoding failed, and factor is the downscale factor used.
+        """
+        factor = 1 if self.size is None else reduced_decode_factor(self.size, target)
+        if factor == 1:
+            return self.full(), 1
+        if self._reduced is None or self._reduced[0] != factor:
+            # Cached, so the image can be decoded ahead of time, e.g. on a prefetching thread
+            self._reduced = factor, cv2.imdecode(self.data, REDUCED_COLOR_FLAGS[factor])
+
+        return self._reduced[1], factor
+
+    def decode(self, factor: int = 1) -> np.ndarray:
+        """Decodes the image at one of the libjpeg scale factors.
+
+        Args:
+            factor (int, optional): 1, 2, 4 or 8. Defaults to 1, see `full`.
+
+        Returns:
+            np.ndarray: BGR image (H, W, 3), or None if decoding failed.
+        """
+        if factor == 1:
+            return self.full()
+
+        return cv2.imdecode(self.data, REDUCED_COLOR_FLAGS[factor])
+
+    def full(self) -> np.ndarray:
+        """Decodes (once) and returns the full resolution image.
+
+        Returns:
+            np.ndarray: BGR image (H, W, 3), or None if decoding failed.
+        """
+        if self._full is None:
+            self._full = cv2.imdecode(self.data, cv2.IMREAD_COLOR)
+
+        return self._full
@@ -0,0 +1,21 @@
+import numpy as np
+
+
+def summarize(samples) -> dict:
+    """Summarizes latency samples given in seconds.
+
+    Args:
+        samples: Latency samples in seconds, any sequence.
+
+    Returns:
+        dict: Mean and p50/p90/p99 latencies in milliseconds plus throughput.
+    """
+    data = np.asarray(samples, dtype=np.float64) * 1000
+    if data.size == 0:
+        return dict(count=0)
+    return dict(count=int(data.size),
+                mean_ms=float(data.mean()),
+                p50_ms=float(np.percentile(data, 50)),
+                p90_ms=float(np.percentile(data, 90)),
+                p99_ms=float(np.percentile(data, 99)),
+                fps=float(1000 / data.mean()) if data.mean() > 0 else 0.0)
@@ -0,0 +1,220 @@
+"""Per-stage memory accounting of the recognition pipeline.
+
+Memory is accounted per trace span (see common.trace), so every stage and
+model call that is traced is also measured:
+
+- Python/numpy allocations with tracemalloc: the peak allocated on top of
+  what was allocated when the span opened, and what the span left allocated.
+  numpy reports its data buffers to tracemalloc, the native buffers of the
+  inference engines are not seen.
+- The process resident set size (RSS) when the span opens and ends, which
+  does include the engines' arenas, e.g. around `ort.inference`.
+
+tracemalloc slows down Python allocations, and both measurements are
+process wide. With a single worker thread the per-stage numbers are exact.
+With several, the allocation peak of a span also counts what the other
+threads allocated meanwhile, so it is an upper bound, and the retained and
+RSS deltas can be off either way.
+
+Example:
+    >>> from hyperlpr3.common import memory
+    >>> memory.enable_accounting()
+    >>> catcher(image)
+    >>> catcher.stats()['memory']['stages']['detect']
+"""
+import os
+import sys
+import threading
+import tracemalloc
+from hyperlpr3.common import trace
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes() -> int:
+    """Current resident set size of the process in bytes, None where it cannot be read."""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of the process in bytes, None where it cannot be read."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, in KiB elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemorySink(object):
+    """Trace sink measuring the memory of every span and aggregating it per span name.
+
+    The measurements are also attached to the spans as `mem.*` attributes,
+    so sinks registered after this one export them.
+
+    Args:
+        python (bool, optional): Track Python/numpy allocations with
+            tracemalloc, which is started if it is not running yet.
+            Defaults to True.
+        rss (bool, optional): Sample the process RSS. Defaults to True.
+    """
+
+    def __init__(self, python: bool = True, rss: bool = True):
+        self.python = python
+        self.rss = rss
+        self._started_tracemalloc = False
+        if python and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stages = dict()
+        # Open span records of every thread, by id, see _observe
+        self._open = dict()
+        self._peak_lock = threading.Lock()
+
+    def _observe(self) -> int:
+        # tracemalloc has a single process wide peak: fold it into the open spans of every thread before
+        # resetting it, so a reset never drops the peak of a span still open in another thread
+        with self._peak_lock:
+            current, peak = tracemalloc.get_traced_memory()
+            for record in self._open.values():
+                record[2] = max(record[2], peak)
+            tracemalloc.reset_peak()
+
+        return current
+
+    def on_start(self, span):
+        stack = self._local.__dict__.setdefault('stack', [])
+        current = self._observe() if self.python else 0
+        record = [span, current, current, rss_bytes() if self.rss else None]
+        stack.append(record)
+        if self.python:
+            with self._peak_lock:
+                self._open[id(record)] = record
+
+    def on_end(self, span):
+        stack = self._local.__dict__.get('stack')
+        if not stack or stack[-1][0] is not span:
+            # Opened before the sink was registered
+            return
+        current = self._observe() if self.python else 0
+        record = stack.pop()
+        with self._peak_lock:
+            self._open.pop(id(record), None)
+        _, start, peak, rss_start = record
+        sample = dict()
+        if self.python:
+            sample['alloc_peak_bytes'] = peak - start
+            sample['alloc_retained_bytes'] = current - start
+        if self.rss and rss_start is not None:
+            rss = rss_bytes()
+            sample['rss_bytes'] = rss
+            sample['rss_delta_bytes'] = rss - rss_start
+        for key, value in sample.items():
+            span.set('mem.' + key, value)
+        with self._lock:
+            stage = self._stages.setdefault(span.name, dict(calls=0))
+            stage['calls'] += 1
+            for key, value in sample.items():
+                stage[key + '_max'] = max(stage.get(key + '_max', value), value)
+                stage[key + '_sum'] = stage.get(key + '_sum', 0) + value
+
+    def emit(self, span):
+        pass
+
+    def report(self) -> dict:
+        """Aggregates the samples per span name.
+
+        Returns:
+            dict: Per span name the number of calls and, per measurement
+                (alloc_peak_bytes, alloc_retained_bytes, rss_bytes,
+                rss_delta_bytes), its maximum and mean.
+        """
+        report = dict()
+        with self._lock:
+            for name, stage in self._stages.items():
+                entry = dict(calls=stage['calls'])
+                for key, value in stage.items():
+                    if key.endswith('_max'):
+                        entry[key] = value
+                    elif key.endswith('_sum'):
+                        entry[key[:-4] + '_mean'] = value / stage['calls']
+                report[name] = entry
+
+        return report
+
+    def reset(self):
+        """Drops the aggregated samples."""
+        with self._lock:
+            self._stages = dict()
+
+    def close(self):
+        """Stops tracemalloc if this sink started it."""
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+
+_accounting = None
+_accounting_lock = threading.Lock()
+
+
+def enable_accounting(python: bool = True, rss: bool = True) -> MemorySink:
+    """Starts the process wide memory accounting reported by the `stats()` methods.
+
+    Args:
+        python (bool, optional): Track Python/numpy allocations. Defaults to True.
+        rss (bool, optional): Sample the process RSS. Defaults to True.
+
+    Returns:
+        MemorySink: The registered sink, the existing one if accounting was
+            already enabled.
+    """
+    global _accounting
+    with _accounting_lock:
+        if _accounting is None:
+            _accounting = trace.add_sink(MemorySink(python, rss))
+
+        return _accounting
+
+
+def disable_accounting():
+    """Stops the memory accounting and drops its samples."""
+    global _accounting
+    with _accounting_lock:
+        if _accounting is not None:
+            trace.remove_sink(_accounting)
+            _accounting.close()
+            _accounting = None
+
+
+def accounting_report() -> dict:
+    """Returns the per-stage report (see `MemorySink.report`) and the process RSS.
+
+    Returns:
+        dict: 'stages', 'rss_bytes' and 'peak_rss_bytes', or None while
+            accounting is disabled.
+    """
+    sink = _accounting
+    if sink is None:
+        return None
+
+    return dict(stages=sink.report(), rss_bytes=rss_bytes(), peak_rss_bytes=peak_rss_bytes())
+
+
+def reset_accounting():
+    """Drops the samples aggregated so far, e.g. after a warm-up."""
+    sink = _accounting
+    if sink is not None:
+        sink.reset()
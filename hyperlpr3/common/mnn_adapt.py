@@ -1,37 +1,143 @@
+import os
+import sys
+import subprocess
+import threading
 import numpy as np
 import MNN
 from loguru import logger
+from hyperlpr3.common import trace
+
+# MNN session precision modes, 'low' allows fp16/bf16 arithmetic where the CPU supports it
+PRECISION_MODES = ('normal', 'high', 'low')
+
+
+def convert_onnx_to_mnn(onnx_path: str, mnn_path: str):
+    """Converts an ONNX model to the MNN format with the converter shipped in the MNN wheel.
+
+    Args:
+        onnx_path (str): Source ONNX model.
+        mnn_path (str): Destination MNN model.
+    """
+    os.makedirs(os.path.dirname(mnn_path) or '.', exist_ok=True)
+    logger.info(f"Converting {onnx_path} to {mnn_path}")
+    subprocess.run([sys.executable, '-m', 'MNN.tools.mnnconvert', '-f', 'ONNX', '--modelFile', onnx_path,
+                    '--MNNModel', mnn_path, '--bizCode', 'MNN'], check=True, stdout=subprocess.DEVNULL)
 
 
 class MNNAdapter(object):
+    """Thin wrapper around an MNN interpreter with reusable host tensors.
+
+    The interpreter, and with it the weights, is shared. Each thread gets its
+    own session with preallocated host tensors for the input and the outputs,
+    so steady-state inference only copies data in and out of MNN and never
+    allocates. Like `ORTAdapter`, callers fill the array returned by
+    `input_buffer` and call `inference`.
+
+    Note:
+        Arrays returned by `inference` are views of the calling thread's host
+        tensors and are overwritten by its next inference.
+
+    Attributes:
+        interpreter (MNN.Interpreter): The underlying interpreter.
+        input_shape (tuple): Shape of the (single) model input.
+        num_thread (int): Threads used by each session.
+        precision (str): Session precision mode, one of PRECISION_MODES.
+        stats (dict): Counters of calls and created sessions.
+        model_name (str): File name of the model, reported in trace spans.
+    """
 
     def __init__(self, model_path: str, input_shape: tuple,
-                 dim_type: int = MNN.Tensor_DimensionType_Caffe, outputs_name=None, outputs_shape=None):
+                 dim_type: int = MNN.Tensor_DimensionType_Caffe, outputs_name=None, outputs_shape=None,
+                 num_thread: int = 1, precision: str = 'normal'):
+        assert precision in PRECISION_MODES, f"precision must be one of {PRECISION_MODES}"
         self.interpreter = MNN.Interpreter(model_path)
-        self.session = self.interpreter.createSession()
-        self.input_tensor = self.interpreter.getSessionInput(self.session)
-        self.input_shape = input_shape
+        self.model_name = os.path.basename(model_path)
+        self.input_shape = tuple(input_shape)
         self.dim_type = dim_type
         self.outputs_name = outputs_name
         self.outputs_shape = outputs_shape
+        self.num_thread = num_thread
+        self.precision = precision
+        self.config = dict(backend='CPU', numThread=num_thread, precision=precision)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = dict(calls=0, sessions=0)
+
+    def _thread_state(self):
+        local = self._local
+        if not hasattr(local, 'session'):
+            with self._lock:
+                self._create_session(local)
+
+        return local
 
-    def inference(self, tensor: np.ndarray) -> np.ndarray:
-        tensor = tensor.astype(np.float32)
-        tmp_input = MNN.Tensor(self.input_shape, MNN.Halide_Type_Float, tensor, self.dim_type)
-        self.input_tensor.copyFrom(tmp_input)
-        self.interpreter.runSession(self.session)
-        output_tensor = list()
+    def _host_tensor(self, shape):
+        return MNN.Tensor(shape, MNN.Halide_Type_Float, np.zeros(shape, dtype=np.float32), self.dim_type)
+
+    def _create_session(self, local):
+        session = self.interpreter.createSession(self.config)
+        input_tensor = self.interpreter.getSessionInput(session)
+        if tuple(input_tensor.getShape()) != self.input_shape:
+            self.interpreter.resizeTensor(input_tensor, self.input_shape)
+            self.interpreter.resizeSession(session)
         if self.outputs_name:
-            if self.outputs_shape:
-                for idx, shape in enumerate(self.outputs_shape):
-                    tmp_output = MNN.Tensor(shape, MNN.Halide_Type_Float, np.ones(shape).astype(np.float32), self.dim_type)
-                    tmp_tensor = self.interpreter.getSessionOutput(self.session, self.outputs_name[idx])
-                    tmp_tensor.copyToHostTensor(tmp_output)
-                    output_tensor.append(np.asarray(tmp_output.getData()))
-            else:
-                output_tensor = [np.asarray(self.interpreter.getSessionOutput(self.session, name).getData()) for name in self.outputs_name]
+            outputs = [self.interpreter.getSessionOutput(session, name) for name in self.outputs_name]
         else:
-            output_tensor.append(self.interpreter.getSessionOutput(self.session).getData())
-        res = np.asarray(output_tensor)
+            outputs = [self.interpreter.getSessionOutput(session)]
+        shapes = self.outputs_shape or [tensor.getShape() for tensor in outputs]
+        local.session = session
+        local.input_tensor = input_tensor
+        local.input_host = self._host_tensor(self.input_shape)
+        # getNumpyData returns a view of the host memory, written in place by the callers
+        local.input_view = local.input_host.getNumpyData()
+        local.outputs = outputs
+        local.output_hosts = [self._host_tensor(tuple(shape)) for shape in shapes]
+        local.output_views = [host.getNumpyData() for host in local.output_hosts]
+        local.scratch = dict()
+        self.stats['sessions'] += 1
+
+    def input_buffer(self, shape: tuple = None, dtype=np.float32) -> np.ndarray:
+        """Returns the reusable input array of the calling thread.
+
+        Args:
+            shape (tuple, optional): Requested shape. The model input shape
+                (the default) returns a view of the input host tensor, any
+                other shape/dtype a cached scratch array.
+            dtype: Element type. Defaults to np.float32.
+
+        Returns:
+            np.ndarray: A C-contiguous array owned by the adapter.
+        """
+        local = self._thread_state()
+        if shape is None or (tuple(shape) == self.input_shape and np.dtype(dtype) == np.float32):
+            return local.input_view
+        key = (tuple(shape), np.dtype(dtype))
+        buffer = local.scratch.get(key)
+        if buffer is None:
+            buffer = np.zeros(shape, dtype=dtype)
+            local.scratch[key] = buffer
+
+        return buffer
+
+    def inference(self, tensor: np.ndarray) -> list:
+        """Runs the thread's session on a single input tensor.
+
+        Args:
+            tensor (np.ndarray): Input tensor, ideally the array returned by
+                `input_buffer` so it does not need to be copied.
+
+        Returns:
+            list: Output arrays in the order of outputs_name.
+        """
+        local = self._thread_state()
+        with self._lock:
+            self.stats['calls'] += 1
+        with trace.span('mnn.inference', model=self.model_name):
+            if tensor is not local.input_view:
+                np.copyto(local.input_view, np.reshape(tensor, self.input_shape), casting='unsafe')
+            local.input_tensor.copyFrom(local.input_host)
+            self.interpreter.runSession(local.session)
+            for output, host in zip(local.outputs, local.output_hosts):
+                output.copyToHostTensor(host)
 
-        return res
+        return local.output_views
@@ -0,0 +1,118 @@
+import os
+import threading
+import numpy as np
+import onnxruntime as ort
+from hyperlpr3.common import trace
+
+
+class ORTAdapter(object):
+    """Thin wrapper around an ONNX Runtime session with reusable buffers.
+
+    The adapter owns one input buffer per input shape and, when IO binding is
+    enabled, one set of output buffers per input shape. Steady-state inference
+    on fixed-size inputs therefore runs without allocating new arrays: the
+    caller fills the buffer returned by `input_buffer` and `inference` writes
+    the results into the cached output arrays.
+
+    Buffers and bindings are kept per thread, so one adapter (and one
+    session, whose `run` is thread-safe) can be shared by several threads.
+
+    Note:
+        Arrays returned by `inference` are owned by the adapter and are
+        overwritten by the next call with the same input shape in the same
+        thread. Copy them if they must outlive the next inference.
+
+    Attributes:
+        session (ort.InferenceSession): The underlying ONNX Runtime session.
+        input_name (str): Name of the (single) model input.
+        output_names (list): Names of all model outputs.
+        io_binding (bool): Whether outputs are bound to preallocated buffers.
+        model_name (str): File name of the model, reported in trace spans.
+        stats (dict): Counters of calls and buffer/binding allocations.
+    """
+
+    def __init__(self, onnx_path: str, providers=None, sess_options=None, io_binding: bool = True):
+        if providers is None:
+            providers = ['CPUExecutionProvider']
+        self.session = ort.InferenceSession(onnx_path, sess_options, providers=providers)
+        self.model_name = os.path.basename(onnx_path)
+        self.inputs_option = self.session.get_inputs()
+        self.outputs_option = self.session.get_outputs()
+        self.input_name = self.inputs_option[0].name
+        self.output_names = [output.name for output in self.outputs_option]
+        self.io_binding = io_binding
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.stats = dict(calls=0, input_allocs=0, output_allocs=0, bindings=0)
+
+    def _thread_state(self):
+        local = self._local
+        if not hasattr(local, 'input_buffers'):
+            local.input_buffers = dict()
+            local.bindings = dict()
+
+        return local
+
+    def _count(self, key: str, value: int = 1):
+        with self._stats_lock:
+            self.stats[key] += value
+
+    def input_buffer(self, shape: tuple, dtype=np.float32) -> np.ndarray:
+        """Returns the reusable input buffer for the given shape.
+
+        Args:
+            shape (tuple): Full input tensor shape, including the batch axis.
+            dtype: Element type of the buffer. Defaults to np.float32.
+
+        Returns:
+            np.ndarray: A C-contiguous array owned by the adapter (and the
+                calling thread).
+        """
+        key = (tuple(shape), np.dtype(dtype))
+        input_buffers = self._thread_state().input_buffers
+        buffer = input_buffers.get(key)
+        if buffer is None:
+            buffer = np.zeros(shape, dtype=dtype)
+            input_buffers[key] = buffer
+            self._count('input_allocs')
+
+        return buffer
+
+    def _create_binding(self, tensor: np.ndarray):
+        # Run once without binding to learn the output shapes for this input shape.
+        outputs = self.session.run(self.output_names, {self.input_name: tensor})
+        binding = self.session.io_binding()
+        buffers = list()
+        for name, output in zip(self.output_names, outputs):
+            buffer = np.empty(output.shape, dtype=output.dtype)
+            binding.bind_output(name, 'cpu', 0, buffer.dtype, buffer.shape, buffer.ctypes.data)
+            buffers.append(buffer)
+        self._thread_state().bindings[tensor.shape] = (binding, buffers)
+        self._count('output_allocs', len(buffers))
+        self._count('bindings')
+
+        return outputs
+
+    def inference(self, tensor: np.ndarray) -> list:
+        """Runs the session on a single input tensor.
+
+        Args:
+            tensor (np.ndarray): Input tensor, ideally a buffer obtained from
+                `input_buffer` so no conversion is needed.
+
+        Returns:
+            list: Output arrays in the order of the model outputs.
+        """
+        self._count('calls')
+        with trace.span('ort.inference', model=self.model_name):
+            if not self.io_binding:
+                return self.session.run(self.output_names, {self.input_name: tensor})
+            tensor = np.ascontiguousarray(tensor)
+            cached = self._thread_state().bindings.get(tensor.shape)
+            if cached is None:
+                return self._create_binding(tensor)
+            binding, buffers = cached
+            binding.bind_cpu_input(self.input_name, tensor)
+            self.session.run_with_iobinding(binding)
+
+            return buffers
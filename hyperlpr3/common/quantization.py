@@ -0,0 +1,184 @@
+import os
+import tempfile
+import cv2
+import numpy as np
+from glob import glob
+from onnxruntime.quantization import CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, \
+    quantize_static
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from loguru import logger
+from hyperlpr3.config.settings import INT8_SUFFIX
+from hyperlpr3.common.image_io import IMAGE_EXTENSIONS
+
+
+def int8_model_path(path: str) -> str:
+    """Returns where the INT8 variant of a model lives."""
+    stem, ext = os.path.splitext(path)
+
+    return stem + INT8_SUFFIX + ext
+
+
+def load_calibration_images(folder: str, max_images: int = None) -> list:
+    """Reads the images of a calibration folder (non recursive), sorted by name."""
+    paths = sorted(path for path in glob(os.path.join(folder, '*')) if path.lower().endswith(IMAGE_EXTENSIONS))
+    images = list()
+    for path in paths[:max_images]:
+        image = cv2.imread(path)
+        if image is not None:
+            images.append(image)
+
+    return images
+
+
+class TensorCalibrationReader(CalibrationDataReader):
+    """Feeds a list of preprocessed input tensors to the ORT calibrator."""
+
+    def __init__(self, input_name: str, tensors: list):
+        self.input_name = input_name
+        self.tensors = tensors
+        self._iter = iter(tensors)
+
+    def get_next(self):
+        tensor = next(self._iter, None)
+        if tensor is None:
+            return None
+        return {self.input_name: tensor}
+
+    def rewind(self):
+        self._iter = iter(self.tensors)
+
+
+def detector_inputs(images: list, input_size: int) -> list:
+    """Letterboxes calibration images exactly as the detector does at runtime."""
+    from hyperlpr3.common.tools_process import letterbox_blob
+    return [letterbox_blob(image, (input_size, input_size))[0] for image in images]
+
+
+def plate_inputs(images: list, catcher) -> tuple:
+    """Encodes the plates found by a (FP32) catcher for the recognizer and classifier.
+
+    Every plate is encoded twice, through the crop-then-resize path and
+    through the fused warp (`encode_region`/`warp_region`), so the ranges
+    cover what the models see at runtime with either setting of fused_crop.
+    Double layer plates are split into their two recognizer regions as the
+    pipeline does.
+
+    Args:
+        images (list): Calibration images, BGR.
+        catcher (LicensePlateCatcher): Catcher built with full_result=True.
+
+    Returns:
+        tuple: (recognizer tensors, classifier tensors).
+    """
+    from hyperlpr3.common.tools_process import get_rotate_crop_image, get_rectify_transform, warp_region
+    from hyperlpr3.common.typedef import DOUBLE
+    from hyperlpr3.inference.recognition import encode_images as encode_plate, encode_region, get_resized_width
+    from hyperlpr3.inference.classification import encode_images as encode_color
+    rec_h, rec_w = tuple(catcher.pipeline.recognizer.input_size)
+    cls_size = tuple(catcher.pipeline.classifier.input_size)
+    rec_tensors, cls_tensors = list(), list()
+    for image in images:
+        for result in catcher(image):
+            vertex = np.asarray(result[4], dtype=np.float32)
+            double = result[5] == DOUBLE
+            # Crop-then-resize path
+            crop = get_rotate_crop_image(image, vertex.astype(int))
+            if crop.size == 0:
+                continue
+            line = int(crop.shape[0] * 0.4)
+            for part in ([crop[:line], crop[line:]] if double else [crop]):
+                h, w, _ = part.shape
+                rec_tensors.append(encode_plate(part, w / h, (rec_h, rec_w), limited_max_width=rec_w)[None])
+            cls_tensors.append(encode_color(cv2.resize(crop, cls_size))[None])
+            # Fused warp path
+            matrix, w, h = get_rectify_transform(vertex.astype(int))
+            line = int(h * 0.4)
+            for rect in ([(0, 0, w, line), (0, line, w, h - line)] if double else [(0, 0, w, h)]):
+                out = np.empty((3, rec_h, rec_w), dtype=np.float32)
+                resized_w = get_resized_width(rect[2] / float(rect[3]), rec_h, rec_w)
+                rec_tensors.append(encode_region(image, matrix, rect, resized_w, out)[None])
+            warped = warp_region(image, matrix, (0, 0, w, h), cls_size[::-1])
+            cls_tensors.append(encode_color(cv2.resize(warped, cls_size))[None])
+
+    return rec_tensors, cls_tensors
+
+
+def quantize_model(src: str, dst: str, tensors: list, per_channel: bool = True,
+                   method: CalibrationMethod = CalibrationMethod.MinMax) -> dict:
+    """Statically quantizes an ONNX model to INT8 (QDQ format) from calibration tensors.
+
+    Weights are quantized to signed and activations to unsigned 8 bit, which
+    is what the x86/ARM CPU kernels of ONNX Runtime are fastest with.
+
+    Args:
+        src (str): FP32 ONNX model.
+        dst (str): Output path of the INT8 model.
+        tensors (list): Preprocessed model inputs used for calibration.
+        per_channel (bool, optional): Per output channel weight scales.
+            Defaults to True.
+        method (CalibrationMethod, optional): Activation range estimation.
+            Defaults to CalibrationMethod.MinMax.
+
+    Returns:
+        dict: Source/destination sizes in bytes and the calibration sample count.
+
+    Raises:
+        ValueError: If no calibration tensors are given.
+    """
+    import onnxruntime as ort
+    if not tensors:
+        raise ValueError(f"No calibration data for {src}.")
+    input_name = ort.InferenceSession(src, providers=['CPUExecutionProvider']).get_inputs()[0].name
+    with tempfile.TemporaryDirectory() as tmp:
+        # Shape inference and graph cleanup recommended before static quantization. The bundled models have
+        # static shapes, so ONNX shape inference is enough and the sympy based symbolic pass is skipped
+        prepared = os.path.join(tmp, os.path.basename(src))
+        quant_pre_process(src, prepared, skip_symbolic_shape=True)
+        quantize_static(prepared, dst, TensorCalibrationReader(input_name, tensors), quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=per_channel,
+                        calibrate_method=method)
+
+    return dict(src_bytes=os.path.getsize(src), dst_bytes=os.path.getsize(dst), samples=len(tensors))
+
+
+def quantize_models(images: str, folder: str, max_images: int = 200, per_channel: bool = True) -> dict:
+    """Quantizes the bundled detector, recognizer and classifier from a calibration image folder.
+
+    The detectors are calibrated on the letterboxed images, the recognizer
+    and classifier on the plates the FP32 pipeline finds in them.
+
+    Args:
+        images (str): Calibration image folder, ideally frames from the target cameras.
+        folder (str): Model folder, the INT8 models are written next to the FP32 ones.
+        max_images (int, optional): Maximum number of calibration images. Defaults to 200.
+        per_channel (bool, optional): Per output channel weight scales. Defaults to True.
+
+    Returns:
+        dict: Per model key, the quantize_model report and the output path.
+
+    Raises:
+        ValueError: If the folder has no images or no plates were found in them.
+    """
+    import hyperlpr3 as lpr3
+    from hyperlpr3.config.settings import onnx_runtime_config as ort_cfg
+    samples = load_calibration_images(images, max_images)
+    if not samples:
+        raise ValueError(f"No calibration images found in {images}.")
+    catcher = lpr3.LicensePlateCatcher(folder=folder, detect_level=lpr3.DETECT_LEVEL_HIGH, full_result=True)
+    rec_tensors, cls_tensors = plate_inputs(samples, catcher)
+    if not rec_tensors or not cls_tensors:
+        # Checked before any model is written, so a failed run never leaves a partial INT8 set behind
+        raise ValueError(f"No plates found in the calibration images of {images}.")
+    logger.info(f"Calibrating on {len(samples)} images, {len(cls_tensors) // 2} plates")
+    inputs = dict(det_model_path_320x=lambda: detector_inputs(samples, 320),
+                  det_model_path_640x=lambda: detector_inputs(samples, 640),
+                  rec_model_path=lambda: rec_tensors,
+                  cls_model_path=lambda: cls_tensors)
+    report = dict()
+    for key, build in inputs.items():
+        src = os.path.join(folder, ort_cfg[key])
+        dst = int8_model_path(src)
+        report[key] = dict(quantize_model(src, dst, build(), per_channel=per_channel), path=dst)
+        logger.info(f"{src} -> {dst}")
+
+    return report
@@ -0,0 +1,358 @@
+"""Fair scheduling of many frame sources (e.g. cameras) on one catcher.
+
+Every source is read by its own thread, which only keeps the latest frame:
+a frame that is replaced before the scheduler took it is dropped as
+superseded, so a source producing faster than it is served never queues up.
+The scheduler takes the latest frame of up to `max_batch` sources per cycle,
+in round-robin or weighted order, drops the frames older than the latency
+budget and runs the others together (see `LPRMultiTaskPipeline.run_batch`).
+
+Example:
+    >>> scheduler = MultiSourceScheduler(catcher, max_latency_ms=300, policy='weighted')
+    >>> scheduler.add_source(VideoSource('gate.mp4'), weight=2)
+    >>> scheduler.add_source(DirectorySource('snapshots/', fps=5))
+    >>> for source, frame_id, timestamp, results in scheduler.run(duration=60):
+    ...     print(source, frame_id, results)
+    >>> scheduler.stats()
+"""
+import os
+import time
+import threading
+from collections import deque
+import cv2
+from hyperlpr3.common import trace
+from hyperlpr3.common.image_io import IMAGE_EXTENSIONS
+from hyperlpr3.common.latency import summarize
+
+POLICIES = ('round_robin', 'weighted')
+
+# Latest latencies kept per source for the percentiles of `stats`, so memory stays bounded on endless runs
+LATENCY_WINDOW = 1024
+
+
+class FrameSource(object):
+    """Base class of the scheduled sources: produces frames on a thread, keeping the latest one only.
+
+    Subclasses implement `_frames`, yielding BGR frames. When `fps` is set,
+    frames are released at that rate, which makes files stand in for live
+    cameras.
+
+    Args:
+        name (str): Source name, used in the results and stats.
+        fps (float, optional): Pace of the frames, None for as fast as they
+            can be read. Defaults to None.
+        loop (bool, optional): Restart from the beginning when exhausted.
+            Defaults to False.
+    """
+
+    def __init__(self, name: str, fps: float = None, loop: bool = False):
+        self.name = name
+        self.fps = fps
+        self.loop = loop
+        self.finished = False
+        self.captured = 0
+        self.superseded = 0
+        self._latest = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = None
+        self._thread = None
+
+    def _frames(self):
+        raise NotImplementedError
+
+    def start(self, wake: threading.Event = None):
+        """Starts reading, setting wake whenever a new frame is available."""
+        self._wake = wake
+        self._thread = threading.Thread(target=self._read, name=f'lpr3-source-{self.name}', daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        t0 = time.monotonic()
+        count = 0
+        try:
+            while not self._stop.is_set():
+                produced = False
+                for image in self._frames():
+                    if self._stop.is_set():
+                        break
+                    produced = True
+                    if self.fps:
+                        delay = t0 + count / self.fps - time.monotonic()
+                        if delay > 0:
+                            self._stop.wait(delay)
+                    with self._lock:
+                        if self._latest is not None:
+                            self.superseded += 1
+                        self._latest = (self.captured, time.monotonic(), image)
+                        self.captured += 1
+                    count += 1
+                    if self._wake is not None:
+                        self._wake.set()
+                if not self.loop or not produced:
+                    break
+        finally:
+            self.finished = True
+            if self._wake is not None:
+                self._wake.set()
+
+    def take(self) -> tuple:
+        """Takes the latest frame: (frame_id, capture time.monotonic(), image), None if there is no new one."""
+        with self._lock:
+            latest, self._latest = self._latest, None
+
+        return latest
+
+    @property
+    def has_frame(self) -> bool:
+        """Whether a frame is waiting to be taken."""
+        return self._latest is not None
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether the source ended and its last frame was taken."""
+        return self.finished and self._latest is None
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class VideoSource(FrameSource):
+    """Frames of a video file, stream URL or camera index read with cv2.VideoCapture.
+
+    Args:
+        source (str): Video file, stream URL or camera index.
+        name (str, optional): Defaults to source.
+        realtime (bool, optional): Pace the frames at the container frame
+            rate, for files standing in for cameras. Defaults to True.
+        loop (bool, optional): Restart when the video ends. Defaults to False.
+    """
+
+    def __init__(self, source: str, name: str = None, realtime: bool = True, loop: bool = False):
+        self.source = source
+        capture = cv2.VideoCapture(self._target())
+        if not capture.isOpened():
+            raise IOError(f"Cannot open video {source}.")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        capture.release()
+        super().__init__(name or str(source), fps=fps if realtime else None, loop=loop)
+
+    def _target(self):
+        return int(self.source) if str(self.source).isdigit() else self.source
+
+    def _frames(self):
+        capture = cv2.VideoCapture(self._target())
+        try:
+            while True:
+                ok, image = capture.read()
+                if not ok:
+                    return
+                yield image
+        finally:
+            capture.release()
+
+
+class DirectorySource(FrameSource):
+    """Images of a folder (sorted by name) played as a camera.
+
+    Args:
+        folder (str): Image folder.
+        fps (float, optional): Frame rate. Defaults to 10.
+        name (str, optional): Defaults to folder.
+        loop (bool, optional): Restart when the images run out. Defaults to False.
+    """
+
+    def __init__(self, folder: str, fps: float = 10.0, name: str = None, loop: bool = False):
+        super().__init__(name or folder, fps=fps, loop=loop)
+        self.paths = sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+
+    def _frames(self):
+        for path in self.paths:
+            image = cv2.imread(path)
+            if image is not None:
+                yield image
+
+
+class _SourceState(object):
+
+    def __init__(self, source: FrameSource, weight: float):
+        self.source = source
+        self.weight = weight
+        self.credit = 0.0
+        self.processed = 0
+        self.stale = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+
+class MultiSourceScheduler(object):
+    """Serves many frame sources fairly with one LicensePlateCatcher, within a latency budget.
+
+    Args:
+        catcher (LicensePlateCatcher): The shared catcher.
+        max_latency_ms (float, optional): Frames older than this when they
+            would be run are dropped as stale. Defaults to 500.
+        max_batch (int, optional): Maximum frames (one per source) run
+            together per cycle. Defaults to 8.
+        policy (str, optional): 'round_robin' serves the sources with a new
+            frame in turn, 'weighted' in proportion to their weights, as far
+            as one frame per source and cycle allows. Defaults to
+            'round_robin'.
+    """
+
+    def __init__(self, catcher, max_latency_ms: float = 500, max_batch: int = 8, policy: str = 'round_robin'):
+        assert policy in POLICIES, f"policy must be one of {POLICIES}."
+        self.catcher = catcher
+        self.max_latency = max_latency_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.policy = policy
+        self._states = list()
+        self._cursor = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._started = None
+        self._batches = 0
+        self._batched_frames = 0
+
+    def add_source(self, source: FrameSource, weight: float = 1.0) -> FrameSource:
+        """Registers a source, before `run`.
+
+        Args:
+            source (FrameSource): The source.
+            weight (float, optional): Share of the cycles with the 'weighted'
+                policy. Defaults to 1.
+
+        Returns:
+            FrameSource: The source.
+        """
+        assert weight > 0, "weight must be > 0."
+        self._states.append(_SourceState(source, weight))
+
+        return source
+
+    def _order(self, ready: list) -> list:
+        if self.policy == 'round_robin':
+            count = len(self._states)
+            ordered = sorted(ready, key=lambda state: (self._states.index(state) - self._cursor) % count)
+            self._cursor = (self._states.index(ordered[0]) + 1) % count
+            return ordered[:self.max_batch]
+        # Deficit round-robin: every ready source earns its share of the cycle's slots, the ones with the most
+        # credit are served and pay one slot each, so the credits of the ready sources keep summing to zero
+        for state, share in self._shares(ready).items():
+            state.credit += share
+        ordered = sorted(ready, key=lambda state: -state.credit)[:self.max_batch]
+        for state in ordered:
+            state.credit -= 1.0
+
+        return ordered
+
+    def _shares(self, ready: list) -> dict:
+        # Slots of the cycle owed to each ready source in proportion to its weight, capped at the one frame a
+        # source has, the slots above the cap going to the others
+        slots = min(self.max_batch, len(ready))
+        shares = dict()
+        rest = list(ready)
+        while True:
+            total = sum(state.weight for state in rest)
+            full = [state for state in rest if slots * state.weight >= total]
+            if not full:
+                break
+            for state in full:
+                shares[state] = 1.0
+                rest.remove(state)
+                slots -= 1
+        for state in rest:
+            shares[state] = slots * state.weight / total
+
+        return shares
+
+    def _cycle(self) -> list:
+        now = time.monotonic()
+        frames = list()
+        ready = [state for state in self._states if state.source.has_frame]
+        if not ready:
+            return frames
+        for state in self._order(ready):
+            latest = state.source.take()
+            if latest is None:
+                continue
+            frame_id, captured, image = latest
+            if now - captured > self.max_latency:
+                state.stale += 1
+                continue
+            frames.append((state, frame_id, captured, image))
+
+        return frames
+
+    def run(self, duration: float = None):
+        """Starts the sources and serves them until they end, `stop` is called or duration elapses.
+
+        Args:
+            duration (float, optional): Maximum run time in seconds. Defaults
+                to None (until every source ended).
+
+        Yields:
+            tuple: (source name, frame_id, capture time.monotonic(), results).
+        """
+        self._stop.clear()
+        self._started = time.monotonic()
+        for state in self._states:
+            state.source.start(self._wake)
+        try:
+            while not self._stop.is_set():
+                if duration is not None and time.monotonic() - self._started > duration:
+                    break
+                self._wake.clear()
+                frames = self._cycle()
+                if not frames:
+                    if all(state.source.exhausted for state in self._states):
+                        break
+                    self._wake.wait(0.05)
+                    continue
+                with trace.span('frame', frames=len(frames)):
+                    if len(frames) == 1:
+                        outputs = [self.catcher.pipeline.run(frames[0][3])]
+                    else:
+                        outputs = self.catcher.pipeline.run_batch([dict(image=image) for _, _, _, image in frames])
+                done = time.monotonic()
+                self._batches += 1
+                self._batched_frames += len(frames)
+                for (state, frame_id, captured, _), results in zip(frames, outputs):
+                    state.processed += 1
+                    state.latencies.append(done - captured)
+                    yield state.source.name, frame_id, captured, results
+        finally:
+            for state in self._states:
+                state.source.stop()
+
+    def stop(self):
+        """Makes `run` return after the current cycle."""
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> dict:
+        """Per-source and overall serving statistics.
+
+        Returns:
+            dict: Per source name: frames captured and processed, frames
+                dropped as stale or superseded, the drop rate, the processed
+                fps and the capture to result latency summary of the last
+                LATENCY_WINDOW frames. Overall: the elapsed time, the
+                processed fps and the mean batch size.
+        """
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        sources = dict()
+        for state in self._states:
+            source = state.source
+            dropped = state.stale + source.superseded
+            sources[source.name] = dict(weight=state.weight, captured=source.captured, processed=state.processed,
+                                        stale=state.stale, superseded=source.superseded,
+                                        drop_rate=dropped / source.captured if source.captured else 0.0,
+                                        fps=state.processed / elapsed if elapsed else 0.0,
+                                        latency=summarize(state.latencies))
+        processed = sum(state.processed for state in self._states)
+
+        return dict(elapsed_s=elapsed, fps=processed / elapsed if elapsed else 0.0,
+                    mean_batch=self._batched_frames / self._batches if self._batches else 0.0, sources=sources)
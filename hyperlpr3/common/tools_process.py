@@ -1,7 +1,15 @@
+import math
 import numpy as np
 import cv2
-import time
-from functools import wraps
+from hyperlpr3.common.typedef import PIXEL_FORMAT_BGR, PIXEL_FORMAT_RGB, PIXEL_FORMAT_NV12, PIXEL_FORMAT_NV21, \
+    PIXEL_FORMAT_I420
+
+# (to BGR, to RGB) conversion codes of the planar YUV 4:2:0 formats
+YUV420_CONVERSIONS = {
+    PIXEL_FORMAT_NV12: (cv2.COLOR_YUV2BGR_NV12, cv2.COLOR_YUV2RGB_NV12),
+    PIXEL_FORMAT_NV21: (cv2.COLOR_YUV2BGR_NV21, cv2.COLOR_YUV2RGB_NV21),
+    PIXEL_FORMAT_I420: (cv2.COLOR_YUV2BGR_I420, cv2.COLOR_YUV2RGB_I420),
+}
 
 
 def find_the_adjacent_boxes(boxes: list):
@@ -189,38 +197,110 @@ def letterbox(im, new_shape=(640, 640), color=(0, 0, 0)):
     return im, ratio, (dw, dh)
 
 
-def cost(tag=''):
-    try:
-        '''
-        :param tag: 装饰器的参数
-        '''
-        from loguru import logger
-        def wrapper(fn):
-            @wraps(fn)
-            def wrapper_use_time(*args, **kw):
-                '''
-                函数传参方式 fn(arg1, arg2, param1=a, param2=b)
-                :param args: 位置参数(arg1, arg2, ....)  传参方式 fn(arg1, arg2, ...)
-                :param kw: 字典参数{param1=a, param2=b, .....} 传参方式 fn(param1=a, param2=b, ....)
-                :return:
-                '''
-                t1 = time.time()
-                try:
-                    res = fn(*args, **kw)
-                except Exception as e:
-                    logger.error(f"@use_time %s(%s) execute error" % (fn.__name__, tag))
-                    return None
-                else:
-                    t2 = time.time()
-                    logger.info(f"{tag}@UseTime: {t2 - t1}")
-                    return res
-
-            return wrapper_use_time
-
-        return wrapper
-    except Exception as err:
-        print(err)
+def letterbox_blob(image, size, out=None, canvas=None, swap_rb=True, scale=1 / 255.0, pad_value=0.0,
+                   pixel_format=PIXEL_FORMAT_BGR):
+    """Letterboxes an image straight into a padded NCHW float tensor.
+
+    Fuses what used to be resize + copyMakeBorder + channel swap + transpose +
+    cast + scale: the image is resized directly into the interior of a uint8
+    canvas and then converted to float in a single strided pass into the
+    interior of the output tensor. Only the padding bands are written besides
+    that, so no full-size temporary is created.
+
+    Args:
+        image (np.ndarray): Input image (H, W, 3), uint8.
+        size (tuple): Target (height, width).
+        out (np.ndarray, optional): Preallocated float32 tensor of shape
+            (1, 3, height, width). Allocated if None.
+        canvas (np.ndarray, optional): Preallocated uint8 scratch of shape
+            (height, width, 3) used as the resize destination. Allocated if None.
+        swap_rb (bool, optional): Produce RGB channel order in the tensor, as
+            swapping the channels of a BGR image does. Defaults to True.
+        scale (float, optional): Multiplier applied to the pixel values.
+            Defaults to 1/255.
+        pad_value (float, optional): Value of the padding in the output tensor.
+            Defaults to 0.
+        pixel_format (int, optional): Pixel format of image. YUV 4:2:0 input is
+            resized plane by plane and converted at the target resolution,
+            straight to the tensor channel order. Defaults to PIXEL_FORMAT_BGR.
+
+    Returns:
+        tuple: (tensor, r, left, top) where r is the resize ratio and
+            left/top are the padding offsets of the image in the tensor.
+    """
+    h, w = image_size(image, pixel_format)
+    dst_h, dst_w = size
+    r = min(dst_h / h, dst_w / w)
+    new_h, new_w = int(h * r), int(w * r)
+    top = int((dst_h - new_h) / 2)
+    left = int((dst_w - new_w) / 2)
+    if out is None:
+        out = np.empty((1, 3, dst_h, dst_w), dtype=np.float32)
+    if canvas is None:
+        canvas = np.empty((dst_h, dst_w, 3), dtype=np.uint8)
+    interior = canvas[top:top + new_h, left:left + new_w]
+    if pixel_format in YUV420_CONVERSIONS:
+        interior[...] = resize_yuv420(image, pixel_format, (new_w, new_h), rgb=swap_rb)
+    elif (new_h, new_w) == (h, w):
+        interior[...] = image
+    else:
+        cv2.resize(image, (new_w, new_h), dst=interior)
+    if pixel_format == PIXEL_FORMAT_BGR and swap_rb or pixel_format == PIXEL_FORMAT_RGB and not swap_rb:
+        interior = interior[:, :, ::-1]
+    tensor = out[0]
+    tensor[:, :top] = pad_value
+    tensor[:, top + new_h:] = pad_value
+    tensor[:, top:top + new_h, :left] = pad_value
+    tensor[:, top:top + new_h, left + new_w:] = pad_value
+    np.multiply(interior.transpose(2, 0, 1), scale, out=tensor[:, top:top + new_h, left:left + new_w],
+                dtype=np.float32, casting='unsafe')
+
+    return out, r, left, top
+
+
+def letterbox_image(image, size, canvas=None, pad_value=0, pixel_format=PIXEL_FORMAT_BGR):
+    """Letterboxes an image into a uint8 BGR canvas, for models with the normalization baked in.
+
+    Same geometry as `letterbox_blob`, but the result stays packed uint8 HWC
+    BGR (see `graph_surgery.bake_preprocess`), so the only full-size pass is
+    the resize itself.
+
+    Args:
+        image (np.ndarray): Input image, (H, W, 3) BGR by default.
+        size (tuple): Target (height, width).
+        canvas (np.ndarray, optional): Preallocated uint8 output of shape
+            (height, width, 3), e.g. a view into the model input. Allocated
+            if None.
+        pad_value (int, optional): Value of the padding. Defaults to 0.
+        pixel_format (int, optional): Pixel format of image. Defaults to
+            PIXEL_FORMAT_BGR.
+
+    Returns:
+        tuple: (canvas, r, left, top) as in `letterbox_blob`.
+    """
+    h, w = image_size(image, pixel_format)
+    dst_h, dst_w = size
+    r = min(dst_h / h, dst_w / w)
+    new_h, new_w = int(h * r), int(w * r)
+    top = int((dst_h - new_h) / 2)
+    left = int((dst_w - new_w) / 2)
+    if canvas is None:
+        canvas = np.empty((dst_h, dst_w, 3), dtype=np.uint8)
+    canvas[:top] = pad_value
+    canvas[top + new_h:] = pad_value
+    canvas[top:top + new_h, :left] = pad_value
+    canvas[top:top + new_h, left + new_w:] = pad_value
+    interior = canvas[top:top + new_h, left:left + new_w]
+    if pixel_format in YUV420_CONVERSIONS:
+        interior[...] = resize_yuv420(image, pixel_format, (new_w, new_h), rgb=False)
+    elif pixel_format == PIXEL_FORMAT_RGB:
+        interior[...] = cv2.resize(image, (new_w, new_h))[:, :, ::-1]
+    elif (new_h, new_w) == (h, w):
+        interior[...] = image
+    else:
+        cv2.resize(image, (new_w, new_h), dst=interior)
 
+    return canvas, r, left, top
 
 
 def align_box(imgs, bbox, size=96, scale_factor=1.0, center_bias=0, borderValue=(0, 0, 0)):
@@ -262,7 +342,69 @@ def align_box(imgs, bbox, size=96, scale_factor=1.0, center_bias=0, borderValue=
     return imgs, p, mat
 
 
-def get_rotate_crop_image(img, points):
+def warp_perspective_roi(img, matrix, dsize, dst=None, interpolation=cv2.INTER_CUBIC, pad=3):
+    """Applies cv2.warpPerspective on the bounding box of the source area only.
+
+    The output rectangle is mapped back into the image and warpPerspective is
+    given a view of that (padded) bounding box with the homography shifted
+    accordingly, so huge frames are not handed to OpenCV as a whole for a
+    tiny plate. The padding covers the interpolation kernel, so the result
+    matches warping the full image up to OpenCV's fixed-point rounding of the
+    shifted coordinates (rare off-by-one pixel values).
+
+    Args:
+        img (np.ndarray): Source image.
+        matrix (np.ndarray): 3x3 transform from image to output coordinates.
+        dsize (tuple): Output (width, height).
+        dst (np.ndarray, optional): Preallocated output. Allocated if None.
+        interpolation (int, optional): OpenCV interpolation flag. Defaults to
+            cv2.INTER_CUBIC.
+        pad (int, optional): Pixels added around the bounding box. Defaults to 3.
+
+    Returns:
+        np.ndarray: The warped image of size dsize.
+    """
+    out_w, out_h = dsize
+    # Output corners mapped back into the image; kept in plain floats, this runs once per plate
+    inv = np.linalg.inv(matrix)
+    corners = (inv[:, :2] @ np.array([[0, out_w, out_w, 0], [0, 0, out_h, out_h]], dtype=np.float64)
+               + inv[:, 2:]).tolist()
+    xs, ys, ws = corners
+    if not (min(ws) > 0 or max(ws) < 0):
+        # Degenerate (e.g. self-intersecting) quadrilateral, the source area is unbounded
+        return cv2.warpPerspective(img, matrix, (out_w, out_h), dst=dst,
+                                   borderMode=cv2.BORDER_REPLICATE, flags=interpolation)
+    xs = [x / w for x, w in zip(xs, ws)]
+    ys = [y / w for y, w in zip(ys, ws)]
+    img_h, img_w = img.shape[:2]
+    left = min(max(math.floor(min(xs)) - pad, 0), img_w - 1)
+    top = min(max(math.floor(min(ys)) - pad, 0), img_h - 1)
+    right = max(min(math.ceil(max(xs)) + pad + 1, img_w), left + 1)
+    bottom = max(min(math.ceil(max(ys)) + pad + 1, img_h), top + 1)
+    # matrix @ [[1, 0, left], [0, 1, top], [0, 0, 1]]
+    shifted = matrix.copy()
+    shifted[:, 2] += matrix[:, 0] * left + matrix[:, 1] * top
+    return cv2.warpPerspective(img[top:bottom, left:right], shifted, (out_w, out_h), dst=dst,
+                               borderMode=cv2.BORDER_REPLICATE, flags=interpolation)
+
+
+def crop_pixels(points) -> int:
+    """Returns the pixel count of the crop `get_rotate_crop_image` makes for a plate quadrilateral, without warping.
+
+    Args:
+        points (np.ndarray): Four corner points (4, 2), see `get_rotate_crop_image`.
+
+    Returns:
+        int: Width times height of the upright crop, at least 1.
+    """
+    points = np.asarray(points, dtype=np.float32)
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+
+    return max(1, width * height)
+
+
+def get_rotate_crop_image(img, points, interpolation=cv2.INTER_CUBIC):
     '''
     img_height, img_width = img.shape[0:2]
     left = int(np.min(points[:, 0]))
@@ -288,13 +430,218 @@ def get_rotate_crop_image(img, points):
     points = points.astype(np.float32)
     # print(points.shape, pts_std.shape)
     M = cv2.getPerspectiveTransform(points, pts_std)
-    dst_img = cv2.warpPerspective(
-        img,
-        M, (img_crop_width, img_crop_height),
-        borderMode=cv2.BORDER_REPLICATE,
-        flags=cv2.INTER_CUBIC)
+    # Only the padded bounding box of the plate is read, see warp_perspective_roi
+    dst_img = warp_perspective_roi(img, M, (img_crop_width, img_crop_height), interpolation=interpolation)
     dst_img_height, dst_img_width = dst_img.shape[0:2]
     if dst_img_height * 1.0 / dst_img_width >= 1.5:
         dst_img = np.rot90(dst_img)
 
     return dst_img
+
+
+def get_rectify_transform(points):
+    """Computes the perspective transform that rectifies a plate quadrilateral.
+
+    The transform maps image coordinates onto an upright crop of the plate's
+    natural size, exactly like `get_rotate_crop_image` (including its 90
+    degree rotation of tall crops), but without warping any pixels. It can be
+    composed with a scale/translation to warp a crop straight to its final
+    geometry, see `warp_region`.
+
+    Args:
+        points (np.ndarray): Four corner points (4, 2) in the order top-left,
+            top-right, bottom-right, bottom-left.
+
+    Returns:
+        tuple: (matrix, width, height) where matrix is a 3x3 float64 array and
+            width/height are the size of the upright crop.
+    """
+    assert len(points) == 4, "shape of points must be 4*2"
+    points = np.asarray(points, dtype=np.float32)
+    img_crop_width = max(1, int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3]))))
+    img_crop_height = max(1, int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2]))))
+    pts_std = np.float32([[0, 0], [img_crop_width, 0],
+                          [img_crop_width, img_crop_height],
+                          [0, img_crop_height]])
+    matrix = cv2.getPerspectiveTransform(points, pts_std)
+    if img_crop_height * 1.0 / img_crop_width >= 1.5:
+        # Same as np.rot90 on the warped crop: (x, y) -> (y, width - 1 - x)
+        rotate = np.array([[0, 1, 0], [-1, 0, img_crop_width - 1], [0, 0, 1]], dtype=np.float64)
+        matrix = rotate @ matrix
+        img_crop_width, img_crop_height = img_crop_height, img_crop_width
+
+    return matrix, img_crop_width, img_crop_height
+
+
+def image_size(image, pixel_format=PIXEL_FORMAT_BGR):
+    """Returns the (height, width) of an image in the given pixel format."""
+    if pixel_format in YUV420_CONVERSIONS:
+        return image.shape[0] * 2 // 3, image.shape[1]
+
+    return image.shape[:2]
+
+
+def yuv420_planes(image, pixel_format):
+    """Splits a YUV 4:2:0 buffer into views of its luma and chroma planes.
+
+    Args:
+        image (np.ndarray): Contiguous (H * 3 / 2, W) uint8 buffer.
+        pixel_format (int): PIXEL_FORMAT_NV12, PIXEL_FORMAT_NV21 or PIXEL_FORMAT_I420.
+
+    Returns:
+        tuple: (luma, chroma) where luma is the (H, W) Y plane and chroma is
+            a list with the (H / 2, W / 2, 2) interleaved plane for NV12/NV21
+            or the two (H / 2, W / 2) U and V planes for I420.
+    """
+    height, width = image_size(image, pixel_format)
+    luma = image[:height]
+    if pixel_format == PIXEL_FORMAT_I420:
+        flat = image.reshape(-1)[height * width:]
+        quarter = (height // 2) * (width // 2)
+        chroma = [flat[:quarter].reshape(height // 2, width // 2),
+                  flat[quarter:quarter * 2].reshape(height // 2, width // 2)]
+    else:
+        chroma = [image[height:].reshape(height // 2, width // 2, 2)]
+
+    return luma, chroma
+
+
+def resize_yuv420(image, pixel_format, dsize, rgb=False, interpolation=cv2.INTER_LINEAR):
+    """Resizes a YUV 4:2:0 image plane by plane and converts the small result to color.
+
+    Converting after resizing only touches the target resolution, instead of
+    converting the whole frame before shrinking it.
+
+    Args:
+        image (np.ndarray): (H * 3 / 2, W) uint8 buffer.
+        pixel_format (int): One of the YUV 4:2:0 pixel formats.
+        dsize (tuple): Output (width, height).
+        rgb (bool, optional): Output RGB instead of BGR. Defaults to False.
+        interpolation (int, optional): OpenCV interpolation flag. Defaults to
+            cv2.INTER_LINEAR.
+
+    Returns:
+        np.ndarray: (height, width, 3) uint8 image.
+    """
+    out_w, out_h = dsize
+    even_w, even_h = out_w + (out_w & 1), out_h + (out_h & 1)
+    luma, chroma = yuv420_planes(image, pixel_format)
+    small = np.empty((even_h * 3 // 2, even_w), dtype=np.uint8)
+    small_luma, small_chroma = yuv420_planes(small, pixel_format)
+    cv2.resize(luma, (out_w, out_h), dst=small_luma[:out_h, :out_w], interpolation=interpolation)
+    # Subsampled chroma needs even sizes, replicate the last luma row/column
+    small_luma[:, out_w:] = small_luma[:, out_w - 1:out_w]
+    small_luma[out_h:] = small_luma[out_h - 1:out_h]
+    for src, dst in zip(chroma, small_chroma):
+        cv2.resize(src, (even_w // 2, even_h // 2), dst=dst, interpolation=interpolation)
+    color = cv2.cvtColor(small, YUV420_CONVERSIONS[pixel_format][int(rgb)])
+
+    return color[:out_h, :out_w]
+
+
+def warp_yuv420(image, pixel_format, matrix, dsize, rgb=False, interpolation=cv2.INTER_LINEAR):
+    """Warps a YUV 4:2:0 image plane by plane and converts the small result to color.
+
+    Args:
+        image (np.ndarray): (H * 3 / 2, W) uint8 buffer.
+        pixel_format (int): One of the YUV 4:2:0 pixel formats.
+        matrix (np.ndarray): 3x3 transform from luma to output coordinates.
+        dsize (tuple): Output (width, height).
+        rgb (bool, optional): Output RGB instead of BGR. Defaults to False.
+        interpolation (int, optional): OpenCV interpolation flag. Defaults to
+            cv2.INTER_LINEAR.
+
+    Returns:
+        np.ndarray: (height, width, 3) uint8 image.
+    """
+    out_w, out_h = dsize
+    even_w, even_h = out_w + (out_w & 1), out_h + (out_h & 1)
+    luma, chroma = yuv420_planes(image, pixel_format)
+    small = np.empty((even_h * 3 // 2, even_w), dtype=np.uint8)
+    small_luma, small_chroma = yuv420_planes(small, pixel_format)
+    warp_perspective_roi(luma, matrix, (even_w, even_h), dst=small_luma, interpolation=interpolation)
+    # Chroma sample j sits at luma coordinate 2j + 0.5, in the source and in the output
+    to_luma = np.array([[2, 0, 0.5], [0, 2, 0.5], [0, 0, 1]], dtype=np.float64)
+    to_chroma = np.array([[0.5, 0, -0.25], [0, 0.5, -0.25], [0, 0, 1]], dtype=np.float64)
+    chroma_matrix = to_chroma @ matrix @ to_luma
+    for src, dst in zip(chroma, small_chroma):
+        warp_perspective_roi(src, chroma_matrix, (even_w // 2, even_h // 2), dst=dst, interpolation=interpolation)
+    color = cv2.cvtColor(small, YUV420_CONVERSIONS[pixel_format][int(rgb)])
+
+    return color[:out_h, :out_w]
+
+
+def convert_to_bgr(image, pixel_format):
+    """Converts a full frame in any supported pixel format to packed BGR."""
+    if pixel_format == PIXEL_FORMAT_BGR:
+        return image
+    if pixel_format == PIXEL_FORMAT_RGB:
+        return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+
+    return cv2.cvtColor(image, YUV420_CONVERSIONS[pixel_format][0])
+
+
+def fit_memory_budget(image, pixel_format, budget):
+    """Downsamples a frame whose packed BGR size exceeds a memory budget.
+
+    Args:
+        image (np.ndarray): Frame in the layout of pixel_format.
+        pixel_format (int): One of the PIXEL_FORMAT_* constants.
+        budget (int): Maximum size in bytes of a packed 3 channel frame.
+
+    Returns:
+        tuple: (image, pixel_format, factor) where factor maps the returned
+            frame's coordinates back to the input's. Frames within budget are
+            returned as is with factor 1.0, YUV 4:2:0 frames are downsampled
+            to BGR.
+    """
+    height, width = image_size(image, pixel_format)
+    if height * width * 3 <= budget:
+        return image, pixel_format, 1.0
+    ratio = math.sqrt(budget / (height * width * 3))
+    dsize = max(1, int(width * ratio)), max(1, int(height * ratio))
+    if pixel_format in YUV420_CONVERSIONS:
+        return resize_yuv420(image, pixel_format, dsize, interpolation=cv2.INTER_AREA), PIXEL_FORMAT_BGR, \
+            width / dsize[0]
+
+    return cv2.resize(image, dsize, interpolation=cv2.INTER_AREA), pixel_format, width / dsize[0]
+
+
+def warp_region(img, matrix, region, dsize, dst=None, interpolation=cv2.INTER_LINEAR,
+                pixel_format=PIXEL_FORMAT_BGR):
+    """Warps a rectangle of a rectified crop straight to the requested output size.
+
+    Args:
+        img (np.ndarray): Source image.
+        matrix (np.ndarray): 3x3 transform from image to rectified crop
+            coordinates, see `get_rectify_transform`.
+        region (tuple): (x, y, width, height) of the wanted part of the
+            rectified crop.
+        dsize (tuple): Output (width, height).
+        dst (np.ndarray, optional): Preallocated output of shape
+            (height, width, channels). Allocated if None.
+        interpolation (int, optional): OpenCV interpolation flag. Defaults to
+            cv2.INTER_LINEAR.
+        pixel_format (int, optional): Pixel format of img. Defaults to
+            PIXEL_FORMAT_BGR.
+
+    Returns:
+        np.ndarray: The warped region, always packed BGR.
+    """
+    x, y, width, height = region
+    out_w, out_h = dsize
+    scale = np.array([[out_w / width, 0, -x * out_w / width],
+                      [0, out_h / height, -y * out_h / height],
+                      [0, 0, 1]], dtype=np.float64)
+    if pixel_format == PIXEL_FORMAT_BGR:
+        return warp_perspective_roi(img, scale @ matrix, (out_w, out_h), dst=dst, interpolation=interpolation)
+    if pixel_format == PIXEL_FORMAT_RGB:
+        patch = warp_perspective_roi(img, scale @ matrix, (out_w, out_h), interpolation=interpolation)[:, :, ::-1]
+    else:
+        patch = warp_yuv420(img, pixel_format, scale @ matrix, (out_w, out_h), interpolation=interpolation)
+    if dst is None:
+        return np.ascontiguousarray(patch)
+    dst[...] = patch
+
+    return dst
+
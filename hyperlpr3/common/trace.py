@@ -0,0 +1,305 @@
+"""Structured tracing of the recognition pipeline.
+
+Every pipeline stage and model call is wrapped in a named span. Spans are
+only created while at least one sink is registered; otherwise `span` returns
+a shared no-op object and the instrumentation costs a function call and an
+attribute lookup, so it stays in the code permanently.
+
+Each top-level span (one per `LicensePlateCatcher` call) starts a new trace,
+and every span opened below it in the same thread shares its trace ID.
+
+Example:
+    >>> from hyperlpr3.common import trace
+    >>> ring = trace.RingBufferSink(4096)
+    >>> trace.add_sink(ring)
+    >>> catcher(image)
+    >>> [(span.name, span.duration_ns) for span in ring.spans()]
+"""
+import json
+import time
+import random
+import threading
+from collections import deque
+from functools import wraps
+from loguru import logger
+
+# Registered sinks, replaced as a whole so emitting spans needs no lock. Sinks may also implement on_start(span)
+# and on_end(span), called when a span opens and before any sink receives the finished span
+_sinks = ()
+_starters = ()
+_enders = ()
+_sinks_lock = threading.Lock()
+_local = threading.local()
+
+
+class Span(object):
+    """A finished or running unit of work.
+
+    Attributes:
+        name (str): Stage or model name, e.g. 'detect' or 'ort.inference'.
+        trace_id (str): 32 hex digits, shared by all spans of a frame.
+        span_id (str): 16 hex digits.
+        parent_id (str): span_id of the enclosing span, None for a root.
+        start_ns (int): Wall clock start, ns since the epoch.
+        duration_ns (int): Monotonic duration in ns, set when the span ends.
+        thread (int): Identifier of the thread the span ran in.
+        attributes (dict): Free-form key/values attached with `set`.
+        error (str): repr of the exception that ended the span, if any.
+    """
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start_ns', 'duration_ns', 'thread', 'attributes',
+                 'error', '_t0')
+
+    def __init__(self, name: str, trace_id: str = None, attributes: dict = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.attributes = attributes if attributes is not None else dict()
+        self.parent_id = None
+        self.duration_ns = None
+        self.error = None
+
+    def set(self, key: str, value):
+        """Attaches an attribute to the span and returns it."""
+        self.attributes[key] = value
+
+        return self
+
+    def __enter__(self):
+        stack = _local.__dict__.setdefault('stack', [])
+        if stack:
+            parent = stack[-1]
+            self.parent_id = parent.span_id
+            self.trace_id = parent.trace_id
+        elif self.trace_id is None:
+            self.trace_id = new_trace_id()
+        self.span_id = f'{random.getrandbits(64) or 1:016x}'
+        self.thread = threading.get_ident()
+        stack.append(self)
+        for sink in _starters:
+            sink.on_start(self)
+        self.start_ns = time.time_ns()
+        self._t0 = time.perf_counter_ns()
+
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ns = time.perf_counter_ns() - self._t0
+        if exc is not None:
+            self.error = repr(exc)
+        _local.stack.pop()
+        for sink in _enders:
+            sink.on_end(self)
+        for sink in _sinks:
+            try:
+                sink.emit(self)
+            except Exception as err:
+                # A failing sink must never break recognition
+                logger.warning(f"Trace sink {sink!r} failed: {err!r}")
+
+        return False
+
+    @property
+    def end_ns(self) -> int:
+        return self.start_ns + (self.duration_ns or 0)
+
+    def to_dict(self) -> dict:
+        return dict(name=self.name, trace_id=self.trace_id, span_id=self.span_id, parent_id=self.parent_id,
+                    start_ns=self.start_ns, duration_ns=self.duration_ns, thread=self.thread,
+                    attributes=self.attributes, error=self.error)
+
+
+class _NoopSpan(object):
+    __slots__ = ()
+
+    def set(self, key, value):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def enabled() -> bool:
+    """Whether spans are currently recorded, i.e. a sink is registered."""
+    return bool(_sinks)
+
+
+def span(name: str, trace_id: str = None, **attributes):
+    """Opens a span, to be used as a context manager.
+
+    Args:
+        name (str): Span name.
+        trace_id (str, optional): Trace ID for a root span, e.g. to correlate
+            with the caller's own request ID. Ignored for nested spans.
+            Defaults to a random one.
+        **attributes: Initial span attributes.
+
+    Returns:
+        Span: The span, or a shared no-op object while tracing is disabled.
+    """
+    if not _sinks:
+        return _NOOP_SPAN
+    return Span(name, trace_id, attributes)
+
+
+def traced(name: str = None):
+    """Decorator running every call of a function in a span.
+
+    Args:
+        name (str, optional): Span name. Defaults to the function's qualified name.
+    """
+    def decorator(fn):
+        label = name or fn.__qualname__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _sinks:
+                return fn(*args, **kwargs)
+            with Span(label):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def new_trace_id() -> str:
+    """Returns a random trace ID, e.g. to pass to work done for one frame on other threads."""
+    return f'{random.getrandbits(128) or 1:032x}'
+
+
+def current_trace_id() -> str:
+    """Trace ID of the span running in the calling thread, None outside of any span."""
+    stack = getattr(_local, 'stack', None)
+
+    return stack[-1].trace_id if stack else None
+
+
+def _set_sinks(sinks: tuple):
+    global _sinks, _starters, _enders
+    _starters = tuple(sink for sink in sinks if hasattr(sink, 'on_start'))
+    _enders = tuple(sink for sink in sinks if hasattr(sink, 'on_end'))
+    _sinks = sinks
+
+
+def add_sink(sink):
+    """Registers a sink, enabling tracing. Sinks must have an `emit(span)` method."""
+    with _sinks_lock:
+        _set_sinks(_sinks + (sink,))
+
+    return sink
+
+
+def remove_sink(sink):
+    """Unregisters a sink, tracing is disabled again once no sink is left."""
+    with _sinks_lock:
+        _set_sinks(tuple(item for item in _sinks if item is not sink))
+
+
+def clear_sinks():
+    """Unregisters every sink."""
+    with _sinks_lock:
+        _set_sinks(())
+
+
+class CallbackSink(object):
+    """Calls a function with every finished span."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def emit(self, span: Span):
+        self.callback(span)
+
+
+class RingBufferSink(object):
+    """Keeps the last `capacity` finished spans in memory."""
+
+    def __init__(self, capacity: int = 4096):
+        self._spans = deque(maxlen=capacity)
+
+    def emit(self, span: Span):
+        self._spans.append(span)
+
+    def spans(self) -> list:
+        """Returns a snapshot of the buffered spans, oldest first."""
+        return list(self._spans)
+
+    def clear(self):
+        self._spans.clear()
+
+
+class _FileSink(object):
+
+    def __init__(self, target):
+        # A path is opened (and owned) by the sink, a file object is written to as is
+        self._owned = not hasattr(target, 'write')
+        self._file = open(target, 'a', encoding='utf-8') if self._owned else target
+        self._lock = threading.Lock()
+
+    def _write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        if self._owned:
+            self._file.close()
+
+
+class JsonLinesSink(_FileSink):
+    """Writes one JSON object per finished span (see `Span.to_dict`) to a path or file object."""
+
+    def emit(self, span: Span):
+        self._write(span.to_dict())
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return dict(boolValue=value)
+    if isinstance(value, int):
+        return dict(intValue=str(value))
+    if isinstance(value, float):
+        return dict(doubleValue=value)
+    return dict(stringValue=str(value))
+
+
+def otlp_span(span: Span) -> dict:
+    """Converts a span to the OpenTelemetry OTLP/JSON span representation."""
+    record = dict(traceId=span.trace_id, spanId=span.span_id, parentSpanId=span.parent_id or '', name=span.name,
+                  kind=1, startTimeUnixNano=str(span.start_ns), endTimeUnixNano=str(span.end_ns),
+                  attributes=[dict(key=key, value=_otlp_value(value)) for key, value in span.attributes.items()])
+    record['attributes'].append(dict(key='thread.id', value=_otlp_value(span.thread)))
+    record['status'] = dict(code=2, message=span.error) if span.error else dict(code=0)
+
+    return record
+
+
+class OTLPJsonSink(_FileSink):
+    """Writes finished traces as OpenTelemetry OTLP/JSON export requests, one line per trace.
+
+    Spans are buffered until the root span of their trace ends, then the
+    whole trace is written as a single `ExportTraceServiceRequest`, the
+    format read by the OpenTelemetry Collector's `otlpjsonfile` receiver.
+    """
+
+    def __init__(self, target, service_name: str = 'hyperlpr3'):
+        super().__init__(target)
+        self.service_name = service_name
+        self._pending = dict()
+
+    def emit(self, span: Span):
+        with self._lock:
+            spans = self._pending.setdefault(span.trace_id, list())
+            spans.append(otlp_span(span))
+            if span.parent_id is not None:
+                return
+            del self._pending[span.trace_id]
+        resource = dict(attributes=[dict(key='service.name', value=_otlp_value(self.service_name))])
+        self._write(dict(resourceSpans=[dict(resource=resource,
+                                             scopeSpans=[dict(scope=dict(name='hyperlpr3'), spans=spans)])]))
@@ -6,10 +6,17 @@ PLATE_TYPE_YELLOW = 2
 
 INFER_ONNX_RUNTIME = 0
 INFER_MNN = 1
+INFER_OPENCV_DNN = 2
 
 DETECT_LEVEL_LOW = 0
 DETECT_LEVEL_HIGH = 1
 
+PIXEL_FORMAT_BGR = 0    # (H, W, 3) packed BGR, OpenCV default
+PIXEL_FORMAT_RGB = 1    # (H, W, 3) packed RGB
+PIXEL_FORMAT_NV12 = 2   # (H * 3 / 2, W) Y plane followed by interleaved UV
+PIXEL_FORMAT_NV21 = 3   # (H * 3 / 2, W) Y plane followed by interleaved VU
+PIXEL_FORMAT_I420 = 4   # (H * 3 / 2, W) Y plane followed by U and V planes
+
 MONO = 0    # 单层车牌
 DOUBLE = 1  # 双层车牌
 
@@ -147,3 +154,26 @@ class Plate(object):
 
     def __str__(self):
         return str(self.to_dict())
+
+
+class DeadlineResult(list):
+    """Results of a pipeline run with a deadline, see `LPRMultiTaskPipeline.run`.
+
+    A list of results like the one returned without deadline, which also
+    reports what was left out to meet the deadline.
+
+    Attributes:
+        skipped (list): Plates detected but not recognized, in descending
+            detection score order, as dicts with det_bound_box,
+            det_confidence, vertex and layer_num.
+        unclassified (list): Indices of the results whose plate type could
+            not be told from the code and was left UNKNOWN because the
+            classifier was skipped.
+        elapsed_ms (float): Time spent in the run.
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.skipped = list()
+        self.unclassified = list()
+        self.elapsed_ms = 0.0
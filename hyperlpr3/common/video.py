@@ -0,0 +1,259 @@
+"""Offline video recognition, see `lpr3 video`.
+
+Frames are decoded by `cv2.VideoCapture` on a background thread into a
+bounded buffer, so decoding overlaps with recognition. Skipped frames (see
+stride) are only grabbed, not decoded to BGR. The optional annotated
+output is drawn and encoded on its own thread as well.
+"""
+import time
+import queue
+import threading
+import cv2
+import numpy as np
+from hyperlpr3.common.batch import plate_record
+from hyperlpr3.common.latency import summarize
+
+# Ends the frame stream of a VideoReader
+_END = object()
+
+
+class VideoReader(object):
+    """Decodes a video on a background thread.
+
+    Iterating yields (index, timestamp_ms, image) tuples, image being a BGR
+    frame owned by the consumer. The producer blocks while `capacity` frames
+    are waiting, so memory stays bounded and no frame is dropped.
+
+    Args:
+        source (str): Video file, stream URL or camera index.
+        stride (int, optional): Keep every stride-th frame. Defaults to 1.
+        start (float, optional): Start time in seconds. Defaults to None
+            (start of the video).
+        end (float, optional): End time in seconds. Defaults to None (end of
+            the video).
+        capacity (int, optional): Decoded frames buffered ahead. Defaults to 8.
+
+    Attributes:
+        fps (float): Frame rate reported by the container, 0 if unknown.
+        size (tuple): (width, height) of the frames.
+        frame_count (int): Frames reported by the container, 0 if unknown.
+
+    Raises:
+        IOError: If the source cannot be opened.
+    """
+
+    def __init__(self, source: str, stride: int = 1, start: float = None, end: float = None, capacity: int = 8):
+        assert stride >= 1, "stride must be >= 1."
+        self.capture = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+        if not self.capture.isOpened():
+            raise IOError(f"Cannot open video {source}.")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 0.0
+        self.size = (int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self.stride = stride
+        self.end_ms = None if end is None else end * 1000
+        if start:
+            self.capture.set(cv2.CAP_PROP_POS_MSEC, start * 1000)
+        self.decoded = 0
+        self._queue = queue.Queue(maxsize=max(1, capacity))
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._decode, name='lpr3-video-decode', daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _timestamp(self, index: int) -> float:
+        position = self.capture.get(cv2.CAP_PROP_POS_MSEC)
+        if position <= 0 and index > 0 and self.fps > 0:
+            # Some backends do not report positions, assume a constant frame rate
+            return index * 1000 / self.fps
+        return position
+
+    def _decode(self):
+        try:
+            index = int(self.capture.get(cv2.CAP_PROP_POS_FRAMES) or 0)
+            first = index
+            while not self._stop.is_set() and self.capture.grab():
+                timestamp = self._timestamp(index)
+                if self.end_ms is not None and timestamp > self.end_ms:
+                    break
+                if (index - first) % self.stride == 0:
+                    ok, image = self.capture.retrieve()
+                    if not ok:
+                        break
+                    self.decoded += 1
+                    if not self._put((index, timestamp, image)):
+                        break
+                index += 1
+        except Exception as err:
+            self._error = err
+        finally:
+            self.capture.release()
+            self._put(_END)
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                break
+            yield item
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """Stops decoding, e.g. when the consumer stops early."""
+        self._stop.set()
+        self._thread.join()
+
+
+def draw_results(image: np.ndarray, results: list, font=None) -> np.ndarray:
+    """Draws the plate boxes and texts of compact catcher results onto a BGR image, in place.
+
+    Args:
+        image (np.ndarray): BGR image.
+        results (list): Catcher results (full_result=False).
+        font (optional): PIL ImageFont able to render the province
+            characters. Without it only the ASCII part of the codes is drawn.
+
+    Returns:
+        np.ndarray: The annotated image.
+    """
+    for code, confidence, _, box, _ in results:
+        x1, y1, x2, y2 = [int(value) for value in box]
+        cv2.rectangle(image, (x1, y1), (x2, y2), (139, 139, 102), 2, cv2.LINE_AA)
+        cv2.rectangle(image, (x1, y1 - 20), (x2, y1), (139, 139, 102), -1)
+        if font is None:
+            text = f"{code.encode('ascii', 'ignore').decode()} {confidence:.2f}"
+            cv2.putText(image, text, (x1 + 3, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+    if font is not None and results:
+        from PIL import Image, ImageDraw
+        canvas = Image.fromarray(image)
+        draw = ImageDraw.Draw(canvas)
+        for code, confidence, _, box, _ in results:
+            draw.text((int(box[0]) + 5, int(box[1]) - 20), f"{code} {confidence:.2f}", (255, 255, 255), font=font)
+        image[...] = np.asarray(canvas)
+
+    return image
+
+
+class AnnotatedWriter(object):
+    """Draws results onto frames and encodes them to a video file on a background thread.
+
+    Args:
+        path (str): Output video path.
+        fps (float): Output frame rate.
+        size (tuple): (width, height) of the frames.
+        font (str, optional): TrueType font for the plate texts, see
+            `draw_results`. Requires Pillow. Defaults to None.
+        fourcc (str, optional): Codec. Defaults to 'mp4v'.
+        capacity (int, optional): Frames queued for drawing before `write`
+            blocks. Defaults to 16.
+
+    Raises:
+        IOError: If the output cannot be opened.
+    """
+
+    def __init__(self, path: str, fps: float, size: tuple, font: str = None, fourcc: str = 'mp4v', capacity: int = 16):
+        self.writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if not self.writer.isOpened():
+            raise IOError(f"Cannot write video {path}.")
+        self.font = None
+        if font is not None:
+            from PIL import ImageFont
+            self.font = ImageFont.truetype(font, 20, 0)
+        self._queue = queue.Queue(maxsize=max(1, capacity))
+        self._error = None
+        self._thread = threading.Thread(target=self._encode, name='lpr3-video-encode', daemon=True)
+        self._thread.start()
+
+    def _encode(self):
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                break
+            if self._error is not None:
+                continue
+            try:
+                self.writer.write(draw_results(*item, font=self.font))
+            except Exception as err:
+                self._error = err
+        self.writer.release()
+
+    def write(self, image: np.ndarray, results: list):
+        """Queues a frame, which must not be modified by the caller afterwards."""
+        self._queue.put((image, results))
+
+    def close(self):
+        """Writes the queued frames and closes the file."""
+        self._queue.put(_END)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+def run_video(source: str, catcher, stride: int = 1, start: float = None, end: float = None, capacity: int = 8,
+              annotate: str = None, font: str = None, on_frame=None) -> dict:
+    """Recognizes the plates of a video.
+
+    Args:
+        source (str): Video file, stream URL or camera index.
+        catcher (LicensePlateCatcher): Catcher built with full_result=False.
+        stride (int, optional): Recognize every stride-th frame. Defaults to 1.
+        start (float, optional): Start time in seconds. Defaults to None.
+        end (float, optional): End time in seconds. Defaults to None.
+        capacity (int, optional): Decoded frames buffered ahead. Defaults to 8.
+        annotate (str, optional): Path of an annotated output video, holding
+            the recognized frames only. Defaults to None.
+        font (str, optional): TrueType font for the annotations. Defaults to None.
+        on_frame (optional): Called with the record of every frame: frame
+            index, timestamp_ms, latency_ms and plates (see
+            `batch.plate_record`).
+
+    Returns:
+        dict: Video properties, frames recognized, plates, wall time, overall
+            fps, the per-frame recognition latency summary and the time spent
+            waiting for decoded frames.
+    """
+    reader = VideoReader(source, stride=stride, start=start, end=end, capacity=capacity)
+    writer = None
+    if annotate:
+        writer = AnnotatedWriter(annotate, (reader.fps or 25.0) / stride, reader.size, font=font)
+    latencies = list()
+    plates, waited = 0, 0.0
+    t0 = time.perf_counter()
+    try:
+        frames = iter(reader)
+        while True:
+            t1 = time.perf_counter()
+            item = next(frames, None)
+            t2 = time.perf_counter()
+            waited += t2 - t1
+            if item is None:
+                break
+            index, timestamp, image = item
+            results = catcher(image)
+            latency = time.perf_counter() - t2
+            latencies.append(latency)
+            plates += len(results)
+            if on_frame is not None:
+                on_frame(dict(frame=index, timestamp_ms=timestamp, latency_ms=latency * 1000,
+                              plates=[plate_record(result) for result in results]))
+            if writer is not None:
+                writer.write(image, results)
+    finally:
+        reader.close()
+        if writer is not None:
+            writer.close()
+    wall = time.perf_counter() - t0
+
+    return dict(source=str(source), video_fps=reader.fps, size=list(reader.size), frame_count=reader.frame_count,
+                frames=len(latencies), plates=plates, wall_s=wall, fps=len(latencies) / wall if wall > 0 else 0.0,
+                latency=summarize(latencies), decode_wait_ms=waited * 1000)
@@ -19,4 +19,18 @@ onnx_runtime_config = dict(
 
 onnx_model_maps = ["det_model_path_320x", "det_model_path_640x", "rec_model_path", "cls_model_path"]
 
+# Variants created locally next to the ONNX models: <name>[_int8][_u8][_nms].onnx, see `lpr3 quantize`, `lpr3 bake`
+# and `lpr3 nms` (detectors only)
+INT8_SUFFIX = "_int8"
+BAKED_SUFFIX = "_u8"
+NMS_SUFFIX = "_nms"
+
+# Converted from the ONNX models above on first use when missing, see LicensePlateCatcher
+mnn_runtime_config = dict(
+    det_model_path_320x=os.path.join(_MODEL_VERSION_, "mnn", "y5fu_320x_sim.mnn"),
+    det_model_path_640x=os.path.join(_MODEL_VERSION_, "mnn", "y5fu_640x_sim.mnn"),
+    rec_model_path=os.path.join(_MODEL_VERSION_, "mnn", "rpv3_mdict_160_r3.mnn"),
+    cls_model_path=os.path.join(_MODEL_VERSION_, "mnn", "litemodel_cls_96x_r1.mnn"),
+)
+
 _REMOTE_URL_ = "https://github.com/szad670401/HyperLPR/blob/master/resource/models/onnx/"
\ No newline at end of file
@@ -1,13 +1,44 @@
 from .config.settings import onnx_runtime_config as ort_cfg
+from .config.settings import mnn_runtime_config as mnn_cfg
 from .inference.pipeline import LPRMultiTaskPipeline
 from .common.typedef import *
-from os.path import join
-from .config.settings import _DEFAULT_FOLDER_
+from .common.image_io import EncodedImage, budget_decode_factor
+from .common import trace
+from os.path import join, exists, splitext
+from .config.settings import _DEFAULT_FOLDER_, INT8_SUFFIX, BAKED_SUFFIX, NMS_SUFFIX
 from .config.configuration import initialization
 
 
 initialization()
 
+# Ends the input iterator of LicensePlateCatcher.stream
+_END = object()
+
+
+def _onnx_model_path(folder: str, key: str, precision: str = 'fp32', baked_preprocess: bool = False,
+                     graph_nms: bool = False) -> str:
+    # INT8, baked and NMS variants are produced locally by `lpr3 quantize` / `lpr3 bake` / `lpr3 nms`, they are not
+    # downloadable
+    stem, ext = splitext(join(folder, ort_cfg[key]))
+    path = stem + (INT8_SUFFIX if precision == 'int8' else '') + (BAKED_SUFFIX if baked_preprocess else '') + \
+        (NMS_SUFFIX if graph_nms else '') + ext
+    if (precision == 'int8' or baked_preprocess or graph_nms) and not exists(path):
+        command = 'lpr3 nms' if graph_nms else 'lpr3 bake' if baked_preprocess else 'lpr3 quantize'
+        raise FileNotFoundError(f"{path} does not exist, create it with '{command}'.")
+
+    return path
+
+
+def _mnn_model_path(folder: str, key: str) -> str:
+    # MNN models are converted from the downloaded ONNX ones the first time they are needed
+    path = join(folder, mnn_cfg[key])
+    if not exists(path):
+        from .common.mnn_adapt import convert_onnx_to_mnn
+        convert_onnx_to_mnn(join(folder, ort_cfg[key]), path)
+
+    return path
+
+
 class LicensePlateCatcher(object):
     """High-level API for Chinese license plate recognition.
 
@@ -38,12 +69,23 @@ class LicensePlateCatcher(object):
                  folder: str = _DEFAULT_FOLDER_,
                  detect_level: int = DETECT_LEVEL_LOW,
                  logger_level: int = 3,
-                 full_result: bool = False):
+                 full_result: bool = False,
+                 plate_charset: bool = False,
+                 fused_crop: bool = False,
+                 mnn_threads: int = 1,
+                 mnn_precision: str = 'normal',
+                 dnn_backend: str = 'default',
+                 dnn_target: str = 'cpu',
+                 dnn_threads: int = None,
+                 precision: str = 'fp32',
+                 baked_preprocess: bool = False,
+                 graph_nms: bool = False,
+                 memory_budget_mb: float = None):
         """Initializes the LicensePlateCatcher with specified configuration.
 
         Args:
-            inference (int, optional): Inference engine type. Currently only
-                INFER_ONNX_RUNTIME is supported. Defaults to INFER_ONNX_RUNTIME.
+            inference (int, optional): Inference engine type, INFER_ONNX_RUNTIME,
+                INFER_MNN or INFER_OPENCV_DNN. Defaults to INFER_ONNX_RUNTIME.
             folder (str, optional): Directory containing model files. Defaults
                 to the package's default model directory.
             detect_level (int, optional): Detection level controlling accuracy
@@ -54,31 +96,129 @@ class LicensePlateCatcher(object):
                 Higher values mean less verbose logging. Defaults to 3.
             full_result (bool, optional): If True, results include vertex points
                 for each detected plate. Defaults to False.
+            plate_charset (bool, optional): If True, the recognizer only decodes
+                symbols that can appear on a plate, so the argmax runs over that
+                subset of the output classes. Defaults to False.
+            fused_crop (bool, optional): If True, each plate is rectified and
+                resized to the recognizer input in a single linear warp
+                instead of the cubic crop-then-resize. Faster, but the
+                recognizer input differs slightly, so results are not
+                bit-identical to the default path. Defaults to False.
+            mnn_threads (int, optional): Threads per MNN session (INFER_MNN
+                only). Defaults to 1.
+            mnn_precision (str, optional): MNN precision mode, 'normal', 'high'
+                or 'low' (fp16/bf16 where the CPU supports it). INFER_MNN only.
+                Defaults to 'normal'.
+            dnn_backend (str, optional): cv2.dnn preferable backend, 'default',
+                'opencv', 'openvino', 'cuda' or 'vulkan'. INFER_OPENCV_DNN only.
+                Defaults to 'default'.
+            dnn_target (str, optional): cv2.dnn preferable target, 'cpu',
+                'opencl', 'opencl_fp16', 'cuda', 'cuda_fp16' or 'vulkan'.
+                INFER_OPENCV_DNN only. Defaults to 'cpu'.
+            dnn_threads (int, optional): If set, OpenCV's thread pool size
+                (cv2.setNumThreads). This is process wide and also affects the
+                image processing done by OpenCV. INFER_OPENCV_DNN only.
+                Defaults to None (OpenCV's default).
+            precision (str, optional): 'fp32' for the original models or 'int8'
+                for the statically quantized variants created by `lpr3 quantize`
+                next to them. INT8 is supported with INFER_ONNX_RUNTIME only.
+                Defaults to 'fp32'.
+            baked_preprocess (bool, optional): If True, load the variants created
+                by `lpr3 bake`, which take uint8 NHWC BGR input and normalize
+                inside the graph, so images are only resized on the Python side.
+                INFER_ONNX_RUNTIME only. Defaults to False.
+            graph_nms (bool, optional): If True, load the detector variant created
+                by `lpr3 nms`, which thresholds and runs the NMS in the graph and
+                only outputs the kept plates. INFER_ONNX_RUNTIME only. Defaults to
+                False.
+            memory_budget_mb (float, optional): Peak memory budget of a frame in
+                MiB. Frames whose decoded BGR size exceeds it are downsampled
+                before detection (encoded ones are decoded at a reduced scale
+                instead) and plates are cropped from the downsampled frame.
+                Results stay in the input frame's coordinates. Defaults to None
+                (no limit).
 
         Raises:
             NotImplemented: If unsupported inference engine or detect_level is specified.
+            FileNotFoundError: If the requested INT8, baked or NMS models are missing.
         """
+        assert precision in ('fp32', 'int8'), "precision must be 'fp32' or 'int8'."
+        assert precision == 'fp32' or inference == INFER_ONNX_RUNTIME, "INT8 models require INFER_ONNX_RUNTIME."
+        assert not baked_preprocess or inference == INFER_ONNX_RUNTIME, \
+            "Baked preprocessing requires INFER_ONNX_RUNTIME."
+        assert not graph_nms or inference == INFER_ONNX_RUNTIME, "In-graph NMS requires INFER_ONNX_RUNTIME."
+        memory_budget = None if memory_budget_mb is None else int(memory_budget_mb * 2 ** 20)
         if inference == INFER_ONNX_RUNTIME:
             from hyperlpr3.inference.multitask_detect import MultiTaskDetectorORT
             from hyperlpr3.inference.recognition import PPRCNNRecognitionORT
             from hyperlpr3.inference.classification import ClassificationORT
             import onnxruntime as ort
             ort.set_default_logger_severity(logger_level)
+            variant = dict(precision=precision, baked_preprocess=baked_preprocess)
+            det_variant = dict(variant, graph_nms=graph_nms)
+
+            if detect_level == DETECT_LEVEL_LOW:
+                det = MultiTaskDetectorORT(_onnx_model_path(folder, 'det_model_path_320x', **det_variant),
+                                           input_size=(320, 320))
+            elif detect_level == DETECT_LEVEL_HIGH:
+                det = MultiTaskDetectorORT(_onnx_model_path(folder, 'det_model_path_640x', **det_variant),
+                                           input_size=(640, 640))
+            else:
+                raise NotImplemented
+            from hyperlpr3.common.tokenize import plate_charset as charset
+            rec = PPRCNNRecognitionORT(_onnx_model_path(folder, 'rec_model_path', **variant), input_size=(48, 160),
+                                       charset=charset if plate_charset else None)
+            cls = ClassificationORT(_onnx_model_path(folder, 'cls_model_path', **variant), input_size=(96, 96))
+            self.pipeline = LPRMultiTaskPipeline(detector=det, recognizer=rec, classifier=cls, full_result=full_result,
+                                                 fused_crop=fused_crop, memory_budget=memory_budget)
+        elif inference == INFER_MNN:
+            from hyperlpr3.inference.multitask_detect import MultiTaskDetectorMNN
+            from hyperlpr3.inference.recognition import PPRCNNRecognitionMNN
+            from hyperlpr3.inference.classification import ClassificationMNN
+            options = dict(num_thread=mnn_threads, precision=mnn_precision)
 
             if detect_level == DETECT_LEVEL_LOW:
-                # print(join(folder, ort_cfg['det_model_path_320x']))
-                det = MultiTaskDetectorORT(join(folder, ort_cfg['det_model_path_320x']), input_size=(320, 320))
+                det = MultiTaskDetectorMNN(_mnn_model_path(folder, 'det_model_path_320x'), input_size=(320, 320),
+                                           **options)
             elif detect_level == DETECT_LEVEL_HIGH:
-                det = MultiTaskDetectorORT(join(folder, ort_cfg['det_model_path_640x']), input_size=(640, 640))
+                det = MultiTaskDetectorMNN(_mnn_model_path(folder, 'det_model_path_640x'), input_size=(640, 640),
+                                           **options)
             else:
                 raise NotImplemented
-            rec = PPRCNNRecognitionORT(join(folder, ort_cfg['rec_model_path']), input_size=(48, 160))
-            cls = ClassificationORT(join(folder, ort_cfg['cls_model_path']), input_size=(96, 96))
-            self.pipeline = LPRMultiTaskPipeline(detector=det, recognizer=rec, classifier=cls, full_result=full_result)
+            from hyperlpr3.common.tokenize import plate_charset as charset
+            rec = PPRCNNRecognitionMNN(_mnn_model_path(folder, 'rec_model_path'), input_size=(48, 160),
+                                       charset=charset if plate_charset else None, **options)
+            cls = ClassificationMNN(_mnn_model_path(folder, 'cls_model_path'), input_size=(96, 96), **options)
+            self.pipeline = LPRMultiTaskPipeline(detector=det, recognizer=rec, classifier=cls, full_result=full_result,
+                                                 fused_crop=fused_crop, memory_budget=memory_budget)
+        elif inference == INFER_OPENCV_DNN:
+            import cv2
+            from hyperlpr3.inference.multitask_detect import MultiTaskDetectorDNN
+            from hyperlpr3.inference.recognition import PPRCNNRecognitionDNN
+            from hyperlpr3.inference.classification import ClassificationDNN
+            if dnn_threads is not None:
+                cv2.setNumThreads(dnn_threads)
+            options = dict(backend=dnn_backend, target=dnn_target)
+
+            if detect_level == DETECT_LEVEL_LOW:
+                det = MultiTaskDetectorDNN(join(folder, ort_cfg['det_model_path_320x']), input_size=(320, 320),
+                                           **options)
+            elif detect_level == DETECT_LEVEL_HIGH:
+                det = MultiTaskDetectorDNN(join(folder, ort_cfg['det_model_path_640x']), input_size=(640, 640),
+                                           **options)
+            else:
+                raise NotImplemented
+            from hyperlpr3.common.tokenize import plate_charset as charset
+            rec = PPRCNNRecognitionDNN(join(folder, ort_cfg['rec_model_path']), input_size=(48, 160),
+                                       charset=charset if plate_charset else None, **options)
+            cls = ClassificationDNN(join(folder, ort_cfg['cls_model_path']), input_size=(96, 96), **options)
+            self.pipeline = LPRMultiTaskPipeline(detector=det, recognizer=rec, classifier=cls, full_result=full_result,
+                                                 fused_crop=fused_crop, memory_budget=memory_budget)
         else:
             raise NotImplemented
 
-    def __call__(self, image: np.ndarray, *args, **kwargs):
+    def __call__(self, image: np.ndarray, pixel_format: int = PIXEL_FORMAT_BGR, *args, deadline_ms: float = None,
+                 **kwargs):
         """Detects and recognizes license plates in an image.
 
         This method performs end-to-end license plate recognition, including
@@ -86,8 +226,20 @@ class LicensePlateCatcher(object):
         and plate type classification.
 
         Args:
-            image (np.ndarray): Input image in BGR format with shape (H, W, 3).
+            image (np.ndarray): Input image in BGR format with shape (H, W, 3),
+                or in the layout of the given pixel_format.
+            pixel_format (int, optional): PIXEL_FORMAT_BGR (default),
+                PIXEL_FORMAT_RGB, or PIXEL_FORMAT_NV12/NV21/I420 for a
+                (H * 3 / 2, W) uint8 camera buffer. With fused_crop, frames are
+                consumed in their native format, without a full-frame color
+                conversion; otherwise frames with plates are converted to BGR
+                for cropping.
             *args: Variable length argument list (unused).
+            deadline_ms (float, optional): Time budget of the call. When it
+                runs short, plates are recognized best detection first and the
+                rest are skipped, and the classifier is skipped (see
+                `LPRMultiTaskPipeline.run`). The result is then a
+                DeadlineResult listing the skipped plates. Defaults to None.
             **kwargs: Arbitrary keyword arguments (unused).
 
         Returns:
@@ -106,4 +258,148 @@ class LicensePlateCatcher(object):
                     [plate_code, rec_confidence, plate_type, det_bound_box, vertex, layer_num]
                     - vertex (list): Four corner points [[x1,y1], [x2,y2], [x3,y3], [x4,y4]]
         """
-        return self.pipeline(image)
+        # One trace per frame, see common.trace
+        with trace.span('frame'):
+            return self.pipeline(image, pixel_format=pixel_format, deadline_ms=deadline_ms)
+
+    def recognize_encoded(self, data) -> list:
+        """Detects and recognizes license plates in an encoded (e.g. JPEG) image.
+
+        Large JPEGs are decoded at a reduced scale that stays above the
+        detector input size for detection. The full resolution frame is only
+        decoded when plates were found, and plates are cropped from it, so
+        results are in full resolution coordinates. With a memory budget, plates are
+        cropped from the largest reduced scale that fits in it instead.
+
+        Args:
+            data: Encoded image, as bytes, a uint8 np.ndarray or an
+                `EncodedImage`.
+
+        Returns:
+            list: Same as `__call__`, or an empty list if the data could not
+                be decoded.
+        """
+        with trace.span('frame', encoded=True):
+            frame = self._encoded_frame(data)
+            if frame is None:
+                return list()
+
+            return self.pipeline.run(**frame)
+
+    def _encoded_frame(self, data) -> dict:
+        # Decodes the detection frame of an encoded image, returns the pipeline.run arguments or None
+        if not isinstance(data, EncodedImage):
+            data = EncodedImage(data)
+        with trace.span('decode') as span:
+            image, factor = data.reduced(max(self.pipeline.detector.input_size))
+            span.set('factor', factor)
+        if image is None:
+            return None
+        budget = self.pipeline.memory_budget
+        if budget is None or data.size is None:
+            if factor == 1:
+                return dict(image=image)
+            return dict(image=image, full_image=data.full, scale=factor)
+        crop_factor = budget_decode_factor(data.size, budget)
+        if crop_factor >= factor:
+            # The detection frame is as large as the budget allows, crop from it too
+            return dict(image=image, coordinate_scale=factor)
+
+        return dict(image=image, full_image=lambda: data.decode(crop_factor), scale=factor / crop_factor,
+                    coordinate_scale=crop_factor)
+
+    def _stream_frame(self, item, pixel_format: int, trace_id: str = None) -> dict:
+        # Runs on a prefetch thread, in a root span carrying the trace ID of the frame
+        with trace.span('prefetch', trace_id=trace_id) as span:
+            try:
+                if isinstance(item, str):
+                    item = EncodedImage.from_file(item)
+                if isinstance(item, np.ndarray) and item.ndim > 1:
+                    return dict(image=item, pixel_format=pixel_format)
+
+                return self._encoded_frame(item)
+            except OSError as err:
+                # Missing or unreadable file: an empty result, like an undecodable image
+                span.set('error', repr(err))
+                return None
+
+    def stream(self, frames, prefetch: int = 4, max_batch: int = 8, pixel_format: int = PIXEL_FORMAT_BGR):
+        """Recognizes a stream of frames, decoding the next ones on worker threads meanwhile.
+
+        Up to max(prefetch, max_batch) inputs are queued and read and decoded
+        by `prefetch` threads while the current frames run, so decoding
+        overlaps with inference and memory stays bounded. Frames already
+        decoded when the pipeline becomes free are run together (see
+        `LPRMultiTaskPipeline.run_batch`), up to max_batch.
+
+        While tracing, every input gets its own trace ID, shared by its
+        'prefetch' span on the decoding thread and by the 'frame' span it runs
+        in; a frame span running several inputs carries the first one's and
+        lists all of them in its `trace_ids` attribute.
+
+        Args:
+            frames: Iterable of inputs, consumed lazily. Each is a frame in
+                pixel_format (np.ndarray), an encoded image (bytes, 1-D uint8
+                np.ndarray or EncodedImage, see `recognize_encoded`), an image
+                file path, or a (frame_id, input) tuple.
+            prefetch (int, optional): Decoding threads. Defaults to 4.
+            max_batch (int, optional): Maximum frames run together. Defaults to 8.
+            pixel_format (int, optional): Pixel format of the np.ndarray
+                frames, see `__call__`. Defaults to PIXEL_FORMAT_BGR.
+
+        Yields:
+            tuple: (frame_id, results) in input order, frame_id being the
+                input's position unless given. Inputs that cannot be read or
+                decoded yield an empty result list.
+        """
+        from collections import deque
+        from concurrent.futures import ThreadPoolExecutor
+        items = enumerate(frames)
+        pending = deque()
+        # Large enough for a full batch to be decoded while the previous one runs
+        window = max(1, prefetch, max_batch)
+        with ThreadPoolExecutor(max(1, prefetch), thread_name_prefix='lpr3-stream') as executor:
+
+            def fill():
+                while len(pending) < window:
+                    position, item = next(items, (None, _END))
+                    if item is _END:
+                        return
+                    frame_id, item = item if isinstance(item, tuple) else (position, item)
+                    trace_id = trace.new_trace_id() if trace.enabled() else None
+                    pending.append((frame_id, trace_id,
+                                    executor.submit(self._stream_frame, item, pixel_format, trace_id)))
+
+            try:
+                fill()
+                while pending:
+                    # Waits for the oldest input, then takes whatever else is decoded already
+                    batch = [pending.popleft()]
+                    batch[0][2].result()
+                    while pending and len(batch) < max_batch and pending[0][2].done():
+                        batch.append(pending.popleft())
+                    fill()
+                    ready = [(frame_id, future.result()) for frame_id, _, future in batch]
+                    runnable = [frame for _, frame in ready if frame is not None]
+                    trace_ids = [trace_id for _, trace_id, _ in batch]
+                    with trace.span('frame', trace_id=trace_ids[0], frames=len(runnable)) as span:
+                        if len(trace_ids) > 1:
+                            span.set('trace_ids', trace_ids)
+                        if len(runnable) == 1:
+                            results = iter([self.pipeline.run(**runnable[0])])
+                        else:
+                            results = iter(self.pipeline.run_batch(runnable))
+                    for frame_id, frame in ready:
+                        yield frame_id, list() if frame is None else next(results)
+            finally:
+                # Closed early: drop the inputs that did not start decoding yet
+                for _, _, future in pending:
+                    future.cancel()
+
+    def stats(self) -> dict:
+        """Returns runtime statistics of the underlying models.
+
+        Returns:
+            dict: See `LPRMultiTaskPipeline.stats`.
+        """
+        return self.pipeline.stats()
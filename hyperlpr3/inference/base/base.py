@@ -1,4 +1,5 @@
 from abc import ABCMeta, abstractmethod
+from hyperlpr3.common import trace
 
 
 class HamburgerABC(metaclass=ABCMeta):
@@ -12,16 +13,22 @@ class HamburgerABC(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def _postprocess(self, data):
+    def _postprocess(self, data, context: dict):
         pass
 
     @abstractmethod
-    def _preprocess(self, image):
+    def _preprocess(self, image, context: dict):
         pass
 
-    def __call__(self, image):
-        flow = self._preprocess(image)
+    def __call__(self, image, **kwargs):
+        # Per-call state (e.g. letterbox ratio/offsets) travels in the context instead of living
+        # on self, so a single instance can be called from several threads at once.
+        context = dict()
+        name = type(self).__name__
+        with trace.span(name + '.preprocess'):
+            flow = self._preprocess(image, context, **kwargs)
         flow = self._run_session(flow)
-        result = self._postprocess(flow)
+        with trace.span(name + '.postprocess'):
+            result = self._postprocess(flow, context)
 
         return result
@@ -1,49 +1,110 @@
 import cv2
 import numpy as np
 from .base.base import HamburgerABC
-from hyperlpr3.common.tools_process import cost
 
 
-def encode_images(image: np.ndarray):
-    image_encode = image / 255.0
-    if len(image_encode.shape) == 4:
-        image_encode = image_encode.transpose(0, 3, 1, 2)
+def encode_images(image: np.ndarray, out=None):
+    if len(image.shape) == 4:
+        image = image.transpose(0, 3, 1, 2)
     else:
-        image_encode = image_encode.transpose(2, 0, 1)
-    image_encode = image_encode.astype(np.float32)
+        image = image.transpose(2, 0, 1)
+    if out is None:
+        out = np.empty(image.shape, dtype=np.float32)
+    np.divide(image, 255.0, out=out, dtype=np.float32, casting='unsafe')
 
-    return image_encode
+    return out
 
 
 class ClassificationORT(HamburgerABC):
 
-    def __init__(self, onnx_path, *args, **kwargs):
-        import onnxruntime as ort
+    def __init__(self, onnx_path, io_binding: bool = True, *args, **kwargs):
+        from hyperlpr3.common.ort_adapt import ORTAdapter
         super().__init__(*args, **kwargs)
-        self.session = ort.InferenceSession(onnx_path, None)
-        self.input_config = self.session.get_inputs()[0]
-        self.output_config = self.session.get_outputs()[0]
-        self.input_size = tuple(self.input_config.shape[2:])
+        self.session = ORTAdapter(onnx_path, io_binding=io_binding)
+        self.input_config = self.session.inputs_option[0]
+        self.output_config = self.session.outputs_option[0]
+        # uint8 NHWC BGR input: normalization baked into the graph by graph_surgery.bake_preprocess
+        self.uint8_input = self.input_config.type == 'tensor(uint8)'
+        self.input_size = tuple(self.input_config.shape[1:3] if self.uint8_input else self.input_config.shape[2:])
 
-    # @cost('Cls')
     def _run_session(self, data) -> np.ndarray:
-        result = self.session.run([self.output_config.name], {self.input_config.name: data})
+        result = self.session.inference(data)
 
         return result[0]
 
-    def _postprocess(self, data) -> np.ndarray:
-        return data
+    def _postprocess(self, data, context) -> np.ndarray:
+        # The output buffer is owned by the session and rewritten by the next call
+        return data.copy()
 
-    def _preprocess(self, image) -> np.ndarray:
+    def _preprocess(self, image, context) -> np.ndarray:
         assert len(
             image.shape) == 3, "The dimensions of the input image object do not match. The input supports a single " \
                                "image. "
         # print(self.input_size)
-        image_resize = cv2.resize(image, self.input_size)
-        encode = encode_images(image_resize)
-        encode = encode.astype(np.float32)
-        input_tensor = np.expand_dims(encode, 0)
+        if self.uint8_input:
+            input_tensor = self.session.input_buffer((1, self.input_size[0], self.input_size[1], 3), np.uint8)
+            cv2.resize(image, tuple(self.input_size), dst=input_tensor[0])
+
+            return input_tensor
+        image_resize = cv2.resize(image, tuple(self.input_size))
+        input_tensor = self.session.input_buffer((1, 3, self.input_size[0], self.input_size[1]))
+        encode_images(image_resize, out=input_tensor[0])
 
         return input_tensor
 
 
+class ClassificationMNN(HamburgerABC):
+
+    def __init__(self, mnn_path, num_thread: int = 1, precision: str = 'normal', *args, **kwargs):
+        from hyperlpr3.common.mnn_adapt import MNNAdapter
+        super().__init__(*args, **kwargs)
+        self.input_size = tuple(self.input_size)
+        self.input_shape = (1, 3, self.input_size[0], self.input_size[1])
+        self.session = MNNAdapter(mnn_path, self.input_shape, num_thread=num_thread, precision=precision)
+
+    def _run_session(self, data) -> np.ndarray:
+        result = self.session.inference(data)
+
+        return result[0]
+
+    def _postprocess(self, data, context) -> np.ndarray:
+        # The output buffer is owned by the session and rewritten by the next call
+        return data.copy()
+
+    def _preprocess(self, image, context) -> np.ndarray:
+        assert len(
+            image.shape) == 3, "The dimensions of the input image object do not match. The input supports a single " \
+                               "image. "
+        image_resize = cv2.resize(image, tuple(self.input_size))
+        input_tensor = self.session.input_buffer(self.input_shape)
+        encode_images(image_resize, out=input_tensor[0])
+
+        return input_tensor
+
+
+class ClassificationDNN(HamburgerABC):
+
+    def __init__(self, onnx_path, backend: str = 'default', target: str = 'cpu', *args, **kwargs):
+        from hyperlpr3.common.dnn_adapt import DNNAdapter
+        super().__init__(*args, **kwargs)
+        self.input_size = tuple(self.input_size)
+        self.input_shape = (1, 3, self.input_size[0], self.input_size[1])
+        self.session = DNNAdapter(onnx_path, backend=backend, target=target)
+
+    def _run_session(self, data) -> np.ndarray:
+        result = self.session.inference(data)
+
+        return result[0]
+
+    def _postprocess(self, data, context) -> np.ndarray:
+        return data
+
+    def _preprocess(self, image, context) -> np.ndarray:
+        assert len(
+            image.shape) == 3, "The dimensions of the input image object do not match. The input supports a single " \
+                               "image. "
+        image_resize = cv2.resize(image, tuple(self.input_size))
+        input_tensor = self.session.input_buffer(self.input_shape)
+        encode_images(image_resize, out=input_tensor[0])
+
+        return input_tensor
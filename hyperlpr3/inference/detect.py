@@ -10,18 +10,18 @@ ANCHORS_MAP = {
 }
 
 
-def image_to_input_tensor(image):
-    data = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    data = data.transpose(2, 0, 1) / 255.0
-    data = np.expand_dims(data, 0)
-    data = data.astype(np.float32)
+def image_to_input_tensor(image, out=None):
+    h, w, _ = image.shape
+    if out is None:
+        out = np.empty((1, 3, h, w), dtype=np.float32)
+    np.divide(image[:, :, ::-1].transpose(2, 0, 1), 255.0, out=out[0], dtype=np.float32, casting='unsafe')
 
-    return data
+    return out
 
 
 class Y5rkDetectorMNN(HamburgerABC):
     def __init__(self, mnn_path, box_threshold: float = 0.5, nms_threshold: float = 0.6, *args, **kwargs):
-        from .common.mnn_adapt import MNNAdapter
+        from hyperlpr3.common.mnn_adapt import MNNAdapter
         super().__init__(*args, **kwargs)
         self.box_threshold = box_threshold
         self.nms_threshold = nms_threshold
@@ -40,8 +40,8 @@ class Y5rkDetectorMNN(HamburgerABC):
 
         return result
 
-    def _postprocess(self, data):
-        ratio, (dw, dh) = self.temp_pack
+    def _postprocess(self, data, context):
+        ratio, (dw, dh) = context['letterbox']
         input0_data = data[0]
         input1_data = data[1]
         input2_data = data[2]
@@ -59,11 +59,9 @@ class Y5rkDetectorMNN(HamburgerABC):
 
         return boxes, classes, scores
 
-    def _preprocess(self, image):
-        h, w, _ = image.shape
-        resize_img, ratio, (dw, dh) = letterbox(image, new_shape=(self.input_size[1], self.input_size[0]))
-        data = image_to_input_tensor(resize_img)
-        self.temp_pack = ratio, (dw, dh)
+    def _preprocess(self, image, context):
+        data, r, left, top = letterbox_blob(image, self.input_size)
+        context['letterbox'] = (r, r), (left, top)
 
         return data
 
@@ -109,14 +107,15 @@ class Y5rkDetectorMNN(HamburgerABC):
 
 class Y5rkDetectorORT(HamburgerABC):
 
-    def __init__(self, onnx_path, box_threshold: float = 0.5, nms_threshold: float = 0.6, *args, **kwargs):
-        import onnxruntime as ort
+    def __init__(self, onnx_path, box_threshold: float = 0.5, nms_threshold: float = 0.6, io_binding: bool = True,
+                 *args, **kwargs):
+        from hyperlpr3.common.ort_adapt import ORTAdapter
         super().__init__(*args, **kwargs)
         self.box_threshold = box_threshold
         self.nms_threshold = nms_threshold
-        self.session = ort.InferenceSession(onnx_path, None)
-        self.inputs_option = self.session.get_inputs()
-        self.outputs_option = self.session.get_outputs()
+        self.session = ORTAdapter(onnx_path, io_binding=io_binding)
+        self.inputs_option = self.session.inputs_option
+        self.outputs_option = self.session.outputs_option
         input_option = self.inputs_option[0]
         input_size_ = tuple(input_option.shape[2:])
         self.input_size = tuple(self.input_size)
@@ -125,6 +124,7 @@ class Y5rkDetectorORT(HamburgerABC):
         assert self.input_size == input_size_, 'The dimensions of the input do not match the model expectations.'
         assert self.input_size[0] == self.input_size[1]
         self.input_name = input_option.name
+        self.input_shape = (1, 3, self.input_size[0], self.input_size[1])
         self.anchors = ANCHORS_MAP[self.input_size[0]]
 
     def decode_outputs(self, input_data, size):
@@ -166,14 +166,13 @@ class Y5rkDetectorORT(HamburgerABC):
 
         return boxes, classes, scores
 
-    @cost("Detect")
     def _run_session(self, data):
-        outputs = self.session.run([], {"images": data})
+        outputs = self.session.inference(data)
 
         return outputs
 
-    def _postprocess(self, data):
-        ratio, (dw, dh) = self.temp_pack
+    def _postprocess(self, data, context):
+        ratio, (dw, dh) = context['letterbox']
         input0_data = data[0]
         input1_data = data[1]
         input2_data = data[2]
@@ -191,10 +190,10 @@ class Y5rkDetectorORT(HamburgerABC):
 
         return boxes, classes, scores
 
-    def _preprocess(self, image):
-        h, w, _ = image.shape
-        resize_img, ratio, (dw, dh) = letterbox(image, new_shape=(self.input_size[1], self.input_size[0]))
-        data = image_to_input_tensor(resize_img)
-        self.temp_pack = ratio, (dw, dh)
+    def _preprocess(self, image, context):
+        buffer = self.session.input_buffer(self.input_shape)
+        canvas = self.session.input_buffer((self.input_size[0], self.input_size[1], 3), np.uint8)
+        data, r, left, top = letterbox_blob(image, self.input_size, out=buffer, canvas=canvas)
+        context['letterbox'] = (r, r), (left, top)
 
         return data
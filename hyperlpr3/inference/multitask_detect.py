@@ -1,7 +1,11 @@
+import json
 import numpy as np
 import cv2
 import copy
+from loguru import logger
 from .base.base import HamburgerABC
+from hyperlpr3.common.tools_process import letterbox_blob, letterbox_image
+from hyperlpr3.common.typedef import PIXEL_FORMAT_BGR
 
 
 def xywh2xyxy(boxes):
@@ -36,6 +40,73 @@ def nms(boxes, iou_thresh):  # nms
     return keep
 
 
+# Above this many boxes nms_matrix falls back to `nms`, its N x N float32 matrices would take too much memory
+# (4096 boxes: 64 MiB per matrix)
+MATRIX_NMS_MAX_BOXES = 4096
+
+
+def nms_matrix(boxes, iou_thresh):
+    # Same greedy suppression as `nms`, but all pairwise IoUs are computed in one vectorized step
+    if len(boxes) > MATRIX_NMS_MAX_BOXES:
+        return nms(boxes, iou_thresh)
+    order = np.argsort(boxes[:, 4])[::-1]
+    sorted_boxes = boxes[order, :4].astype(np.float32)
+    x1, y1, x2, y2 = sorted_boxes[:, 0], sorted_boxes[:, 1], sorted_boxes[:, 2], sorted_boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    w = np.minimum(x2[:, None], x2[None, :])
+    w -= np.maximum(x1[:, None], x1[None, :])
+    np.maximum(w, 0, out=w)
+    h = np.minimum(y2[:, None], y2[None, :])
+    h -= np.maximum(y1[:, None], y1[None, :])
+    np.maximum(h, 0, out=h)
+    inter_area = np.multiply(w, h, out=w)
+    union_area = np.add(areas[:, None], areas[None, :], out=h)
+    union_area -= inter_area
+    with np.errstate(divide='ignore', invalid='ignore'):
+        iou = np.divide(inter_area, union_area, out=inter_area)
+    suppress = ~(iou <= iou_thresh)
+    removed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in range(len(order)):
+        if removed[i]:
+            continue
+        keep.append(order[i])
+        removed |= suppress[i]
+    return keep
+
+
+def nms_cv2(boxes, iou_thresh):
+    # OpenCV's NMSBoxes expects [x, y, w, h] rectangles
+    if len(boxes) == 0:
+        return []
+    rects = np.concatenate((boxes[:, :2], boxes[:, 2:4] - boxes[:, :2]), axis=1)
+    keep = cv2.dnn.NMSBoxes(rects.tolist(), boxes[:, 4].tolist(), 0.0, iou_thresh)
+    return np.asarray(keep, dtype=int).reshape(-1).tolist()
+
+
+NMS_BACKENDS = dict(python=nms, matrix=nms_matrix, cv2=nms_cv2)
+
+_default_nms_backend = 'matrix'
+
+
+def set_nms_backend(name):
+    """Selects the NMS implementation used by detectors without an explicit backend.
+
+    Args:
+        name (str): One of the keys of NMS_BACKENDS ('python', 'matrix', 'cv2').
+    """
+    global _default_nms_backend
+    assert name in NMS_BACKENDS, f"Unknown NMS backend '{name}', expected one of {list(NMS_BACKENDS)}."
+    _default_nms_backend = name
+
+
+def get_nms_backend(name=None):
+    if name is None:
+        name = _default_nms_backend
+    assert name in NMS_BACKENDS, f"Unknown NMS backend '{name}', expected one of {list(NMS_BACKENDS)}."
+    return NMS_BACKENDS[name]
+
+
 def restore_box(boxes, r, left, top):
     boxes[:, [0, 2, 5, 7, 9, 11]] -= left
     boxes[:, [1, 3, 6, 8, 10, 12]] -= top
@@ -45,24 +116,26 @@ def restore_box(boxes, r, left, top):
     return boxes
 
 
-def detect_pre_precessing(img, img_size):
-    img, r, left, top = letter_box(img, img_size)
-    img = img[:, :, ::-1].transpose(2, 0, 1).copy().astype(np.float32)
-    img = img / 255
-    img = img.reshape(1, *img.shape)
-    return img, r, left, top
+def detect_pre_precessing(img, img_size, out=None, canvas=None, pixel_format=PIXEL_FORMAT_BGR):
+    # Fused letterbox + color conversion to RGB + HWC->CHW + normalize into the (reusable) input tensor
+    return letterbox_blob(img, img_size, out=out, canvas=canvas, pixel_format=pixel_format)
 
 
-def post_precessing(dets, r, left, top, conf_thresh=0.25, iou_thresh=0.5):
+def post_precessing(dets, r, left, top, conf_thresh=0.25, iou_thresh=0.5, max_candidates=1000, nms_backend=None):
     choice = dets[:, :, 4] > conf_thresh
     dets = dets[choice]
     dets[:, 13:15] *= dets[:, 4:5]
+    score = np.max(dets[:, 13:15], axis=-1, keepdims=True)
+    if max_candidates and len(dets) > max_candidates:
+        # Bound the NMS cost on busy frames by keeping the top-k fused scores only
+        top_k = np.argpartition(-score[:, 0], max_candidates - 1)[:max_candidates]
+        dets = dets[top_k]
+        score = score[top_k]
     box = dets[:, :4]
     boxes = xywh2xyxy(box)
-    score = np.max(dets[:, 13:15], axis=-1, keepdims=True)
     index = np.argmax(dets[:, 13:15], axis=-1).reshape(-1, 1)
     output = np.concatenate((boxes, score, dets[:, 5:13], index), axis=1)
-    reserve_ = nms(output, iou_thresh)
+    reserve_ = get_nms_backend(nms_backend)(output, iou_thresh)
     output = output[reserve_]
     output = restore_box(output, r, left, top)
     return output
@@ -85,100 +158,145 @@ def letter_box(img, size=(640, 640)):
 
 class MultiTaskDetectorMNN(HamburgerABC):
 
-    def __init__(self, mnn_path, box_threshold: float = 0.5, nms_threshold: float = 0.6, *args, **kwargs):
+    def __init__(self, mnn_path, box_threshold: float = 0.25, nms_threshold: float = 0.5,
+                 max_candidates: int = 1000, nms_backend: str = None, num_thread: int = 1,
+                 precision: str = 'normal', *args, **kwargs):
         from hyperlpr3.common.mnn_adapt import MNNAdapter
         super().__init__(*args, **kwargs)
+        self.input_size = tuple(self.input_size)
         assert self.input_size[0] == self.input_size[1]
         self.box_threshold = box_threshold
         self.nms_threshold = nms_threshold
+        self.max_candidates = max_candidates
+        self.nms_backend = nms_backend
         self.input_shape = (1, 3, self.input_size[0], self.input_size[1])
-        if self.input_size[0] == 320:
-            self.tensor_shape = [(1, 6300, 15)]
-        elif self.input_size[0] == 640:
-            self.tensor_shape = [(1, 25200, 15)]
+        # 3 anchors per cell on strides 8, 16 and 32
+        anchors = sum(3 * (self.input_size[0] // stride) ** 2 for stride in (8, 16, 32))
+        self.tensor_shape = [(1, anchors, 15)]
         self.session = MNNAdapter(mnn_path, self.input_shape, outputs_name=['output', ],
-                                  outputs_shape=self.tensor_shape)
+                                  outputs_shape=self.tensor_shape, num_thread=num_thread, precision=precision)
 
     def _run_session(self, data):
         outputs = self.session.inference(data)
-        result = list()
-        for idx, output in enumerate(outputs):
-            result.append(output.reshape(self.tensor_shape[idx]))
-        result = np.asarray(result)
 
-        return result[0]
+        return outputs[0].reshape(self.tensor_shape[0])
 
-    def _postprocess(self, data):
-        r, left, top = self.tmp_pack
+    def _postprocess(self, data, context):
+        r, left, top = context['letterbox']
 
-        return post_precessing(data, r, left, top)
+        return post_precessing(data, r, left, top, conf_thresh=self.box_threshold, iou_thresh=self.nms_threshold,
+                              max_candidates=self.max_candidates, nms_backend=self.nms_backend)
 
-    def _preprocess(self, image):
-        img, r, left, top = detect_pre_precessing(image, self.input_size)
-        self.tmp_pack = r, left, top
+    def _preprocess(self, image, context, pixel_format=PIXEL_FORMAT_BGR):
+        buffer = self.session.input_buffer(self.input_shape)
+        canvas = self.session.input_buffer((self.input_size[0], self.input_size[1], 3), np.uint8)
+        img, r, left, top = detect_pre_precessing(image, self.input_size, out=buffer, canvas=canvas,
+                                                  pixel_format=pixel_format)
+        context['letterbox'] = r, left, top
 
         return img
 
 
 class MultiTaskDetectorDNN(HamburgerABC):
 
-    def __init__(self, onnx_path, box_threshold: float = 0.5, nms_threshold: float = 0.6, *args, **kwargs):
+    def __init__(self, onnx_path, box_threshold: float = 0.25, nms_threshold: float = 0.5,
+                 max_candidates: int = 1000, nms_backend: str = None, backend: str = 'default', target: str = 'cpu',
+                 *args, **kwargs):
+        from hyperlpr3.common.dnn_adapt import DNNAdapter
         super().__init__(*args, **kwargs)
+        self.input_size = tuple(self.input_size)
+        assert self.input_size[0] == self.input_size[1]
         self.box_threshold = box_threshold
         self.nms_threshold = nms_threshold
-        self.session = cv2.dnn.readNetFromONNX(onnx_path)
+        self.max_candidates = max_candidates
+        self.nms_backend = nms_backend
+        self.session = DNNAdapter(onnx_path, backend=backend, target=target)
         self.input_shape = (1, 3, self.input_size[0], self.input_size[1])
-        self.tensor_shape = [(1, 6300, 15)]
 
     def _run_session(self, data):
-        self.session.setInput(data)
-        outputs = self.session.forward()
-
-        return outputs
+        outputs = self.session.inference(data)
 
-    def _postprocess(self, data):
+        return outputs[0]
 
-        r, left, top = self.tmp_pack
+    def _postprocess(self, data, context):
+        r, left, top = context['letterbox']
 
-        return post_precessing(data, r, left, top)
+        return post_precessing(data, r, left, top, conf_thresh=self.box_threshold, iou_thresh=self.nms_threshold,
+                              max_candidates=self.max_candidates, nms_backend=self.nms_backend)
 
-    def _preprocess(self, image):
-        img, r, left, top = detect_pre_precessing(image, self.input_size)
-        self.tmp_pack = r, left, top
+    def _preprocess(self, image, context, pixel_format=PIXEL_FORMAT_BGR):
+        buffer = self.session.input_buffer(self.input_shape)
+        canvas = self.session.input_buffer((self.input_size[0], self.input_size[1], 3), np.uint8)
+        img, r, left, top = detect_pre_precessing(image, self.input_size, out=buffer, canvas=canvas,
+                                                  pixel_format=pixel_format)
+        context['letterbox'] = r, left, top
 
         return img
 
 
 class MultiTaskDetectorORT(HamburgerABC):
 
-    def __init__(self, onnx_path, box_threshold: float = 0.5, nms_threshold: float = 0.6, *args, **kwargs):
+    def __init__(self, onnx_path, box_threshold: float = 0.25, nms_threshold: float = 0.5,
+                 max_candidates: int = 1000, nms_backend: str = None, io_binding: bool = True,
+                 *args, **kwargs):
         super().__init__(*args, **kwargs)
-        import onnxruntime as ort
+        from hyperlpr3.common.ort_adapt import ORTAdapter
         self.box_threshold = box_threshold
         self.nms_threshold = nms_threshold
-        self.session = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
-        self.inputs_option = self.session.get_inputs()
-        self.outputs_option = self.session.get_outputs()
+        self.max_candidates = max_candidates
+        self.nms_backend = nms_backend
+        self.session = ORTAdapter(onnx_path, io_binding=io_binding)
+        metadata = self.session.session.get_modelmeta().custom_metadata_map
+        # Thresholding and NMS appended to the graph by graph_surgery.append_nms: the output is the kept rows only
+        self.graph_nms = 'postprocess' in metadata
+        if self.graph_nms:
+            # The number of kept rows varies per frame, so the output cannot be bound to a preallocated buffer
+            self.session.io_binding = False
+            baked = json.loads(metadata['postprocess'])
+            if (baked['conf_thresh'], baked['iou_thresh']) != (box_threshold, nms_threshold):
+                logger.warning(f"{onnx_path} applies conf_thresh={baked['conf_thresh']} and "
+                               f"iou_thresh={baked['iou_thresh']} in the graph, box_threshold={box_threshold} and "
+                               f"nms_threshold={nms_threshold} are ignored.")
+        self.inputs_option = self.session.inputs_option
+        self.outputs_option = self.session.outputs_option
         input_option = self.inputs_option[0]
-        input_size_ = tuple(input_option.shape[2:])
+        # uint8 NHWC BGR input: normalization baked into the graph by graph_surgery.bake_preprocess
+        self.uint8_input = input_option.type == 'tensor(uint8)'
+        input_size_ = tuple(input_option.shape[1:3] if self.uint8_input else input_option.shape[2:])
         self.input_size = tuple(self.input_size)
         if not self.input_size:
             self.input_size = input_size_
         assert self.input_size == input_size_, 'The dimensions of the input do not match the model expectations.'
         assert self.input_size[0] == self.input_size[1]
         self.input_name = input_option.name
+        if self.uint8_input:
+            self.input_shape = (1, self.input_size[0], self.input_size[1], 3)
+        else:
+            self.input_shape = (1, 3, self.input_size[0], self.input_size[1])
 
     def _run_session(self, data):
-        result = self.session.run([self.outputs_option[0].name], {self.input_name: data})[0]
+        result = self.session.inference(data)[0]
 
         return result
 
-    def _postprocess(self, data):
-        r, left, top = self.tmp_pack
-        return post_precessing(data, r, left, top)
-
-    def _preprocess(self, image):
-        img, r, left, top = detect_pre_precessing(image, self.input_size)
-        self.tmp_pack = r, left, top
+    def _postprocess(self, data, context):
+        r, left, top = context['letterbox']
+        if self.graph_nms:
+            return restore_box(data, r, left, top)
+        return post_precessing(data, r, left, top, conf_thresh=self.box_threshold, iou_thresh=self.nms_threshold,
+                              max_candidates=self.max_candidates, nms_backend=self.nms_backend)
+
+    def _preprocess(self, image, context, pixel_format=PIXEL_FORMAT_BGR):
+        if self.uint8_input:
+            buffer = self.session.input_buffer(self.input_shape, np.uint8)
+            _, r, left, top = letterbox_image(image, self.input_size, canvas=buffer[0], pixel_format=pixel_format)
+            context['letterbox'] = r, left, top
+
+            return buffer
+        buffer = self.session.input_buffer(self.input_shape)
+        canvas = self.session.input_buffer((self.input_size[0], self.input_size[1], 3), np.uint8)
+        img, r, left, top = detect_pre_precessing(image, self.input_size, out=buffer, canvas=canvas,
+                                                  pixel_format=pixel_format)
+        context['letterbox'] = r, left, top
 
         return img
@@ -1,5 +1,7 @@
+import time
 import numpy as np
 
+from hyperlpr3.common import trace, memory
 from hyperlpr3.common.typedef import *
 from hyperlpr3.common.tools_process import *
 
@@ -17,9 +19,11 @@ class LPRMultiTaskPipeline(object):
         recognizer: Text recognition model for extracting plate codes.
         classifier: Plate type classifier (e.g., blue, yellow, green).
         full_result (bool): Whether to include full vertex information in results.
+        memory_budget (int): Maximum size in bytes of the frame the pipeline
+            works on, None for no limit.
     """
 
-    def __init__(self, detector, recognizer, classifier, full_result=False):
+    def __init__(self, detector, recognizer, classifier, full_result=False, fused_crop=False, memory_budget=None):
         """Initializes the LPR multi-task pipeline.
 
         Args:
@@ -28,13 +32,31 @@ class LPRMultiTaskPipeline(object):
             classifier: License plate type classifier instance.
             full_result (bool, optional): If True, results include vertex points.
                 Defaults to False.
+            fused_crop (bool, optional): If True and the recognizer supports it,
+                plates are warped once from the image straight into the
+                recognizer (and classifier) input geometry instead of being
+                cropped at natural size and resized again. The single linear
+                warp is faster but not bit-identical to the cubic
+                crop-then-resize, so results can differ slightly. Defaults to
+                False.
+            memory_budget (int, optional): If set, frames whose packed BGR size
+                exceeds this many bytes are downsampled to fit before
+                detection and plates are cropped from the downsampled frame,
+                which bounds the frame sized buffers of every stage. Results
+                are still in the input frame's coordinates. Defaults to None.
         """
         self.detector = detector
         self.recognizer = recognizer
         self.classifier = classifier
         self.full_result = full_result
+        self.fused_crop = fused_crop and hasattr(recognizer, 'recognize_regions')
+        self.memory_budget = memory_budget
+        # Estimates of the crop time per output pixel, of the recognizer time per region and of the classifier
+        # time, in seconds, used to decide what still fits before a deadline (see _update_cost)
+        self._costs = dict(crop=0.0, recognize=0.0, classify=0.0)
 
-    def run(self, image: np.ndarray) -> list:
+    def run(self, image: np.ndarray, full_image=None, scale: float = None,
+            pixel_format: int = PIXEL_FORMAT_BGR, coordinate_scale: float = 1.0, deadline_ms: float = None) -> list:
         """Runs the complete license plate recognition pipeline on an input image.
 
         This method performs detection, recognition, and classification in sequence.
@@ -43,6 +65,31 @@ class LPRMultiTaskPipeline(object):
 
         Args:
             image (np.ndarray): Input image in BGR format with shape (H, W, 3).
+            full_image (optional): Higher resolution version of `image` the
+                plates are cropped from, either an np.ndarray or a callable
+                returning it. A callable is only invoked when plates were
+                detected. If None, plates are cropped from `image`.
+            scale (float, optional): Factor from `image` to `full_image`
+                coordinates. Defaults to the ratio of the image widths.
+            pixel_format (int, optional): Pixel format of the image(s), one of
+                the PIXEL_FORMAT_* constants. Conversion happens at detector
+                and crop resolution only, the frame is never converted as a
+                whole when fused_crop is enabled. Defaults to
+                PIXEL_FORMAT_BGR.
+            coordinate_scale (float, optional): Factor applied to the returned
+                boxes and vertices, for frames downsampled by the caller.
+                Defaults to 1.0.
+            deadline_ms (float, optional): Time budget of the call. Detection
+                always runs, then plates are cropped and recognized in
+                descending detection score order, batched as long as their
+                expected time still fits. Crops are charged by their size,
+                and the estimates are kept by every run, close to the slowest
+                recent timings. Plates that do not fit on their own are
+                skipped, and plates go one at a time while no estimate is
+                known yet. The classifier
+                is skipped when its expected time does not fit, leaving the
+                type told by the code (or UNKNOWN). Defaults to None (no
+                deadline).
 
         Returns:
             list: List of license plate results. Each result is either:
@@ -50,42 +97,235 @@ class LPRMultiTaskPipeline(object):
                     det_bound_box, layer_num]
                 - Full format (if full_result=True): [plate_code, rec_confidence,
                     plate_type, det_bound_box, vertex, layer_num]
+                With a deadline, a DeadlineResult reporting the skipped plates.
 
         Raises:
-            AssertionError: If image is None or not a 3-channel image.
+            AssertionError: If image is None or its shape does not match the pixel format.
         """
-        result = list()
-        assert len(image.shape) == 3, "Input image must be 3 channels."
+        start = time.perf_counter()
+        lazy = deadline_ms is not None
+        image, pixel_format, plates, crops = self._locate(image, full_image, scale, pixel_format, coordinate_scale,
+                                                          lazy=lazy)
+        if lazy:
+            return self._run_until(start, start + deadline_ms / 1000, image, pixel_format, plates)
+        with trace.span('recognize', regions=len(crops)):
+            texts = self._recognize_regions(image, pixel_format, crops)
+
+        return self._assemble(image, pixel_format, plates, texts)
+
+    def _recognize_regions(self, image: np.ndarray, pixel_format: int, crops: list) -> list:
+        # Also keeps the per region recognizer cost estimate used by deadline runs up to date
+        t0 = time.perf_counter()
+        if self.fused_crop:
+            texts = self.recognizer.recognize_regions(image, crops, pixel_format=pixel_format)
+        else:
+            texts = self.recognize(crops)
+        if crops:
+            self._update_cost('recognize', (time.perf_counter() - t0) / len(crops))
+
+        return texts
+
+    def _update_cost(self, key: str, seconds: float):
+        # Follows slower samples at once and faster ones slowly, so the estimates stay near the worst case and
+        # deadlines are kept rather than met on average
+        cost = self._costs[key]
+        self._costs[key] = seconds if seconds > cost else 0.98 * cost + 0.02 * seconds
+
+    def _run_until(self, start: float, deadline: float, image: np.ndarray, pixel_format: int,
+                   plates: list) -> DeadlineResult:
+        # Plates located lazily (see _locate): cropped only once they are known to fit, best detections first
+        pending = sorted(plates, key=lambda plate: -plate[1])
+        skipped = list()
+        result = DeadlineResult()
+        while pending and time.perf_counter() < deadline:
+            # Takes the next plates the estimates say still fit and recognizes them in one call (one bucketed
+            # batch). Plates that do not fit on their own are skipped, smaller ones after them may still fit.
+            # Without estimate yet, one plate at a time while time is left
+            left = deadline - time.perf_counter()
+            known = self._costs['recognize'] > 0
+            group, rest, expected = list(), list(), 0.0
+            for plate in pending:
+                cost = self._plate_cost(plate[4], plate[3])
+                if known and cost > left:
+                    skipped.append(plate)
+                elif group and (not known or expected + cost > left):
+                    rest.append(plate)
+                else:
+                    group.append(plate)
+                    expected += cost
+            pending = rest
+            if not group:
+                break
+            regions = list()
+            for number, (rect, score, vertex, layer_num, land_marks) in enumerate(group):
+                pad, parts = self._regions(image, land_marks, layer_num)
+                group[number] = (rect, score, vertex, layer_num, pad)
+                regions.extend(parts)
+            with trace.span('recognize', regions=len(regions)):
+                texts = iter(self._recognize_regions(image, pixel_format, regions))
+            for plate in group:
+                classify = time.perf_counter() + self._costs['classify'] <= deadline
+                plate_texts = [next(texts) for _ in range(2 if plate[3] == DOUBLE else 1)]
+                for item in self._assemble(image, pixel_format, [plate], plate_texts, classify=classify):
+                    if not classify and item[2] == UNKNOWN:
+                        result.unclassified.append(len(result))
+                    result.append(item)
+        for rect, score, vertex, layer_num, _ in sorted(skipped + pending, key=lambda plate: -plate[1]):
+            result.skipped.append(dict(det_bound_box=np.asarray(rect).tolist(), det_confidence=float(score),
+                                       vertex=np.asarray(vertex).tolist(), layer_num=layer_num))
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+
+        return result
+
+    def _plate_cost(self, land_marks: np.ndarray, layer_num: int) -> float:
+        # Expected crop and recognition time of a plate: the crop scales with its output size, which the
+        # landmarks give without warping anything
+        regions = 2 if layer_num == DOUBLE else 1
+
+        return self._costs['crop'] * crop_pixels(land_marks) + self._costs['recognize'] * regions
+
+    def run_batch(self, frames: list) -> list:
+        """Runs the pipeline on several frames, recognizing the plates of all of them together.
+
+        Detection runs frame by frame. The plate regions of all frames are
+        then recognized in one bucketed recognizer call, which makes larger
+        session batches when the recognizer has a dynamic batch axis.
+
+        Args:
+            frames (list): One dict of `run` keyword arguments per frame, at
+                least 'image'.
+
+        Returns:
+            list: One result list (see `run`) per frame, in order.
+        """
+        located = [self._locate(**frame) for frame in frames]
+        crops = [crop for _, _, _, regions in located for crop in regions]
+        with trace.span('recognize', regions=len(crops), frames=len(located)):
+            if not self.fused_crop:
+                texts = self.recognize(crops)
+            elif not getattr(self.recognizer, 'static_batch', True) and len({fmt for _, fmt, _, _ in located}) == 1:
+                sources = [image for image, _, _, regions in located for _ in regions]
+                texts = self.recognizer.recognize_regions(sources, crops, pixel_format=located[0][1])
+            else:
+                texts = [text for image, fmt, _, regions in located
+                         for text in self.recognizer.recognize_regions(image, regions, pixel_format=fmt)]
+        texts = iter(texts)
+
+        return [self._assemble(image, fmt, plates, [next(texts) for _ in regions])
+                for image, fmt, plates, regions in located]
+
+    def _locate(self, image: np.ndarray, full_image=None, scale: float = None, pixel_format: int = PIXEL_FORMAT_BGR,
+                coordinate_scale: float = 1.0, lazy: bool = False) -> tuple:
+        # Detects the plates and computes their recognizer regions: (image, pixel_format, plates, crops). When lazy,
+        # no region is computed, plates carry their landmarks instead of the classifier input (see _regions)
         assert image is not None, "Input image cannot be empty."
-        outputs = self.detector(image)
+        if pixel_format in (PIXEL_FORMAT_BGR, PIXEL_FORMAT_RGB):
+            assert len(image.shape) == 3, "Input image must be 3 channels."
+        else:
+            assert len(image.shape) == 2, "YUV 4:2:0 input must be a single (H * 3 / 2, W) buffer."
+        if self.memory_budget is not None and full_image is None:
+            with trace.span('downsample') as span:
+                image, pixel_format, factor = fit_memory_budget(image, pixel_format, self.memory_budget)
+                span.set('factor', factor)
+            coordinate_scale *= factor
+        with trace.span('detect') as span:
+            if pixel_format == PIXEL_FORMAT_BGR:
+                outputs = self.detector(image)
+            else:
+                outputs = self.detector(image, pixel_format=pixel_format)
+            span.set('plates', len(outputs))
+        if full_image is not None and len(outputs) > 0:
+            # Detected on a reduced frame, map the detections onto the full resolution one
+            if callable(full_image):
+                with trace.span('decode.full'):
+                    full_image = full_image()
+            if scale is None:
+                scale = image_size(full_image, pixel_format)[1] / image_size(image, pixel_format)[1]
+            if self.memory_budget is not None:
+                with trace.span('downsample') as span:
+                    full_image, pixel_format, factor = fit_memory_budget(full_image, pixel_format, self.memory_budget)
+                    span.set('factor', factor)
+                scale /= factor
+                coordinate_scale *= factor
+            outputs = outputs.copy()
+            outputs[:, :4] *= scale
+            outputs[:, 5:13] *= scale
+            image = full_image
+        if not self.fused_crop and len(outputs) > 0:
+            image = convert_to_bgr(image, pixel_format)
+            pixel_format = PIXEL_FORMAT_BGR
+        plates = list()
+        crops = list()
         for out in outputs:
             rect = out[:4].astype(int)
             score = out[4]
             land_marks = out[5:13].reshape(4, 2).astype(int)
             layer_num = int(out[13])
             # print(layer_num)
-            pad = get_rotate_crop_image(image, land_marks)
+            if lazy:
+                pad = land_marks
+            else:
+                pad, parts = self._regions(image, land_marks, layer_num)
+                crops.extend(parts)
+            vertex = land_marks
+            if coordinate_scale != 1.0:
+                # Cropped from a downsampled frame, report in the input frame's coordinates
+                rect = (out[:4] * coordinate_scale).astype(int)
+                vertex = (out[5:13] * coordinate_scale).reshape(4, 2).astype(int)
+            plates.append((rect, score, vertex, layer_num, pad))
+
+        return image, pixel_format, plates, crops
+
+    def _regions(self, image: np.ndarray, land_marks: np.ndarray, layer_num: int) -> tuple:
+        # Recognizer regions of a plate and the classifier input: (pad, parts). Also keeps the crop cost estimate,
+        # per output pixel
+        t0 = time.perf_counter()
+        if self.fused_crop:
+            # Only the transform is computed here, pixels are warped straight into the model inputs
+            pad = get_rectify_transform(land_marks)
+            matrix, w, h = pad
+            parts = [(matrix, (0, 0, w, h))]
+            if layer_num == DOUBLE:
+                line = int(h * 0.4)
+                parts = [(matrix, (0, 0, w, line)), (matrix, (0, line, w, h - line))]
+        else:
+            with trace.span('crop'):
+                pad = get_rotate_crop_image(image, land_marks)
+            parts = [pad]
             if layer_num == DOUBLE:
-                # double
                 h, w, _ = pad.shape
                 line = int(h * 0.4)
-                top = pad[:line, :, ]
-                bottom = pad[line:, :]
-                top_code, top_confidence = self.recognizer(top)
-                bottom_code, bottom_confidence = self.recognizer(bottom)
+                parts = [pad[:line, :, ], pad[line:, :]]
+        # double: recognize the top and bottom parts separately
+        self._update_cost('crop', (time.perf_counter() - t0) / crop_pixels(land_marks))
+
+        return pad, parts
+
+    def _assemble(self, image: np.ndarray, pixel_format: int, plates: list, texts: list, classify: bool = True) -> list:
+        # Joins the recognized texts of the located plates, classifies them and builds the results
+        result = list()
+        texts = iter(texts)
+        for rect, score, vertex, layer_num, pad in plates:
+            if layer_num == DOUBLE:
+                top_code, top_confidence = next(texts)
+                bottom_code, bottom_confidence = next(texts)
                 plate_code = top_code + bottom_code
                 rec_confidence = (top_confidence + bottom_confidence) / 2
-                # cv2.imshow("top", top)
-                # cv2.imshow("bottom", bottom)
-                # cv2.waitKey(0)
             else:
-                plate_code, rec_confidence = self.recognizer(pad)
+                plate_code, rec_confidence = next(texts)
             if plate_code == '':
                 continue
             if len(plate_code) >= 7:
                 plate_type = code_filter(plate_code)
-                if plate_type == UNKNOWN:
-                    cls = self.classifier(pad)
+                if plate_type == UNKNOWN and classify:
+                    t0 = time.perf_counter()
+                    with trace.span('classify'):
+                        if self.fused_crop:
+                            matrix, w, h = pad
+                            pad = warp_region(image, matrix, (0, 0, w, h), tuple(self.classifier.input_size)[::-1],
+                                              pixel_format=pixel_format)
+                        cls = self.classifier(pad)
+                    self._update_cost('classify', time.perf_counter() - t0)
                     idx = int(np.argmax(cls))
                     if idx == PLATE_TYPE_YELLOW:
                         if layer_num == DOUBLE:
@@ -96,7 +336,7 @@ class LPRMultiTaskPipeline(object):
                         plate_type = BLUE
                     elif idx == PLATE_TYPE_GREEN:
                         plate_type = GREEN
-                plate = Plate(vertex=land_marks, plate_code=plate_code, det_bound_box=np.asarray(rect),
+                plate = Plate(vertex=vertex, plate_code=plate_code, det_bound_box=np.asarray(rect),
                               rec_confidence=rec_confidence, dex_bound_confidence=score, plate_type=plate_type,
                               layer_num=layer_num)
                 if self.full_result:
@@ -106,18 +346,58 @@ class LPRMultiTaskPipeline(object):
 
         return result
 
-    def __call__(self, image: np.ndarray, *args, **kwargs):
+    def stats(self) -> dict:
+        """Collects the runtime counters of the pipeline components.
+
+        Returns:
+            dict: Per component ('detector', 'recognizer', 'classifier') the
+                session counters when available, plus the recognizer's
+                per-bucket batching report under 'recognizer_buckets' and,
+                while memory accounting is enabled (see common.memory), the
+                per-stage memory report under 'memory'.
+        """
+        report = dict()
+        for name in ('detector', 'recognizer', 'classifier'):
+            session_stats = getattr(getattr(self, name).session, 'stats', None)
+            if session_stats is not None:
+                report[name] = dict(session_stats)
+        if hasattr(self.recognizer, 'bucket_report'):
+            report['recognizer_buckets'] = self.recognizer.bucket_report()
+        memory_report = memory.accounting_report()
+        if memory_report is not None:
+            report['memory'] = memory_report
+
+        return report
+
+    def recognize(self, crops: list) -> list:
+        """Recognizes plate crops, batched per width bucket when the recognizer supports it.
+
+        Args:
+            crops (list): Plate crops (H, W, 3) in BGR format.
+
+        Returns:
+            list: One (plate_code, rec_confidence) tuple per crop.
+        """
+        if hasattr(self.recognizer, 'recognize_batch'):
+            return self.recognizer.recognize_batch(crops)
+        return [self.recognizer(crop) for crop in crops]
+
+    def __call__(self, image: np.ndarray, pixel_format: int = PIXEL_FORMAT_BGR, *args, deadline_ms: float = None,
+                 **kwargs):
         """Makes the pipeline callable as a function.
 
         Args:
-            image (np.ndarray): Input image in BGR format with shape (H, W, 3).
+            image (np.ndarray): Input image, (H, W, 3) BGR by default.
+            pixel_format (int, optional): Pixel format of image, see `run`.
+                Defaults to PIXEL_FORMAT_BGR.
             *args: Variable length argument list (unused).
+            deadline_ms (float, optional): Time budget, see `run`. Defaults to None.
             **kwargs: Arbitrary keyword arguments (unused).
 
         Returns:
             list: License plate recognition results from the run method.
         """
-        return self.run(image)
+        return self.run(image, pixel_format=pixel_format, deadline_ms=deadline_ms)
 
 
 class LPRPipeline(object):
@@ -145,7 +425,6 @@ class LPRPipeline(object):
         self.vertex_predictor = vertex_predictor
         self.recognizer = recognizer
 
-    # @cost("PipelineTotalCost")
     def run(self, image: np.ndarray) -> list:
         """Runs the legacy license plate recognition pipeline.
 
@@ -1,233 +1,465 @@
 import cv2
 import numpy as np
 from .base.base import HamburgerABC
-from hyperlpr3.common.tools_process import cost
+from hyperlpr3.common.tools_process import warp_region
+from hyperlpr3.common.typedef import PIXEL_FORMAT_BGR
 import math
+import json
+import time
+import threading
 from hyperlpr3.common.tokenize import token
 
 
-def encode_images(image: np.ndarray, max_wh_ratio, target_shape, limited_max_width=160, limited_min_width=48):
-    imgC = 3
+# Padding of uint8 recognizer inputs. Float inputs are padded with 0, i.e. 127.5 before normalization,
+# which uint8 cannot represent, so baked models see 128 (0.004 after normalization) instead
+UINT8_PAD_VALUE = 128
+
+
+def get_tensor_width(max_wh_ratio, target_shape, limited_max_width=160, limited_min_width=48):
     imgH, imgW = target_shape
-    # cv2.imshow("image", image)
-    # cv2.waitKey(0)
-    assert imgC == image.shape[2]
     max_wh_ratio = max(max_wh_ratio, imgW / imgH)
     imgW = int((imgH * max_wh_ratio))
     imgW = max(min(imgW, limited_max_width), limited_min_width)
-    h, w = image.shape[:2]
-    ratio = w / float(h)
-    ratio_imgH = math.ceil(imgH * ratio)
+
+    return imgW
+
+
+def get_resized_width(wh_ratio, imgH, imgW, limited_min_width=48):
+    ratio_imgH = math.ceil(imgH * wh_ratio)
     ratio_imgH = max(ratio_imgH, limited_min_width)
     if ratio_imgH > imgW:
         resized_w = imgW
     else:
         resized_w = int(ratio_imgH)
+
+    return resized_w
+
+
+def encode_images(image: np.ndarray, max_wh_ratio, target_shape, limited_max_width=160, limited_min_width=48,
+                  out=None):
+    imgC = 3
+    imgH = target_shape[0]
+    # cv2.imshow("image", image)
+    # cv2.waitKey(0)
+    assert imgC == image.shape[2]
+    imgW = get_tensor_width(max_wh_ratio, target_shape, limited_max_width, limited_min_width)
+    h, w = image.shape[:2]
+    resized_w = get_resized_width(w / float(h), imgH, imgW, limited_min_width)
+    if out is not None and out.dtype == np.uint8:
+        # (H, W, 3) row of a model with the normalization baked in, see graph_surgery.bake_preprocess
+        assert out.shape == (imgH, imgW, imgC)
+        cv2.resize(image, (resized_w, imgH), dst=out[:, 0:resized_w])
+        out[:, resized_w:] = UINT8_PAD_VALUE
+
+        return out
     resized_image = cv2.resize(image, (resized_w, imgH))
-    # print((resized_w, imgH))
-    # padding_im1 = np.ones((imgH, imgW, imgC), dtype=np.uint8) * 128
-    # padding_im1[:, 0:resized_w, :] = resized_image
-    # cv2.imwrite("pad.jpg", padding_im1)
+    if out is None:
+        out = np.zeros((imgC, imgH, imgW), dtype=np.float32)
+    else:
+        assert out.shape == (imgC, imgH, imgW)
+        out[:, :, resized_w:] = 0
+    # Cast, HWC->CHW and normalize straight into the padded tensor
+    valid = out[:, :, 0:resized_w]
+    np.subtract(resized_image.transpose((2, 0, 1)), 127.5, out=valid, dtype=np.float32, casting='unsafe')
+    valid /= 127.5
+
+    # np.save('fk.npy', out)
+
+    return out
+
 
-    resized_image = resized_image.astype('float32')
-    resized_image = (resized_image.transpose((2, 0, 1)) - 127.5) / 127.5
-    # resized_image -= 0.5
-    # resized_image *= 2
-    padding_im = np.zeros((imgC, imgH, imgW), dtype=np.float32)
-    padding_im[:, :, 0:resized_w] = resized_image
+def encode_region(image: np.ndarray, matrix, rect, resized_w, out, interpolation=cv2.INTER_LINEAR,
+                  pixel_format=PIXEL_FORMAT_BGR):
+    # Warps a plate region to the recognizer height and normalizes it into a padded (3, H, W) row,
+    # or into a (H, W, 3) uint8 row for models with the normalization baked in
+    if out.dtype == np.uint8:
+        warp_region(image, matrix, rect, (resized_w, out.shape[0]), dst=out[:, 0:resized_w],
+                    interpolation=interpolation, pixel_format=pixel_format)
+        out[:, resized_w:] = UINT8_PAD_VALUE
 
-    # np.save('fk.npy', padding_im)
+        return out
+    height = out.shape[1]
+    patch = warp_region(image, matrix, rect, (resized_w, height), interpolation=interpolation,
+                        pixel_format=pixel_format)
+    out[:, :, resized_w:] = 0
+    valid = out[:, :, 0:resized_w]
+    np.subtract(patch.transpose((2, 0, 1)), 127.5, out=valid, dtype=np.float32, casting='unsafe')
+    valid /= 127.5
 
-    return padding_im
+    return out
+
+
+# Tensor widths crops are padded to when recognized in batches, see PPRCNNRecognitionORT.recognize_batch
+DEFAULT_WIDTH_BUCKETS = (64, 96, 128, 160)
 
 
 def get_ignored_tokens():
     return [0]  # for ctc blank
 
 
+def charset_indices(character_list, charset, ignored_tokens=None) -> np.ndarray:
+    """Computes the output columns that correspond to a restricted character set.
+
+    Args:
+        character_list: Token list of the recognizer output.
+        charset: Iterable of characters to keep. Characters missing from
+            character_list are ignored.
+        ignored_tokens (list, optional): Token indices that are always kept
+            (the CTC blank). Defaults to `get_ignored_tokens()`.
+
+    Returns:
+        np.ndarray: Sorted column indices, suitable for `ctc_greedy_decode`'s
+            class_subset argument.
+    """
+    if ignored_tokens is None:
+        ignored_tokens = get_ignored_tokens()
+    charset = set(charset)
+    indices = set(ignored_tokens)
+    indices.update(idx for idx, char in enumerate(character_list) if char in charset)
+
+    return np.asarray(sorted(indices), dtype=np.int64)
+
+
+def ctc_greedy_decode(prob: np.ndarray, character_list, ignored_tokens=None, is_remove_duplicate=True,
+                      class_subset=None) -> list:
+    """Greedy CTC decoding of a whole batch of recognizer outputs.
+
+    Duplicate collapsing and blank removal are done with array operations over
+    the (N, T) argmax indices; only the final string join is per sample.
+
+    Args:
+        prob (np.ndarray): Recognizer output of shape (N, T, C).
+        character_list: Token list, or an object ndarray of it to avoid the
+            conversion on every call.
+        ignored_tokens (list, optional): Token indices to drop. Defaults to
+            `get_ignored_tokens()` (the CTC blank).
+        is_remove_duplicate (bool, optional): Collapse repeated tokens.
+            Defaults to True.
+        class_subset (np.ndarray, optional): Output columns to consider, see
+            `charset_indices`. The argmax then only runs over these columns.
+            Defaults to None (all columns).
+
+    Returns:
+        list: One (text, confidence) tuple per sample. The confidence is the
+            mean probability of the kept tokens, NaN if nothing was kept.
+    """
+    prob = np.asarray(prob)
+    if len(prob) == 0:
+        return []
+    if ignored_tokens is None:
+        ignored_tokens = get_ignored_tokens()
+    if not isinstance(character_list, np.ndarray):
+        character_list = np.asarray(character_list, dtype=object)
+    if class_subset is not None and len(class_subset) < prob.shape[2]:
+        prob = np.take(prob, class_subset, axis=2)
+    else:
+        class_subset = None
+    text_index = np.argmax(prob, axis=2)
+    text_prob = np.take_along_axis(prob, text_index[:, :, None], axis=2)[:, :, 0]
+    if class_subset is not None:
+        text_index = class_subset[text_index]
+    keep = np.ones(text_index.shape, dtype=bool)
+    for ignored in ignored_tokens:
+        keep &= text_index != ignored
+    if is_remove_duplicate:
+        keep[:, 1:] &= text_index[:, 1:] != text_index[:, :-1]
+    counts = keep.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        confidences = np.where(keep, text_prob, 0).sum(axis=1, dtype=text_prob.dtype) / counts.astype(text_prob.dtype)
+    chars = character_list[text_index[keep]]
+    texts = [''.join(part) for part in np.split(chars, np.cumsum(counts)[:-1])]
+
+    return list(zip(texts, confidences))
+
+
 class PPRCNNRecognitionMNN(HamburgerABC):
 
-    def __init__(self, mnn_path, character_file, *args, **kwargs):
+    def __init__(self, mnn_path, token_dict=token, charset=None, num_thread: int = 1, precision: str = 'normal',
+                 *args, **kwargs):
         from hyperlpr3.common.mnn_adapt import MNNAdapter
         super().__init__(*args, **kwargs)
+        self.input_size = tuple(self.input_size)
         self.input_shape = (1, 3, self.input_size[0], self.input_size[1])
-        self.session = MNNAdapter(mnn_path, input_shape=self.input_shape, outputs_name=['output'])
-        self.character_list = token
-
-    def decode(self, text_index, text_prob=None, is_remove_duplicate=False):
-        """ convert text-index into text-label. """
-        result_list = []
-        ignored_tokens = get_ignored_tokens()
-        batch_size = len(text_index)
-        for batch_idx in range(batch_size):
-            char_list = []
-            conf_list = []
-            for idx in range(len(text_index[batch_idx])):
-                if text_index[batch_idx][idx] in ignored_tokens:
-                    continue
-                if is_remove_duplicate:
-                    # only for predict
-                    if idx > 0 and text_index[batch_idx][idx - 1] == text_index[batch_idx][idx]:
-                        continue
-                char_list.append(self.character_list[int(text_index[batch_idx][idx])])
-                if text_prob is not None:
-                    conf_list.append(text_prob[batch_idx][idx])
-                else:
-                    conf_list.append(1)
-            text = ''.join(char_list)
-            result_list.append((text, np.mean(conf_list)))
-        return result_list
+        self.session = MNNAdapter(mnn_path, input_shape=self.input_shape, num_thread=num_thread,
+                                  precision=precision)
+        self.character_list = np.asarray(token_dict, dtype=object)
+        self.class_subset = charset_indices(self.character_list, charset) if charset else None
 
     def _run_session(self, data):
         output = self.session.inference(data)
-        output = output.reshape(40, 6625)
-        # print(output[:, 0])
-        output = np.expand_dims([output], 0)
+
         return output
 
-    def _postprocess(self, data):
-        prod = data[0]
-        argmax = np.argmax(prod, axis=2)
-        # print(argmax)
-        rmax = np.max(prod, axis=2)
-        # print(rmax)
-        result = self.decode(argmax, rmax, is_remove_duplicate=True)
+    def _postprocess(self, data, context):
+        result = ctc_greedy_decode(data[0], self.character_list, class_subset=self.class_subset)
 
         return result[0]
 
-    def _preprocess(self, image):
+    def _preprocess(self, image, context):
         assert len(
             image.shape) == 3, "The dimensions of the input image object do not match. The input supports a single " \
                                "image. "
         h, w, _ = image.shape
         wh_ratio = w * 1.0 / h
-        data = encode_images(image, wh_ratio, self.input_size, )
-        data = np.expand_dims(data, 0)
+        # The session input has a fixed width, encode_images pads every crop to it
+        data = self.session.input_buffer(self.input_shape)
+        encode_images(image, wh_ratio, self.input_size, limited_max_width=self.input_size[1], out=data[0])
 
         return data
 
+    def recognize_regions(self, image: np.ndarray, regions: list, interpolation=cv2.INTER_LINEAR,
+                          pixel_format: int = PIXEL_FORMAT_BGR) -> list:
+        """Recognizes plate regions warped straight from the source image into the session input.
+
+        The MNN session has a fixed input shape, so regions are run one by one;
+        see `PPRCNNRecognitionORT.recognize_regions` for the arguments.
+
+        Returns:
+            list: One (text, confidence) tuple per region, in input order.
+        """
+        height, width = self.input_size
+        results = list()
+        for matrix, rect in regions:
+            resized_w = get_resized_width(rect[2] / float(rect[3]), height, width)
+            data = self.session.input_buffer()
+            encode_region(image, matrix, rect, resized_w, data[0], interpolation=interpolation,
+                          pixel_format=pixel_format)
+            outputs = self._run_session(data)
+            results.append(ctc_greedy_decode(outputs[0], self.character_list, class_subset=self.class_subset)[0])
+
+        return results
+
 
 class PPRCNNRecognitionORT(HamburgerABC):
 
-    def __init__(self, onnx_path, token_dict=token, *args, **kwargs):
-        import onnxruntime as ort
+    def __init__(self, onnx_path, token_dict=token, io_binding: bool = True, charset=None,
+                 width_buckets=DEFAULT_WIDTH_BUCKETS, max_batch: int = 16, *args, **kwargs):
+        from hyperlpr3.common.ort_adapt import ORTAdapter
         super().__init__(*args, **kwargs)
-        self.session = ort.InferenceSession(onnx_path, None)
-        self.input_config = self.session.get_inputs()[0]
-        self.output_config = self.session.get_outputs()[0]
-        self.input_size = self.input_config.shape[2:]
+        self.session = ORTAdapter(onnx_path, io_binding=io_binding)
+        self.input_config = self.session.inputs_option[0]
+        self.output_config = self.session.outputs_option[0]
+        # uint8 NHWC BGR input: normalization baked into the graph by graph_surgery.bake_preprocess
+        self.uint8_input = self.input_config.type == 'tensor(uint8)'
+        if self.uint8_input:
+            batch, height, width, _ = self.input_config.shape
+        else:
+            batch, _, height, width = self.input_config.shape
+        if isinstance(width, int):
+            # Static width: every bucket collapses to the width the model was exported with
+            width_buckets = (width,)
+        self.width_buckets = tuple(sorted(width_buckets))
+        self.input_size = (height if isinstance(height, int) else 48, width if isinstance(width, int) else
+                           self.width_buckets[-1])
+        # A batch axis exported with a fixed size cannot be changed with max_batch
+        self.static_batch = isinstance(batch, int)
+        self.max_batch = batch if self.static_batch else max_batch
+        self.bucket_stats = {bucket: dict(calls=0, crops=0, used_columns=0, padded_columns=0, seconds=0.0)
+                             for bucket in self.width_buckets}
+        self._stats_lock = threading.Lock()
         # print(self.input_size)
-        self.character_list = token_dict
+        self.character_list = np.asarray(token_dict, dtype=object)
+        metadata = self.session.session.get_modelmeta().custom_metadata_map
+        if 'class_indices' in metadata:
+            # Output pruned by graph_surgery.prune_output_classes: column k is token_dict[class_indices[k]]
+            self.character_list = self.character_list[json.loads(metadata['class_indices'])]
+        self.class_subset = charset_indices(self.character_list, charset) if charset else None
 
-    def decode(self, text_index, text_prob=None, is_remove_duplicate=False):
-        """ convert text-index into text-label. """
-        result_list = []
-        ignored_tokens = get_ignored_tokens()
-        batch_size = len(text_index)
-        for batch_idx in range(batch_size):
-            char_list = []
-            conf_list = []
-            for idx in range(len(text_index[batch_idx])):
-                if text_index[batch_idx][idx] in ignored_tokens:
-                    continue
-                if is_remove_duplicate:
-                    # only for predict
-                    if idx > 0 and text_index[batch_idx][idx - 1] == text_index[batch_idx][idx]:
-                        continue
-                # print(int(text_index[batch_idx][idx]))
-                char_list.append(self.character_list[int(text_index[batch_idx][idx])])
-                if text_prob is not None:
-                    conf_list.append(text_prob[batch_idx][idx])
-                else:
-                    conf_list.append(1)
-            text = ''.join(char_list)
-            result_list.append((text, np.mean(conf_list)))
-        return result_list
-
-    # @cost("Recognition")
     def _run_session(self, data) -> np.ndarray:
-        result = self.session.run([self.output_config.name], {self.input_config.name: data})
+        result = self.session.inference(data)
 
         return result
 
-    def _postprocess(self, data) -> tuple:
+    def _postprocess(self, data, context) -> tuple:
         if data:
-            prod = data[0]
-            argmax = np.argmax(prod, axis=2)
-            rmax = np.max(prod, axis=2)
-            result = self.decode(argmax, rmax, is_remove_duplicate=True)
+            result = ctc_greedy_decode(data[0], self.character_list, class_subset=self.class_subset)
 
             return result[0]
         else:
             return '', 0.0
 
-    def _preprocess(self, image) -> np.ndarray:
+    def _preprocess(self, image, context) -> np.ndarray:
         assert len(
             image.shape) == 3, "The dimensions of the input image object do not match. The input supports a single " \
                                "image. "
         h, w, _ = image.shape
         wh_ratio = w * 1.0 / h
-        data = encode_images(image, wh_ratio, self.input_size, )
-        data = np.expand_dims(data, 0)
-        # print(data.shape)
+        width = get_tensor_width(wh_ratio, self.input_size)
+        data = self._batch_buffer(1, width)
+        encode_images(image, wh_ratio, self.input_size, out=data[0])
 
         return data
 
+    def _batch_buffer(self, batch, width):
+        if self.uint8_input:
+            return self.session.input_buffer((batch, self.input_size[0], width, 3), np.uint8)
+        return self.session.input_buffer((batch, 3, self.input_size[0], width))
+
+    def _bucket_width(self, resized_w):
+        for bucket in self.width_buckets:
+            if resized_w <= bucket:
+                return bucket
+        return self.width_buckets[-1]
+
+    def recognize_batch(self, images: list) -> list:
+        """Recognizes a list of plate crops with one session call per width bucket.
+
+        Each crop is resized to the recognizer height, then padded only up to
+        the smallest bucket width that fits it instead of the maximum width.
+        Crops sharing a bucket are stacked into one batch (split into chunks
+        of `max_batch`) written into cached per-bucket input buffers.
+
+        Args:
+            images (list): Plate crops, each (H, W, 3) BGR.
+
+        Returns:
+            list: One (text, confidence) tuple per crop, in input order.
+        """
+        height = self.input_size[0]
+        widths = [get_resized_width(image.shape[1] / float(image.shape[0]), height, self.width_buckets[-1])
+                  for image in images]
+
+        def encode(idx, bucket, row):
+            image = images[idx]
+            encode_images(image, image.shape[1] / image.shape[0], (height, bucket), limited_max_width=bucket, out=row)
+
+        return self._recognize_buckets(widths, encode)
+
+    def recognize_regions(self, image: np.ndarray, regions: list, interpolation=cv2.INTER_LINEAR,
+                          pixel_format: int = PIXEL_FORMAT_BGR) -> list:
+        """Recognizes plate regions warped straight from the source image into the batch tensor.
+
+        Unlike `recognize_batch`, no intermediate crop at natural size is made:
+        each region is warped once, directly to the recognizer height and its
+        resized width, and normalized into its row of the bucket input buffer.
+
+        Args:
+            image (np.ndarray): Source image, (H, W, 3) BGR by default, or a
+                list with the source image of every region, so the regions of
+                several frames are batched together.
+            regions (list): (matrix, (x, y, width, height)) tuples, where matrix
+                maps the image onto a rectified crop (see
+                `tools_process.get_rectify_transform`) and the rectangle
+                selects the part of that crop to recognize.
+            interpolation (int, optional): OpenCV interpolation flag. Defaults
+                to cv2.INTER_LINEAR.
+            pixel_format (int, optional): Pixel format of image, see
+                `tools_process.warp_region`. Defaults to PIXEL_FORMAT_BGR.
+
+        Returns:
+            list: One (text, confidence) tuple per region, in input order.
+        """
+        height = self.input_size[0]
+        widths = [get_resized_width(rect[2] / float(rect[3]), height, self.width_buckets[-1]) for _, rect in regions]
+        sources = image if isinstance(image, list) else None
+
+        def encode(idx, bucket, row):
+            matrix, rect = regions[idx]
+            encode_region(image if sources is None else sources[idx], matrix, rect, widths[idx], row,
+                          interpolation=interpolation, pixel_format=pixel_format)
+
+        return self._recognize_buckets(widths, encode)
+
+    def _recognize_buckets(self, widths, encode) -> list:
+        results = [('', 0.0)] * len(widths)
+        groups = dict()
+        for idx, resized_w in enumerate(widths):
+            groups.setdefault(self._bucket_width(resized_w), list()).append(idx)
+        for bucket, members in groups.items():
+            stats = self.bucket_stats[bucket]
+            for start in range(0, len(members), self.max_batch):
+                chunk = members[start:start + self.max_batch]
+                t0 = time.perf_counter()
+                data = self._batch_buffer(len(chunk), bucket)
+                for row, idx in enumerate(chunk):
+                    encode(idx, bucket, data[row])
+                outputs = self._run_session(data)
+                decoded = ctc_greedy_decode(outputs[0], self.character_list, class_subset=self.class_subset)
+                for idx, result in zip(chunk, decoded):
+                    results[idx] = result
+                elapsed = time.perf_counter() - t0
+                with self._stats_lock:
+                    stats['calls'] += 1
+                    stats['crops'] += len(chunk)
+                    stats['used_columns'] += sum(widths[idx] for idx in chunk)
+                    stats['padded_columns'] += bucket * len(chunk)
+                    stats['seconds'] += elapsed
+
+        return results
+
+    def bucket_report(self) -> dict:
+        """Summarizes the batching statistics per width bucket.
+
+        Returns:
+            dict: For every bucket width, the calls, crops, crops per second and
+                padding waste (fraction of padded tensor columns not covered by
+                image content).
+        """
+        report = dict()
+        with self._stats_lock:
+            bucket_stats = {bucket: dict(stats) for bucket, stats in self.bucket_stats.items()}
+        for bucket, stats in bucket_stats.items():
+            report[bucket] = dict(calls=stats['calls'], crops=stats['crops'],
+                                  crops_per_second=stats['crops'] / stats['seconds'] if stats['seconds'] else 0.0,
+                                  padding_waste=1 - stats['used_columns'] / stats['padded_columns']
+                                  if stats['padded_columns'] else 0.0)
+
+        return report
+
 
 class PPRCNNRecognitionDNN(HamburgerABC):
 
-    def __init__(self, onnx_path, character_file, *args, **kwargs):
+    def __init__(self, onnx_path, token_dict=token, charset=None, backend: str = 'default', target: str = 'cpu',
+                 *args, **kwargs):
+        from hyperlpr3.common.dnn_adapt import DNNAdapter
         super().__init__(*args, **kwargs)
-        self.session = cv2.dnn.readNetFromONNX(onnx_path)
+        self.input_size = tuple(self.input_size)
+        # The model is exported with a static (1, 3, 48, 160) input; cv2.dnn would accept other shapes but
+        # the reshapes baked into the graph only hold for that one, so every crop is padded to it
         self.input_shape = (1, 3, self.input_size[0], self.input_size[1])
-        self.character_list = token
-
-    def decode(self, text_index, text_prob=None, is_remove_duplicate=False):
-        result_list = []
-        ignored_tokens = get_ignored_tokens()
-        batch_size = len(text_index)
-        for batch_idx in range(batch_size):
-            char_list = []
-            conf_list = []
-            for idx in range(len(text_index[batch_idx])):
-                if text_index[batch_idx][idx] in ignored_tokens:
-                    continue
-                if is_remove_duplicate:
-                    # only for predict
-                    if idx > 0 and text_index[batch_idx][idx - 1] == text_index[batch_idx][idx]:
-                        continue
-                char_list.append(self.character_list[int(text_index[batch_idx][idx])])
-                if text_prob is not None:
-                    conf_list.append(text_prob[batch_idx][idx])
-                else:
-                    conf_list.append(1)
-            text = ''.join(char_list)
-            result_list.append((text, np.mean(conf_list)))
-        return result_list
+        self.session = DNNAdapter(onnx_path, backend=backend, target=target)
+        self.character_list = np.asarray(token_dict, dtype=object)
+        self.class_subset = charset_indices(self.character_list, charset) if charset else None
 
     def _run_session(self, data):
-        self.session.setInput(data)
-        outputs = self.session.forward()
-        outputs = np.expand_dims(outputs, 0)
-        # print(outputs.shape)
+        outputs = self.session.inference(data)
 
         return outputs
 
-    def _postprocess(self, data):
-        prod = data[0]
-        argmax = np.argmax(prod, axis=2)
-        rmax = np.max(prod, axis=2)
-        result = self.decode(argmax, rmax, is_remove_duplicate=True)
+    def _postprocess(self, data, context):
+        result = ctc_greedy_decode(data[0], self.character_list, class_subset=self.class_subset)
 
         return result[0]
 
-    def _preprocess(self, image):
+    def _preprocess(self, image, context):
         assert len(
             image.shape) == 3, "The dimensions of the input image object do not match. The input supports a single " \
                                "image. "
         h, w, _ = image.shape
         wh_ratio = w * 1.0 / h
-        data = encode_images(image, wh_ratio, self.input_size, )
-        data = np.expand_dims(data, 0)
+        data = self.session.input_buffer(self.input_shape)
+        encode_images(image, wh_ratio, self.input_size, limited_max_width=self.input_size[1], out=data[0])
 
         return data
+
+    def recognize_regions(self, image: np.ndarray, regions: list, interpolation=cv2.INTER_LINEAR,
+                          pixel_format: int = PIXEL_FORMAT_BGR) -> list:
+        """Recognizes plate regions warped straight from the source image into the net input.
+
+        Regions are run one by one on the static input shape; see
+        `PPRCNNRecognitionORT.recognize_regions` for the arguments.
+
+        Returns:
+            list: One (text, confidence) tuple per region, in input order.
+        """
+        height, width = self.input_size
+        results = list()
+        for matrix, rect in regions:
+            resized_w = get_resized_width(rect[2] / float(rect[3]), height, width)
+            data = self.session.input_buffer(self.input_shape)
+            encode_region(image, matrix, rect, resized_w, data[0], interpolation=interpolation,
+                          pixel_format=pixel_format)
+            outputs = self._run_session(data)
+            results.append(ctc_greedy_decode(outputs[0], self.character_list, class_subset=self.class_subset)[0])
+
+        return results
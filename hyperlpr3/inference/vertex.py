@@ -1,24 +1,24 @@
 import cv2
 import numpy as np
 from .base.base import HamburgerABC
-from hyperlpr3.common.tools_process import cost
 
 
-def encode_images(image: np.ndarray):
-    image_encode = image / 255.0
-    if len(image_encode.shape) == 4:
-        image_encode = image_encode.transpose(0, 3, 1, 2)
+def encode_images(image: np.ndarray, out=None):
+    if len(image.shape) == 4:
+        image = image.transpose(0, 3, 1, 2)
     else:
-        image_encode = image_encode.transpose(2, 0, 1)
-    image_encode = image_encode.astype(np.float32)
+        image = image.transpose(2, 0, 1)
+    if out is None:
+        out = np.empty(image.shape, dtype=np.float32)
+    np.divide(image, 255.0, out=out, dtype=np.float32, casting='unsafe')
 
-    return image_encode
+    return out
 
 
 class BVTVertexMNN(HamburgerABC):
 
     def __init__(self, mnn_path, *args, **kwargs):
-        from .common.mnn_adapt import MNNAdapter
+        from hyperlpr3.common.mnn_adapt import MNNAdapter
         super().__init__(*args, **kwargs)
         self.input_shape = (1, 3, self.input_size[0], self.input_size[1])
         self.session = MNNAdapter(mnn_path, self.input_shape)
@@ -27,7 +27,7 @@ class BVTVertexMNN(HamburgerABC):
         outputs = self.session.inference(data)
         return outputs
 
-    def _postprocess(self, data):
+    def _postprocess(self, data, context):
         assert data.shape[0] == 1
         data = np.asarray(data).reshape(-1, 4, 2)
         data[:, :, 0] *= self.input_size[1]
@@ -35,7 +35,7 @@ class BVTVertexMNN(HamburgerABC):
 
         return data[0]
 
-    def _preprocess(self, image):
+    def _preprocess(self, image, context):
         assert len(
             image.shape) == 3, "The dimensions of the input image object do not match. The input supports a single " \
                                "image. "
@@ -49,35 +49,33 @@ class BVTVertexMNN(HamburgerABC):
 
 class BVTVertexORT(HamburgerABC):
 
-    def __init__(self, onnx_path, *args, **kwargs):
-        import onnxruntime as ort
+    def __init__(self, onnx_path, io_binding: bool = True, *args, **kwargs):
+        from hyperlpr3.common.ort_adapt import ORTAdapter
         super().__init__(*args, **kwargs)
-        self.session = ort.InferenceSession(onnx_path, None)
-        self.input_config = self.session.get_inputs()[0]
-        self.output_config = self.session.get_outputs()[0]
+        self.session = ORTAdapter(onnx_path, io_binding=io_binding)
+        self.input_config = self.session.inputs_option[0]
+        self.output_config = self.session.outputs_option[0]
         self.input_size = self.input_config.shape[2:]
 
-    # @cost('Vertex')
     def _run_session(self, data) -> np.ndarray:
-        result = self.session.run([self.output_config.name], {self.input_config.name: data})
+        result = self.session.inference(data)
 
         return result[0]
 
-    def _postprocess(self, data) -> np.ndarray:
+    def _postprocess(self, data, context) -> np.ndarray:
         assert data.shape[0] == 1
-        data = np.asarray(data).reshape(-1, 4, 2)
+        data = np.array(data).reshape(-1, 4, 2)
         data[:, :, 0] *= self.input_size[1]
         data[:, :, 1] *= self.input_size[0]
 
         return data[0]
 
-    def _preprocess(self, image) -> np.ndarray:
+    def _preprocess(self, image, context) -> np.ndarray:
         assert len(
             image.shape) == 3, "The dimensions of the input image object do not match. The input supports a single " \
                                "image. "
-        image_resize = cv2.resize(image, self.input_size)
-        encode = encode_images(image_resize)
-        encode = encode.astype(np.float32)
-        input_tensor = np.expand_dims(encode, 0)
+        image_resize = cv2.resize(image, tuple(self.input_size))
+        input_tensor = self.session.input_buffer((1, 3, self.input_size[0], self.input_size[1]))
+        encode_images(image_resize, out=input_tensor[0])
 
         return input_tensor
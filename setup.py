@@ -39,6 +39,14 @@ if __name__ == "__main__":
             "python-multipart",
             "loguru"
         ],
+        extras_require={
+            # Graph surgery and INT8 quantization (lpr3 prune/bake/nms/quantize)
+            "surgery": ["onnx"],
+            # INFER_MNN backend
+            "mnn": ["MNN"],
+            # Parquet output of lpr3 batch
+            "parquet": ["pyarrow"],
+        },
         license="Apache License 2.0",
         zip_safe=False,
         entry_points="""
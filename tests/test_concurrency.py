@@ -0,0 +1,22 @@
+import importlib.util
+import pytest
+import hyperlpr3 as lpr3
+from hyperlpr3.benchmark.concurrency import ENGINES, compare_concurrent, load_images
+
+
+def _available(engine: str) -> bool:
+    if engine == 'mnn':
+        return importlib.util.find_spec('MNN') is not None
+    return True
+
+
+@pytest.mark.parametrize('engine', sorted(ENGINES))
+def test_shared_catcher_matches_sequential(engine):
+    if not _available(engine):
+        pytest.skip(f"{engine} is not installed")
+    catcher = lpr3.LicensePlateCatcher(inference=ENGINES[engine], full_result=True)
+    # sample.jpg and its flipped and half size variants
+    images = load_images()[:3]
+    report = compare_concurrent(catcher, images, threads=6, iterations=12)
+    assert report['errors'] == 0, report['first_errors']
+    assert report['mismatches'] == 0
@@ -0,0 +1,59 @@
+import os
+import cv2
+import pytest
+import hyperlpr3 as lpr3
+from hyperlpr3.common.typedef import UNKNOWN, DeadlineResult, code_filter
+
+SAMPLE = os.path.join(os.path.dirname(__file__), '..', 'assets', 'sample.jpg')
+
+
+@pytest.fixture(scope='module')
+def catcher():
+    return lpr3.LicensePlateCatcher(detect_level=lpr3.DETECT_LEVEL_HIGH)
+
+
+@pytest.fixture(scope='module')
+def image():
+    return cv2.imread(SAMPLE)
+
+
+def _scores(catcher, image) -> dict:
+    # Detection score of every plate, by its bounding box
+    return dict((tuple(int(value) for value in out[:4]), float(out[4])) for out in catcher.pipeline.detector(image))
+
+
+def test_zero_deadline_skips_every_detection(catcher, image):
+    detections = len(catcher.pipeline.detector(image))
+    assert detections > 0
+    result = catcher(image, deadline_ms=0)
+    assert isinstance(result, DeadlineResult)
+    assert len(result) == 0
+    assert len(result.skipped) == detections
+    confidences = [plate['det_confidence'] for plate in result.skipped]
+    assert confidences == sorted(confidences, reverse=True)
+
+
+def test_large_deadline_matches_run(catcher, image):
+    reference = catcher(image)
+    result = catcher(image, deadline_ms=60000)
+    assert result.skipped == []
+    assert result.unclassified == []
+    assert sorted(map(str, result)) == sorted(map(str, reference))
+
+
+def test_unclassified_when_classifier_does_not_fit(catcher, image, monkeypatch):
+    # An estimate no deadline can fit: the classifier is skipped for every plate
+    monkeypatch.setitem(catcher.pipeline._costs, 'classify', 3600.0)
+    result = catcher(image, deadline_ms=60000)
+    expected = [idx for idx, item in enumerate(result) if len(item[0]) >= 7 and code_filter(item[0]) == UNKNOWN]
+    assert expected
+    assert result.unclassified == expected
+    assert all(result[idx][2] == UNKNOWN for idx in result.unclassified)
+
+
+def test_results_in_descending_detection_score_order(catcher, image):
+    scores = _scores(catcher, image)
+    result = catcher(image, deadline_ms=60000)
+    ordered = [scores[tuple(int(value) for value in item[3])] for item in result]
+    assert len(ordered) > 1
+    assert ordered == sorted(ordered, reverse=True)
@@ -0,0 +1,47 @@
+import pytest
+from hyperlpr3.common.scheduler import FrameSource, MultiSourceScheduler
+
+
+def _serve(weights: list, max_batch: int, cycles: int = 10000) -> list:
+    # Every source has a frame in every cycle, counts how often each one is picked by the weighted policy
+    scheduler = MultiSourceScheduler(catcher=None, max_batch=max_batch, policy='weighted')
+    for idx, weight in enumerate(weights):
+        scheduler.add_source(FrameSource(f'source-{idx}'), weight=weight)
+    served = dict((state, 0) for state in scheduler._states)
+    for _ in range(cycles):
+        for state in scheduler._order(list(scheduler._states)):
+            served[state] += 1
+    # Credits stay bounded instead of drifting with the number of cycles
+    assert max(abs(state.credit) for state in scheduler._states) < 2
+    assert abs(sum(state.credit for state in scheduler._states)) < 1e-6
+
+    return [served[state] for state in scheduler._states]
+
+
+@pytest.mark.parametrize('max_batch', [1, 2, 4])
+def test_weighted_shares_follow_weights(max_batch):
+    weights = [4] + [1] * 15
+    served = _serve(weights, max_batch)
+    light = sum(served[1:]) / 15
+    assert served[0] / light == pytest.approx(4.0, rel=0.01)
+    assert sum(served) == 10000 * max_batch
+
+
+def test_weighted_shares_capped_at_one_frame_per_cycle():
+    # 8 slots for 16 sources: the heavy source would be owed 8 * 4 / 19 > 1 slot per cycle but has a single
+    # frame, so it is served every cycle and the 15 others share the 7 remaining slots evenly
+    served = _serve([4] + [1] * 15, max_batch=8)
+    assert served[0] == 10000
+    for count in served[1:]:
+        assert count / 10000 == pytest.approx(7 / 15, rel=0.01)
+
+
+def test_round_robin_serves_everyone_equally():
+    scheduler = MultiSourceScheduler(catcher=None, max_batch=3)
+    for idx in range(5):
+        scheduler.add_source(FrameSource(f'source-{idx}'))
+    served = dict((state, 0) for state in scheduler._states)
+    for _ in range(500):
+        for state in scheduler._order(list(scheduler._states)):
+            served[state] += 1
+    assert set(served.values()) == {300}